@@ -0,0 +1,251 @@
+# actions_index.py
+#
+# Local SQLite index of GitHub Actions workflows and runs. The first sync
+# pages through the API; later syncs only ask for runs created since the
+# newest one we have (or the oldest one still running), and send the stored
+# ETag so an unchanged answer costs a 304, which GitHub doesn't count against
+# the rate limit. Queries such as "latest run for this branch and workflow"
+# are answered from the index without touching the network.
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import http_client
+
+ACTIONS_DB = os.getenv("ACTIONS_DB", os.path.join(os.getcwd(), ".actions", "actions.db"))
+GITHUB_API = os.getenv("GITHUB_API", "https://api.github.com").rstrip("/")
+# A sync younger than this is reused as-is (seconds)
+SYNC_MAX_AGE = float(os.getenv("ACTIONS_SYNC_MAX_AGE", 30))
+PER_PAGE = 100
+# The first sync of a busy repo stops after this many pages of runs (newest first)
+SYNC_MAX_PAGES = int(os.getenv("ACTIONS_SYNC_MAX_PAGES", 10))
+# Runs stuck in queued/in_progress longer than this no longer hold the
+# incremental window open
+OPEN_RUN_WINDOW = timedelta(hours=int(os.getenv("ACTIONS_OPEN_RUN_HOURS", 24)))
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workflows (
+    repo TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    path TEXT,
+    state TEXT,
+    PRIMARY KEY (repo, id)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    repo TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    workflow_id INTEGER,
+    head_branch TEXT,
+    event TEXT,
+    status TEXT,
+    conclusion TEXT,
+    created_at TEXT,
+    data TEXT,
+    PRIMARY KEY (repo, id)
+);
+CREATE INDEX IF NOT EXISTS runs_by_workflow ON runs (repo, workflow_id, head_branch, created_at);
+CREATE INDEX IF NOT EXISTS runs_by_created ON runs (repo, created_at);
+CREATE TABLE IF NOT EXISTS sync_state (
+    repo TEXT NOT NULL,
+    resource TEXT NOT NULL,
+    query TEXT,
+    etag TEXT,
+    synced REAL,
+    PRIMARY KEY (repo, resource)
+);
+"""
+
+def _headers(token, etag=None):
+    headers = {
+        "Authorization": f"token {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    if etag:
+        headers["If-None-Match"] = etag
+    return headers
+
+def _fetch_pages(url, key, token, params, endpoint, etag=None, max_pages=None, failure="Request failed"):
+    # (etag, items, requests made); items is None when the first page is unchanged
+    params = dict(params, per_page=PER_PAGE)
+    headers = _headers(token, etag)
+    items = []
+    first_etag = None
+    requests_made = 0
+    while True:
+        resp = http_client.get(url, endpoint=endpoint, headers=headers, params=params)
+        requests_made += 1
+        if resp.status_code == 304:
+            return etag, None, requests_made
+        if resp.status_code != 200:
+            raise Exception(f"{failure}: {resp.text}")
+        if first_etag is None:
+            first_etag = resp.headers.get("ETag")
+        items.extend(resp.json()[key])
+        next_url = resp.links.get("next", {}).get("url")
+        if not next_url or (max_pages and requests_made >= max_pages):
+            return first_etag, items, requests_made
+        # The next link already carries every query parameter
+        url, params, headers = next_url, None, _headers(token)
+
+class ActionsIndex:
+    def __init__(self, db_path=ACTIONS_DB):
+        self.db_path = db_path
+        self._db_lock = threading.Lock()
+        self._sync_locks = {}
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._db_lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.fetchall()
+
+    def _sync_lock(self, repo, resource):
+        # Two sessions asking for the same repo share one sync
+        with self._db_lock:
+            return self._sync_locks.setdefault((repo, resource), threading.Lock())
+
+    def _state(self, repo, resource):
+        rows = self._execute("SELECT * FROM sync_state WHERE repo = ? AND resource = ?", (repo, resource))
+        return dict(rows[0]) if rows else {"query": None, "etag": None, "synced": 0}
+
+    def _save_state(self, repo, resource, query, etag):
+        self._execute("INSERT OR REPLACE INTO sync_state (repo, resource, query, etag, synced) VALUES (?, ?, ?, ?, ?)",
+                      (repo, resource, query, etag, time.time()))
+
+    def expire(self, owner, repo_name, resource="runs"):
+        # The next sync goes to the API whatever its max_age
+        self._execute("UPDATE sync_state SET synced = 0 WHERE repo = ? AND resource = ?",
+                      (f"{owner}/{repo_name}", resource))
+
+    def last_synced(self, owner, repo_name, resource="runs"):
+        return self._state(f"{owner}/{repo_name}", resource)["synced"]
+
+    # --- Sync ---
+    def sync_workflows(self, owner, repo_name, token, max_age=SYNC_MAX_AGE):
+        repo = f"{owner}/{repo_name}"
+        with self._sync_lock(repo, "workflows"):
+            state = self._state(repo, "workflows")
+            if time.time() - state["synced"] < max_age:
+                return {"requests": 0, "changed": False}
+            etag, workflows, requests_made = _fetch_pages(
+                f"{GITHUB_API}/repos/{repo}/actions/workflows", "workflows", token, {}, "github.list_workflows",
+                etag=state["etag"], failure="List workflows failed")
+            if workflows is not None:
+                with self._db_lock:
+                    # The list is small and complete, so replace it (deleted workflows go away)
+                    self._conn.execute("DELETE FROM workflows WHERE repo = ?", (repo,))
+                    self._conn.executemany(
+                        "INSERT INTO workflows (repo, id, name, path, state) VALUES (?, ?, ?, ?, ?)",
+                        [(repo, wf["id"], wf["name"], wf.get("path"), wf.get("state")) for wf in workflows])
+                    self._conn.commit()
+            self._save_state(repo, "workflows", None, etag)
+            return {"requests": requests_made, "changed": workflows is not None}
+
+    def _runs_since(self, repo):
+        # Newest run we know of, or the oldest one that may still change
+        newest = self._execute("SELECT MAX(created_at) AS t FROM runs WHERE repo = ?", (repo,))[0]["t"]
+        if newest is None:
+            return None
+        cutoff = (datetime.now(timezone.utc) - OPEN_RUN_WINDOW).strftime(TIME_FORMAT)
+        oldest_open = self._execute(
+            "SELECT MIN(created_at) AS t FROM runs WHERE repo = ? AND status != 'completed' AND created_at >= ?",
+            (repo, cutoff))[0]["t"]
+        return min(newest, oldest_open) if oldest_open else newest
+
+    def sync_runs(self, owner, repo_name, token, max_age=SYNC_MAX_AGE, full=False):
+        # full=True re-pages from the newest run down, e.g. to catch re-runs of completed runs
+        repo = f"{owner}/{repo_name}"
+        with self._sync_lock(repo, "runs"):
+            state = self._state(repo, "runs")
+            if not full and time.time() - state["synced"] < max_age:
+                return {"requests": 0, "runs": 0, "changed": False}
+            since = None if full else self._runs_since(repo)
+            params = {"created": f">={since}"} if since else {}
+            query = json.dumps(params, sort_keys=True)
+            # An ETag is only valid for the exact query it was returned for
+            etag = state["etag"] if state["query"] == query else None
+            etag, runs, requests_made = _fetch_pages(
+                f"{GITHUB_API}/repos/{repo}/actions/runs", "workflow_runs", token, params,
+                "github.get_workflow_runs", etag=etag, max_pages=SYNC_MAX_PAGES, failure="Get workflow runs failed")
+            if runs:
+                with self._db_lock:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO runs (repo, id, workflow_id, head_branch, event, status, conclusion, "
+                        "created_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(repo, run["id"], run.get("workflow_id"), run.get("head_branch"), run.get("event"),
+                          run.get("status"), run.get("conclusion"), run.get("created_at"), json.dumps(run))
+                         for run in runs])
+                    self._conn.commit()
+            self._save_state(repo, "runs", query, etag)
+            return {"requests": requests_made, "runs": len(runs or []), "changed": runs is not None}
+
+    def sync(self, owner, repo_name, token, max_age=SYNC_MAX_AGE):
+        workflows = self.sync_workflows(owner, repo_name, token, max_age)
+        runs = self.sync_runs(owner, repo_name, token, max_age)
+        return {"requests": workflows["requests"] + runs["requests"], "runs": runs["runs"],
+                "changed": workflows["changed"] or runs["changed"]}
+
+    def record_run(self, owner, repo_name, run):
+        # Lets a run watcher push what it polled straight into the index
+        self._execute(
+            "INSERT OR REPLACE INTO runs (repo, id, workflow_id, head_branch, event, status, conclusion, created_at, "
+            "data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (f"{owner}/{repo_name}", run["id"], run.get("workflow_id"), run.get("head_branch"), run.get("event"),
+             run.get("status"), run.get("conclusion"), run.get("created_at"), json.dumps(run)))
+
+    # --- Queries ---
+    def workflows(self, owner, repo_name):
+        rows = self._execute("SELECT id, name, path, state FROM workflows WHERE repo = ? ORDER BY name",
+                             (f"{owner}/{repo_name}",))
+        return [dict(row) for row in rows]
+
+    def workflow_id(self, owner, repo_name, workflow):
+        # Accepts an id or a workflow file name ("deploy.yml"), like the API does
+        if str(workflow).isdigit():
+            return int(workflow)
+        for wf in self.workflows(owner, repo_name):
+            if wf["path"] and os.path.basename(wf["path"]) == workflow:
+                return wf["id"]
+        raise Exception(f"❌ Unknown workflow {workflow} in {owner}/{repo_name}.")
+
+    def runs(self, owner, repo_name, workflow=None, branch=None, status=None, event=None, limit=100):
+        # Newest first, as the API returns them
+        sql = "SELECT data FROM runs WHERE repo = ?"
+        params = [f"{owner}/{repo_name}"]
+        if workflow is not None:
+            sql += " AND workflow_id = ?"
+            params.append(self.workflow_id(owner, repo_name, workflow))
+        for column, value in (("head_branch", branch), ("status", status), ("event", event)):
+            if value is not None:
+                sql += f" AND {column} = ?"
+                params.append(value)
+        sql += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return [json.loads(row["data"]) for row in self._execute(sql, params)]
+
+    def latest_run(self, owner, repo_name, workflow, branch=None, event=None):
+        runs = self.runs(owner, repo_name, workflow=workflow, branch=branch, event=event, limit=1)
+        return runs[0] if runs else None
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    # One index per process, shared by every Streamlit session
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ActionsIndex()
+        return _index
@@ -0,0 +1,176 @@
+# api_server.py
+#
+# Minimal JSON HTTP API over cockpit.py (stdlib only), started with
+# `python cli.py serve`. Generation answers synchronously; terraform runs go
+# through the job queue and are polled via /jobs/<id>.
+#
+#   POST /generate            {"prompt": "...", "planner": false, "context": false, "dry_run": false}
+#   POST /terraform/<command> {"tfvars": "dev.tfvars", "force_init": false, "saved_plan": ...}
+#   POST /plan-all            {"force_init": false}
+#   GET  /jobs, GET /jobs/<id>, POST /jobs/<id>/cancel, GET /health
+#
+# Any body may carry {"workspace": "name"} to work in .workspaces/<name>
+# (cloned from the repo on first use) instead of the repo's terraform/.
+#
+# Every request needs "Authorization: Bearer $COCKPIT_API_TOKEN"; `serve`
+# refuses to start without it. apply only runs a saved plan: plan with
+# "saved_plan": true, then apply with "saved_plan" set to the plan job's
+# result["saved_plan"]["file"]. "tfvars" must name a .tfvars file in the terraform
+# directory.
+
+import os
+import re
+import json
+import hmac
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cockpit
+import jobs
+import workspaces
+
+API_TOKEN = os.getenv("COCKPIT_API_TOKEN")
+TERRAFORM_COMMANDS = {"fmt", "validate", "plan", "apply", "destroy"}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _tf_dir(body):
+    name = body.get("workspace")
+    if name and not workspaces.valid_name(name):
+        raise ApiError(400, f"invalid workspace name {name}")
+    return workspaces.get_workspace(name).tf_dir
+
+def _tfvars(body, tf_dir):
+    # Only the name of a .tfvars file already in tf_dir, never a path
+    name = body.get("tfvars")
+    if not name:
+        return None
+    if (not isinstance(name, str) or name != os.path.basename(name) or not name.endswith(".tfvars")
+            or not os.path.isfile(os.path.join(tf_dir, name))):
+        raise ApiError(400, f"tfvars must name a .tfvars file in the terraform directory, got {name!r}")
+    return name
+
+@contextmanager
+def _directory_lock(tf_dir):
+    # The lock key terraform jobs in tf_dir hold, so writes and runs never overlap
+    queue = jobs.get_queue()
+    queue.acquire([tf_dir])
+    try:
+        yield
+    finally:
+        queue.release([tf_dir])
+
+def _generate(body):
+    if not body.get("prompt"):
+        raise ApiError(400, "prompt is required")
+    tf_dir = _tf_dir(body)
+    dry_run = body.get("dry_run", False)
+    with nullcontext() if dry_run else _directory_lock(tf_dir):
+        return cockpit.generate_files(
+            body["prompt"], base_dir=tf_dir, use_cache=body.get("use_cache", True), planner=body.get("planner", False),
+            max_workers=int(body.get("workers", cockpit.GENERATION_CONCURRENCY)), context=body.get("context", False),
+            token_budget=body.get("token_budget"), prune_all=body.get("prune_all", False), dry_run=dry_run)
+
+def _terraform(body, command):
+    if command not in TERRAFORM_COMMANDS:
+        raise ApiError(404, f"unknown terraform command {command}")
+    tf_dir = _tf_dir(body)
+    args = {"tfvars": _tfvars(body, tf_dir), "force_init": body.get("force_init", False)}
+    saved_plan = body.get("saved_plan")
+    if command == "apply":
+        if not isinstance(saved_plan, str) or not saved_plan:
+            raise ApiError(400, "apply only runs a saved plan: plan with \"saved_plan\": true, then apply with "
+                                "the plan job's saved_plan.file")
+        plan_file = os.path.join(cockpit.plans_dir(tf_dir), saved_plan)
+        if saved_plan != os.path.basename(saved_plan) or not saved_plan.endswith(".tfplan"):
+            raise ApiError(400, f"saved_plan must be a plan file name, got {saved_plan!r}")
+        if not os.path.isfile(plan_file):
+            raise ApiError(409, f"no saved plan {saved_plan}; it was applied, expired or never existed")
+        args["plan_file"] = plan_file
+    elif command == "plan" and saved_plan:
+        name = os.path.splitext(args["tfvars"])[0] if args["tfvars"] else "default"
+        args["plan_file"] = cockpit.plan_file_path(name, tf_dir)
+    return {"job_id": cockpit.submit_terraform_job(command, tf_dir=tf_dir, **args)}
+
+def _plan_all(body):
+    tf_dir = _tf_dir(body)
+    with _directory_lock(tf_dir):
+        return cockpit.plan_all_environments(tf_dir, force_init=body.get("force_init", False))
+
+def _job(body, job_id):
+    job = jobs.get_queue().get(job_id)
+    if not job:
+        raise ApiError(404, f"no job {job_id}")
+    return job
+
+def _cancel(body, job_id):
+    jobs.get_queue().cancel(job_id)
+    return _job(body, job_id)
+
+ROUTES = [
+    ("GET", r"/health", lambda body: {"ok": True}, 200),
+    ("POST", r"/generate", _generate, 200),
+    ("POST", r"/terraform/(\w+)", _terraform, 202),
+    ("POST", r"/plan-all", _plan_all, 200),
+    ("GET", r"/jobs", lambda body: jobs.get_queue().list(), 200),
+    ("GET", r"/jobs/(\w+)", _job, 200),
+    ("POST", r"/jobs/(\w+)/cancel", _cancel, 200),
+]
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status, body):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        if not API_TOKEN:
+            return False
+        return hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {API_TOKEN}")
+
+    def _dispatch(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if not self._authorized():
+            return self._send(401, {"error": "unauthorized"})
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            return self._send(400, {"error": "body must be JSON"})
+
+        path = self.path.split("?", 1)[0].rstrip("/")
+        for route_method, pattern, handler, status in ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                try:
+                    result = handler(body, *match.groups())
+                except ApiError as e:
+                    return self._send(e.status, {"error": str(e)})
+                except Exception as e:
+                    return self._send(500, {"error": str(e)})
+                return self._send(status, result)
+        self._send(404, {"error": f"no route for {method} {path}"})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+def serve(host="127.0.0.1", port=8080):
+    cockpit.register_job_handlers()
+    server = ThreadingHTTPServer((host, port), ApiHandler)
+    server.daemon_threads = True
+    print(f"Cockpit API on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
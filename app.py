@@ -1,470 +1,512 @@
 import os
-import re
 import glob
-import subprocess
+import json
 import streamlit as st
-import requests
 import git
-import yaml
-from dotenv import load_dotenv
-import shutil
 import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from dotenv import load_dotenv
 
+# Before the cockpit modules, which read their settings from the environment on import
 load_dotenv()
 
-# --- Config ---
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
-
-BASE_DIR = os.getcwd()
-TERRAFORM_DIR = os.path.join(BASE_DIR, "terraform")
-PIPELINES_DIR = os.path.join(BASE_DIR, "pipelines", "github")
+import llm_cache
+import http_client
+import run_watcher
+import jobs
+import context_index
+import prevalidate
+import tfvars_index
+import actions_index
+import tracing
+import repair
+import workspaces
+from block_parser import BlockParser, BlockCollector
+from cockpit import (
+    BASE_DIR, TERRAFORM_DIR, PIPELINES_DIR, GENERATION_CONCURRENCY, PLAN_MAX_WORKERS,
+    stream_groq_response, format_stream_stats, plan_file_manifest, generate_files_parallel,
+    reconcile_files, prevalidate_blocks, write_bytes, format_changes, TerraformRun, plan_file_path, load_saved_plan, plan_all_environments,
+    git_init_and_remote, git_commit_push, format_timings, create_pull_request, list_workflows,
+    trigger_workflow, merge_pull_request, deploy_workflows_to_github, submit_terraform_job, submit_commit_push_job,
+    STATE_COMMANDS,
+    register_job_handlers,
+)
 
 os.makedirs(TERRAFORM_DIR, exist_ok=True)
 os.makedirs(PIPELINES_DIR, exist_ok=True)
 
-# --- Groq call ---
-def get_groq_response(prompt):
-    headers = {
-        "Authorization": f"Bearer {GROQ_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": GROQ_MODEL,
-        "messages": [{"role": "user", "content": prompt}]
-    }
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers=headers, json=payload)
-    if response.status_code == 200:
-        return response.json()["choices"][0]["message"]["content"]
-    else:
-        raise Exception(f"Groq API Error: {response.text}")
-
-# --- Universal extractor with .tfvars ---
-def extract_blocks(raw_content):
-    blocks = {}
-    current_file = None
-    buffer = []
-
-    file_pattern = re.compile(
-        r'^\**\s*([a-zA-Z0-9_\-/\.]+\.tf(vars)?|[a-zA-Z0-9_\-/\.]+\.ya?ml)\s*\**$',
-        re.IGNORECASE
-    )
-
-    for line in raw_content.splitlines():
-        line = line.strip()
-        if not line or line.startswith("#") or line.startswith("```"):
-            continue
-
-        match = file_pattern.match(line)
-        if match:
-            filename = match.group(1)
-            if current_file and buffer:
-                blocks[current_file] = "\n".join(buffer).strip()
-                buffer = []
-            current_file = filename
-            continue
-
-        if current_file:
-            buffer.append(line)
-
-    if current_file and buffer:
-        blocks[current_file] = "\n".join(buffer).strip()
+register_job_handlers()
 
-    return blocks
-
-# --- File ops ---
-def clear_terraform_folder():
-    for f in glob.glob(f"{TERRAFORM_DIR}/**/*.tf*", recursive=True):
-        os.remove(f)
-
-def write_file(path, content):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w") as f:
-        f.write(content.strip())
-
-# --- Terraform ops ---
-def remove_ansi_colors(text):
-    return re.sub(r'\x1b\[[0-9;]*m', '', text)
-
-def run_terraform_command(command,tfvars=None):
-    subprocess.run(["terraform", "init"], cwd=TERRAFORM_DIR, check=True, capture_output=True)
-    args = ["terraform", command]
-    if tfvars:
-        args += ["-var-file", tfvars]
-    if command in ["apply", "destroy"]:
-        args.append("-auto-approve")
-    result = subprocess.run(args, cwd=TERRAFORM_DIR, capture_output=True, text=True)
-    return remove_ansi_colors(result.stdout + "\n" + result.stderr)
-
-def validate_terraform():
-    result = subprocess.run(["terraform", "validate"], cwd=TERRAFORM_DIR, capture_output=True, text=True)
-    return remove_ansi_colors(result.stdout + "\n" + result.stderr)
-
-def format_terraform():
-    result = subprocess.run(["terraform", "fmt"], cwd=TERRAFORM_DIR, capture_output=True, text=True)
-    return remove_ansi_colors(result.stdout + "\n" + result.stderr)
+# --- Streaming render ---
+def notify_ui(level, message):
+    # Progress callback for cockpit functions: level is an st.* status method
+    getattr(st, level)(message)
 
+def show_issues(issues, title="Pre-validation found problems"):
+    if not issues:
+        return
+    # Markdown needs two trailing spaces for a line break
+    report = prevalidate.format_issues(issues).replace("\n", "  \n")
+    if prevalidate.has_errors(issues):
+        st.error(f"{title}:\n\n{report}")
+    else:
+        st.warning(report)
+
+@contextmanager
+def traced_action(name):
+    # Root span for one button press; with "Profile actions" on it also runs
+    # under cProfile and the result shows up in the sidebar
+    profiler = tracing.profile(name) if profile_actions else nullcontext()
+    with profiler as profiled, tracing.span(name):
+        yield
+    if profiled:
+        st.session_state["last_profile"] = dict(profiled, action=name)
+
+def stream_blocks_to_ui(prompt, use_cache=True):
+    # Renders each file expander as soon as its header shows up in the stream
+    stats = {}
+    parser = BlockParser()
+    collector = BlockCollector()
+    raw = []
+    panels = {}
+
+    def render(events):
+        updated = []
+        for filename, chunk in events:
+            collector.add(filename, chunk)
+            if filename not in updated:
+                updated.append(filename)
+        for filename in updated:
+            if filename not in panels:
+                panels[filename] = st.expander(filename, expanded=True).empty()
+            panels[filename].code(collector.text(filename))
 
-# --- Git ops ---
-def is_git_repo():
+    with st.spinner("Calling LLM..."):
+        for delta in stream_groq_response(prompt, stats, use_cache=use_cache):
+            raw.append(delta)
+            render(parser.feed(delta))
+        render(parser.close())
+
+    st.caption(format_stream_stats(stats))
+    return "".join(raw), collector.blocks
+
+def planned_blocks_to_ui(prompt, use_cache=True, max_workers=GENERATION_CONCURRENCY):
+    start = time.time()
+    with st.spinner("Planning files..."):
+        manifest = plan_file_manifest(prompt, use_cache=use_cache)
+    manifest_time = time.time() - start
+    panels = {}
+    for entry in manifest:
+        expander = st.expander(f"{entry['path']} — {entry['purpose']}", expanded=True)
+        panels[entry["path"]] = expander.empty()
+        panels[entry["path"]].caption("⏳ generating...")
+
+    def on_file(path, content):
+        panels[path].code(content)
+
+    with st.spinner(f"Generating {len(manifest)} files ({max_workers} at a time)..."):
+        blocks = generate_files_parallel(prompt, max_workers=max_workers, use_cache=use_cache,
+                                         manifest=manifest, on_file=on_file)
+    st.caption(f"⏱ manifest {manifest_time:.2f}s | {len(blocks)} files in {time.time() - start:.2f}s total")
+    return json.dumps(manifest, indent=2), blocks
+
+def generate_blocks_to_ui(prompt, use_cache=True, planner=False, max_workers=GENERATION_CONCURRENCY):
+    if planner:
+        return planned_blocks_to_ui(prompt, use_cache=use_cache, max_workers=max_workers)
+    return stream_blocks_to_ui(prompt, use_cache=use_cache)
+
+@contextmanager
+def directory_lock(*lock_keys):
+    # Foreground actions take the same lock keys as background jobs, so they
+    # never write or run terraform in a directory a job is using
+    queue = jobs.get_queue()
+    if not queue.acquire(lock_keys, blocking=False):
+        with st.spinner("⏳ Waiting for background jobs in this directory..."):
+            queue.acquire(lock_keys)
     try:
-        git.Repo(BASE_DIR).git_dir
-        return True
-    except git.exc.InvalidGitRepositoryError:
-        return False
-    
-def clean_git_remote_url(url):
-    # Replace fancy dashes or whitespace with simple hyphen and strip spaces
-    url = url.strip()
-    url = url.replace('—', '-')  # en-dash to hyphen
-    url = url.replace('–', '-')  # em-dash to hyphen
-    # You can add more replacements if needed
-    return url
-
-def git_init_and_remote(remote_url):
-    repo = git.Repo.init(BASE_DIR)
-    if remote_url:
-        # Clean URL (replace fancy dashes etc if needed)
-        remote_url = remote_url.strip()
-        try:
-            origin = None
-            try:
-                origin = repo.remote('origin')
-            except ValueError:
-                pass
-            if origin:
-                repo.delete_remote(origin)
-            repo.create_remote('origin', remote_url)
-        except Exception:
-            pass
-    return "✅ Git initialized!"
-
-def git_status():
-    repo = git.Repo(BASE_DIR)
-    return repo.git.status()
-
-def abort_ongoing_rebase(base_dir):
-    rebase_merge = os.path.join(base_dir, ".git", "rebase-merge")
-    rebase_apply = os.path.join(base_dir, ".git", "rebase-apply")
-
-    for path in [rebase_merge, rebase_apply]:
-        if os.path.exists(path):
-            shutil.rmtree(path)
-
-BASE_DIR = os.getcwd()
-
-def run_cmd(cmd, cwd=None):
-    result = subprocess.run(cmd, cwd=cwd, shell=True, capture_output=True, text=True)
-    if result.returncode != 0:
-        raise Exception(f"Command failed: {cmd}\nstdout: {result.stdout}\nstderr: {result.stderr}")
-    return result.stdout.strip()
-
-def git_commit_push(files, msg, branch, username, token):
+        yield
+    finally:
+        queue.release(lock_keys)
+
+def stream_terraform_to_ui(run, height_lines=40):
+    # Re-render at most every 0.25s so huge plans don't flood the frontend
+    placeholder = st.empty()
+    last_render = 0
+    lock_keys = {run.tf_dir, TERRAFORM_DIR} if run.command in STATE_COMMANDS else {run.tf_dir}
     try:
-        # Init repo if not exists
-        if not os.path.exists(os.path.join(BASE_DIR, ".git")):
-            repo = git.Repo.init(BASE_DIR)
-            st.info("Initialized new Git repo.")
-        else:
-            repo = git.Repo(BASE_DIR)
-
-        # Write .gitignore
-        gitignore_path = os.path.join(BASE_DIR, ".gitignore")
-        with open(gitignore_path, "w") as f:
-            f.write("""
-# ---- Virtual Environment ----
-.venv/
-.env
-__pycache__/
-
-# ---- Terraform ----
-terraform/.terraform/
-*.tfstate
-*.tfstate.backup
-crash.log
-
-# ---- Python ----
-__pycache__/
-*.pyc
-
-# ---- Secrets ----
-.env
-
-# ---- Editor ----
-.vscode/
-.idea/
-
-# ---- OS files ----
-.DS_Store
-Thumbs.db
-""".strip())
-        repo.git.add(".gitignore")
-
-        # Add files recursively or specific files
-        if not files or "ALL" in files:
-            repo.git.add(A=True)
-        else:
-            repo.git.add(files)
-
-        # ✅ Only commit if dirty
-        if repo.is_dirty(index=True, working_tree=True, untracked_files=True):
-            repo.index.commit(msg)
-            st.info("✅ New commit created.")
-        else:
-            st.info("✅ Nothing new to commit — will push anyway.")
-
-        # Ensure origin remote exists
-        try:
-            origin = repo.remote('origin')
-        except ValueError:
-            remote_url = st.text_input("Enter remote URL for origin (required for push):")
-            if not remote_url:
-                raise Exception("Remote URL required to create 'origin'.")
-            origin = repo.create_remote('origin', remote_url.strip())
-
-        # Add credentials to remote URL
-        remote_url = origin.url.strip().replace('—', '-').replace('–', '-')
-        if remote_url.startswith("https://"):
-            protocol_removed = remote_url[8:]
-            if "@" in protocol_removed:
-                protocol_removed = protocol_removed.split("@", 1)[-1]
-            auth_url = f"https://{username}:{token}@{protocol_removed}"
-            origin.set_url(auth_url)
-
-        # Handle ongoing rebase (auto continue with commit --no-edit)
-        rebase_merge_dir = os.path.join(BASE_DIR, ".git", "rebase-merge")
-        rebase_apply_dir = os.path.join(BASE_DIR, ".git", "rebase-apply")
-
-        if os.path.exists(rebase_merge_dir) or os.path.exists(rebase_apply_dir):
-            st.warning("⚠️ Rebase in progress detected, attempting to continue rebase...")
-
-            while os.path.exists(rebase_merge_dir) or os.path.exists(rebase_apply_dir):
-                try:
-                    # Stage all changes (resolved conflicts)
-                    repo.git.add(A=True)
-                    # Commit with no edit message (avoid editor)
-                    run_cmd("git commit --no-edit", cwd=BASE_DIR)
-                    # Continue rebase
-                    run_cmd("git rebase --continue", cwd=BASE_DIR)
-                    st.info("Git rebase --continue executed.")
-                except Exception as e:
-                    st.error(f"Failed to continue rebase automatically: {e}")
-                    raise e
-
-            st.success("✅ Rebase finished successfully.")
-            return "Rebase completed, please retry your operation."
-
-        # Checkout branch if exists or create
-        remote_branches = [ref.name.split('/')[-1] for ref in origin.refs]
-        if branch not in remote_branches:
-            try:
-                repo.git.push('--set-upstream', 'origin', branch)
-            except Exception as e:
-                st.error(f"Failed to set upstream: {e}")
-
-        if branch in repo.heads:
-            repo.git.checkout(branch)
-        else:
-            try:
-                repo.git.checkout('-b', branch, f'origin/{branch}')
-            except Exception:
-                repo.git.checkout('-b', branch)
-
-        # Pull with rebase to sync remote changes
-        try:
-            repo.git.pull('origin', branch, '--rebase')
-        except Exception as e:
-            st.warning(f"Pull with rebase failed: {e}. Trying without rebase.")
-            repo.git.pull('origin', branch)
-
-        # ✅ Always push!
-        # --- Push changes ---
-        push_result = origin.push(branch)
-
-        for info in push_result:
-            if info.flags & info.ERROR:
-                if "refusing to allow a Personal Access Token to create or update workflow" in info.summary:
-                    st.error(
-                        "❌ Push rejected: Your GitHub token is missing the `workflow` scope.\n"
-                        "➡️ Please recreate it with `repo` and `workflow` scopes."
-                    )
-                    return "❌ Push rejected due to missing `workflow` scope."
-                else:
-                    st.error(f"❌ Push failed: {info.summary}")
-                    return f"❌ Push failed: {info.summary}"
-
-        return f"✅ Commit, pull & push to {branch} done."
-
-
+        with directory_lock(*lock_keys):
+            for _ in run.stream():
+                if time.time() - last_render > 0.25:
+                    placeholder.code("\n".join(list(run.lines)[-height_lines:]))
+                    last_render = time.time()
     except Exception as e:
-        st.error(f"An error occurred: {e}")
-        return f"❌ Error: {e}"
-
-
-def create_pull_request(owner, repo_name, source_branch, target_branch, pr_title, pr_body,token):
-    github_token = token
-    if not github_token:
-        raise Exception("❌ GITHUB_TOKEN not found — please set it in your .env or environment.")
-
-    url = f"https://api.github.com/repos/{owner}/{repo_name}/pulls"
-    headers = {
-        "Authorization": f"Bearer {github_token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    payload = {
-        "title": pr_title,
-        "head": source_branch,
-        "base": target_branch,
-        "body": pr_body
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code == 201:
-        return response.json()["html_url"]
-    else:
-        raise Exception(f"❌ PR creation failed: {response.status_code} {response.text}")
-
-# --- GitHub Actions helpers ---
-import time
-
-def list_workflows(owner, repo_name, token):
-    url = f"https://api.github.com/repos/{owner}/{repo_name}/actions/workflows"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    resp = requests.get(url, headers=headers)
-    if resp.status_code == 200:
-        workflows = resp.json()["workflows"]
-        return [(wf["name"], wf["id"]) for wf in workflows]
-    else:
-        raise Exception(f"List workflows failed: {resp.text}")
-
-def trigger_workflow(owner, repo_name, workflow_id, ref, token):
-    url = f"https://api.github.com/repos/{owner}/{repo_name}/actions/workflows/{workflow_id}/dispatches"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    payload = {
-        "ref": ref  # branch name
-    }
-    resp = requests.post(url, headers=headers, json=payload)
-    if resp.status_code == 204:
-        return True
-    else:
-        raise Exception(f"Trigger workflow failed: {resp.text}")
-
-def get_workflow_runs(owner, repo_name, workflow_id, token):
-    url = f"https://api.github.com/repos/{owner}/{repo_name}/actions/workflows/{workflow_id}/runs"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    resp = requests.get(url, headers=headers)
-    if resp.status_code == 200:
-        return resp.json()["workflow_runs"]
-    else:
-        raise Exception(f"Get workflow runs failed: {resp.text}")
-
-def merge_pull_request(owner, repo_name, pr_number, token):
-    url = f"https://api.github.com/repos/{owner}/{repo_name}/pulls/{pr_number}/merge"
-    headers = {
-        "Authorization": f"token {token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    resp = requests.put(url, headers=headers)
-    if resp.status_code == 200:
-        return True
+        st.error(str(e))
+    placeholder.code(run.output())
+    timings = " | ".join(f"{phase} {secs:.1f}s" for phase, secs in run.timings.items())
+    st.caption(f"⏱ {timings} | exit code {run.returncode}")
+    return run
+
+def rerun_app():
+    # st.experimental_rerun is gone in the Streamlit versions that have
+    # fragments; from inside a fragment, scope="app" reruns the whole page
+    if hasattr(st, "fragment"):
+        st.rerun(scope="app")
     else:
-        raise Exception(f"Merge PR failed: {resp.text}")
-
-def deploy_workflows_to_github(branch, username, token):
-    workflows_dir = os.path.join(BASE_DIR, ".github", "workflows")
-    pipelines_dir = os.path.join(BASE_DIR, "pipelines", "github")
-
-    os.makedirs(workflows_dir, exist_ok=True)
-
-    copied_files = []
-    for file in glob.glob(f"{pipelines_dir}/*.yml"):
-        filename = os.path.basename(file)
-        dest = os.path.join(workflows_dir, filename)
-        shutil.copyfile(file, dest)
-        copied_files.append(dest)
-
-    if not copied_files:
-        return "❌ No workflow files found to deploy."
-
-    # # Git push
-    # repo = git.Repo(BASE_DIR)
-
-    # repo.git.add(all=True)
-    # repo.index.commit("Auto deploy workflows to .github/workflows")
-
-    # origin = repo.remote('origin')
+        st.experimental_rerun()
 
-    # Inject credentials into remote URL
-    # remote_url = origin.url.strip()
-    # if remote_url.startswith("https://"):
-    #     protocol_removed = remote_url[8:]
-    #     if "@" in protocol_removed:
-    #         protocol_removed = protocol_removed.split("@", 1)[-1]
-    #     auth_url = f"https://{username}:{token}@{protocol_removed}"
-    #     origin.set_url(auth_url)
+# --- Cached UI state ---
+# Every widget interaction reruns this script, so git and filesystem lookups are
+# cached and keyed on the mtimes that change when their answer can change.
+# Actions that write files or touch git call invalidate_ui_state().
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
 
-    # origin.push(branch)
+def _git_state_key(base_dir):
+    git_dir = os.path.join(base_dir, ".git")
+    return (_mtime(os.path.join(git_dir, "index")), _mtime(os.path.join(git_dir, "HEAD")),
+            _mtime(base_dir), _mtime(TERRAFORM_DIR), _mtime(PIPELINES_DIR))
 
-    #return f"✅ Workflows deployed & pushed: {copied_files}"
-    return f"✅ Workflows deployed : {copied_files}"
+@st.cache_resource(show_spinner=False)
+def cached_repo(base_dir):
+    try:
+        return git.Repo(base_dir)
+    except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError):
+        return None
+
+# ttl catches edits made outside the app, which don't move directory mtimes
+@st.cache_data(ttl=30, show_spinner=False)
+def cached_git_status(base_dir, state_key):
+    return cached_repo(base_dir).git.status()
+
+@st.cache_data(show_spinner=False)
+def cached_tfvars_files(tf_dir, dir_mtime):
+    return sorted(os.path.basename(f) for f in glob.glob(os.path.join(tf_dir, "*.tfvars")))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_commit_files(base_dir, state_key):
+    return [os.path.relpath(f, base_dir) for f in glob.glob(f"{TERRAFORM_DIR}/**/*.tf", recursive=True)] + \
+           [os.path.relpath(f, base_dir) for f in glob.glob(f"{PIPELINES_DIR}/**/*.yml", recursive=True)]
+
+@st.cache_data(ttl=30, show_spinner=False)
+def cached_workspace_rows():
+    # Walks every workspace for its disk usage, so not on every rerun
+    return [workspaces.summary(ws) for ws in workspaces.list_workspaces()]
+
+def invalidate_ui_state(repo=False):
+    cached_git_status.clear()
+    cached_tfvars_files.clear()
+    cached_commit_files.clear()
+    cached_workspace_rows.clear()
+    if repo:
+        cached_repo.clear()
 
 # --- UI ---
+rerun_started = time.perf_counter()
 st.set_page_config("Day 18 : GitOps Cockpit", layout="wide")
 st.title("🚀 Day 18  - GitOps Cockpit (YAML & TFVARS)")
+# Groups this browser session's spans for the waterfall at the bottom
+tracing.set_session(st.session_state.setdefault("trace_session", uuid.uuid4().hex[:12]))
+
+use_job_queue = st.sidebar.checkbox(
+    "Run plan/apply/destroy/push as background jobs", value=True,
+    help="Jobs on the same directory run one at a time, so several operators can share this cockpit")
+
+# Workspace: where this session generates, plans and applies
+st.sidebar.header("🗂 Workspace")
+workspace_modes = {"repo": "Repo directory (shared)", "session": "Private to this session",
+                   "project": "Named project workspace"}
+default_mode = workspaces.WORKSPACE_DEFAULT if workspaces.WORKSPACE_DEFAULT in workspace_modes else "repo"
+workspace_mode = st.sidebar.radio(
+    "Work in", list(workspace_modes), format_func=workspace_modes.get, index=list(workspace_modes).index(default_mode),
+    help="Workspaces are copy-on-write clones of terraform/ and pipelines/, so sessions don't overwrite each other")
+workspace_name = None
+if workspace_mode == "session":
+    workspace_name = f"session-{st.session_state['trace_session']}"
+elif workspace_mode == "project":
+    workspace_name = st.sidebar.text_input("Project name", st.session_state.get("workspace_project", "")).strip()
+    st.session_state["workspace_project"] = workspace_name
+try:
+    workspace = workspaces.get_workspace(workspace_name)
+except Exception as e:
+    st.sidebar.error(str(e))
+    workspace = workspaces.repo_workspace()
+tf_dir = workspace.tf_dir
+pipelines_dir = workspace.pipelines_dir
+if not workspace.is_repo:
+    st.sidebar.caption(f"📁 {os.path.relpath(workspace.root, BASE_DIR)}")
+    if st.sidebar.button("⬆️ Promote changes to the repo", help="Copies what changed here into terraform/ and "
+                         "pipelines/ for committing; files changed in both places are left alone"):
+        try:
+            promoted = workspace.promote()
+        except Exception as e:
+            st.sidebar.error(str(e))
+        else:
+            invalidate_ui_state()
+            st.sidebar.success(format_changes({k: v for k, v in promoted.items() if k != "conflicts"}))
+            if promoted["conflicts"]:
+                st.sidebar.warning(f"Changed in the repo too, not promoted: {', '.join(promoted['conflicts'])}")
+with st.sidebar.expander("All workspaces"):
+    workspace_rows = cached_workspace_rows()
+    if workspace_rows:
+        st.dataframe([{k: row[k] for k in ("workspace", "MB", "last_used")} for row in workspace_rows],
+                     use_container_width=True, hide_index=True)
+    else:
+        st.caption("No workspaces yet.")
+    if st.button("🧹 Evict least recently used"):
+        removed = workspaces.evict(keep={workspace.name})
+        invalidate_ui_state()
+        st.caption(f"Removed: {', '.join(removed)}" if removed else "Everything fits in the disk budget.")
+
+# LLM cache
+st.sidebar.header("⚡ LLM Cache")
+bypass_llm_cache = st.sidebar.checkbox("Bypass cache (always call Groq)", value=False)
+cache_col1, cache_col2 = st.sidebar.columns(2)
+cache_col1.metric("Hits", llm_cache.stats["hits"])
+cache_col2.metric("Misses", llm_cache.stats["misses"])
+if st.sidebar.button("Clear LLM cache"):
+    st.sidebar.success(f"Removed {llm_cache.clear()} cached completions.")
+
+# Generation mode
+st.sidebar.header("🧩 Generation")
+planner_mode = st.sidebar.checkbox(
+    "Planner mode (one request per file)", value=False,
+    help="Ask for a file manifest first, then generate every file in parallel")
+planner_workers = st.sidebar.number_input("Parallel file requests", min_value=1, max_value=16,
+                                          value=GENERATION_CONCURRENCY, disabled=not planner_mode)
+use_repo_context = st.sidebar.checkbox(
+    "Send existing Terraform as context", value=False,
+    help="Packs the most relevant existing blocks into the prompt and asks only for changed files")
+context_budget = st.sidebar.number_input("Context token budget", min_value=200, max_value=32000, step=200,
+                                         value=context_index.CONTEXT_TOKEN_BUDGET, disabled=not use_repo_context)
+reject_invalid = st.sidebar.checkbox(
+    "Reject output that fails pre-validation", value=True,
+    help="Syntax, undeclared references and duplicate addresses are checked in-process before writing")
+prevalidate_retries = st.sidebar.number_input("Regenerate on pre-validation failure (times)",
+                                              min_value=0, max_value=5, value=1)
+
+# HTTP latency
+with st.sidebar.expander("🌐 API latency"):
+    latency_rows = http_client.latency_summary()
+    if latency_rows:
+        st.dataframe(latency_rows, use_container_width=True)
+    else:
+        st.caption("No API calls yet.")
+
+# Profiling
+st.sidebar.header("🔬 Profiling")
+profile_actions = st.sidebar.checkbox(
+    "Profile actions with cProfile", value=False,
+    help="Slows the action down; the hottest functions of the last one are shown here")
+last_profile = st.session_state.get("last_profile")
+if last_profile:
+    with st.sidebar.expander(f"Last profile: {last_profile['action']}"):
+        st.caption(last_profile["path"])
+        st.code(last_profile["top"])
 
 # Git
-if not is_git_repo():
+if cached_repo(BASE_DIR) is None:
     st.warning("❌ Not a Git repo.")
     remote = st.text_input("Remote URL")
     if st.button("Git Init & Link"):
         st.success(git_init_and_remote(remote.strip() or None))
-        st.experimental_rerun()
+        invalidate_ui_state(repo=True)
+        rerun_app()
 else:
-    st.success(f"🗂 Git Status\n\n{git_status()}")
+    st.success(f"🗂 Git Status\n\n{cached_git_status(BASE_DIR, _git_state_key(BASE_DIR))}")
 
 # Terraform
 st.header("🔍 Terraform: Generate")
 tf_prompt = st.text_area("Prompt for Terraform code", height=150)
+prune_all_terraform = st.checkbox(
+    "Remove every .tf/.tfvars not in the new generation",
+    value=False, help="By default only files produced by the previous generation are removed")
 if st.button("Generate Terraform"):
-    with st.spinner("Calling LLM..."):
-        out = get_groq_response(tf_prompt)
-        clear_terraform_folder()
-        blocks = extract_blocks(out)
-        for f, code in blocks.items():
-            write_file(os.path.join(TERRAFORM_DIR, f), code)
-            st.expander(f).code(code)
+    with traced_action("ui.generate_terraform"):
+        prompt = tf_prompt
+        if use_repo_context:
+            prompt, context_stats = context_index.build_prompt_with_context(
+                tf_prompt, tf_dir, token_budget=int(context_budget))
+            st.caption(f"📎 Context: {context_stats['blocks']}/{context_stats['total_blocks']} blocks, "
+                       f"~{context_stats['tokens']} tokens")
+        for attempt in range(int(prevalidate_retries) + 1):
+            out, blocks = generate_blocks_to_ui(prompt, use_cache=not bypass_llm_cache, planner=planner_mode,
+                                                max_workers=int(planner_workers))
+            issues = prevalidate_blocks(blocks, tf_dir, prune_all=prune_all_terraform, prune=not use_repo_context)
+            if not prevalidate.has_errors(issues) or attempt == int(prevalidate_retries):
+                break
+            show_issues(issues, f"Pre-validation failed, regenerating ({attempt + 1}/{int(prevalidate_retries)})")
+            prompt = prevalidate.retry_prompt(prompt, issues)
+        if issues:
+            show_issues(issues)
+        if reject_invalid and prevalidate.has_errors(issues):
+            st.error("❌ Output rejected by pre-validation; nothing was written.")
+        else:
+            with directory_lock(tf_dir):
+                changes = reconcile_files(blocks, tf_dir, prune_all=prune_all_terraform, prune=not use_repo_context)
+            invalidate_ui_state()
+            st.info(format_changes(changes))
+            for kind in ("added", "modified", "removed"):
+                if changes[kind]:
+                    st.caption(f"{kind}: {', '.join(changes[kind])}")
 
 # --- Add tfvars dropdown ---
-tfvars_files = glob.glob(os.path.join(TERRAFORM_DIR, "*.tfvars"))
-tfvars_files = [os.path.basename(f) for f in tfvars_files]
+tfvars_files = cached_tfvars_files(tf_dir, _mtime(tf_dir))
 selected_tfvars = st.selectbox("Select .tfvars file", ["None"] + tfvars_files)
+force_init = st.checkbox("Force terraform init", value=False,
+                         help="init is skipped while providers, modules and backend are unchanged")
+
+with st.expander("🔀 Variables across environments", expanded=False):
+    # Parsed once per file change; no terraform run needed
+    variable_rows = tfvars_index.variable_report(tf_dir)
+    if not variable_rows:
+        st.caption("No variables or .tfvars files found.")
+    else:
+        only_flagged = st.checkbox("Only variables that differ, are unset, unused or undeclared", value=False)
+        if only_flagged:
+            variable_rows = [row for row in variable_rows if row["flags"]]
+        st.dataframe(variable_rows, use_container_width=True, hide_index=True)
 
 col1, col2, col3 = st.columns(3)
 with col1:
     if st.button("Terraform FMT"):
-        st.text_area("Output", format_terraform(), height=300)
+        stream_terraform_to_ui(TerraformRun("fmt", init=False, tf_dir=tf_dir))
 with col2:
     if st.button("Terraform Validate"):
-        st.text_area("Output", validate_terraform(), height=300)
+        with traced_action("ui.terraform_validate"):
+            # terraform only runs once the in-process checks pass
+            issues = prevalidate.validate_dir(tf_dir)
+            show_issues(issues)
+            if not prevalidate.has_errors(issues):
+                stream_terraform_to_ui(TerraformRun("validate", init=False, tf_dir=tf_dir))
 with col3:
     if st.button("Terraform Plan"):
-        tfvars_path = selected_tfvars if selected_tfvars != "None" else None
-        st.text_area("Output", run_terraform_command("plan", tfvars=tfvars_path), height=350)
+        with traced_action("ui.terraform_plan"):
+            tfvars_path = selected_tfvars if selected_tfvars != "None" else None
+            plan_file = plan_file_path(os.path.splitext(tfvars_path)[0] if tfvars_path else "default", tf_dir)
+            if use_job_queue:
+                job_id = submit_terraform_job("plan", tf_dir, tfvars=tfvars_path, force_init=force_init,
+                                              plan_file=plan_file)
+                st.info(f"🧵 Queued plan job {job_id} — see Jobs below.")
+            else:
+                with st.expander("Plan output", expanded=False):
+                    plan_run = stream_terraform_to_ui(
+                        TerraformRun("plan", tfvars=tfvars_path, force_init=force_init, plan_file=plan_file,
+                                     tf_dir=tf_dir))
+                if plan_run.returncode == 0:
+                    try:
+                        st.session_state["saved_plan"] = load_saved_plan(plan_file, tf_dir, tfvars=tfvars_path)
+                    except Exception as e:
+                        st.error(str(e))
+                else:
+                    st.session_state.pop("saved_plan", None)
+                    st.error("❌ Plan failed, see output above.")
+
+with st.expander("🛠 Auto-repair until it validates", expanded=False):
+    repair_col1, repair_col2, repair_col3 = st.columns(3)
+    repair_candidates = repair_col1.number_input("Parallel candidates", min_value=1, max_value=8,
+                                                 value=repair.REPAIR_CANDIDATES)
+    repair_rounds = repair_col2.number_input("Max rounds", min_value=1, max_value=10, value=repair.REPAIR_MAX_ROUNDS)
+    repair_timeout = repair_col3.number_input("Time limit (s)", min_value=30, max_value=3600, step=30,
+                                              value=int(repair.REPAIR_TIMEOUT))
+    if st.button("🛠 Repair"):
+        with traced_action("ui.repair"):
+            repair_log = []
+            repair_progress = st.empty()
+
+            def on_repair_event(message):
+                repair_log.append(message)
+                repair_progress.text("\n".join(repair_log))
+
+            with st.spinner("Repairing..."):
+                repair_result = repair.repair(tf_dir, candidates=int(repair_candidates),
+                                              max_rounds=int(repair_rounds), timeout=float(repair_timeout), on_event=on_repair_event)
+            if repair_result["ok"] and repair_result["changes"]:
+                invalidate_ui_state()
+                st.success(f"✅ Valid after {repair_result['rounds']} round(s), {repair_result['tried']} "
+                           f"candidate(s), {repair_result['seconds']}s. {format_changes(repair_result['changes'])}")
+                for path, content in repair_result["files"].items():
+                    with st.expander(path):
+                        st.code(content)
+            elif repair_result["ok"]:
+                st.success("✅ Configuration already validates.")
+            else:
+                st.error(f"❌ No valid candidate after {repair_result['rounds']} round(s), "
+                         f"{repair_result['tried']} candidate(s), {repair_result['seconds']}s.")
+                st.code(repair_result["report"])
+
+saved_plan = st.session_state.get("saved_plan")
+if saved_plan:
+    summary = saved_plan["summary"]
+    st.subheader(f"📋 Saved plan ({saved_plan['tfvars'] or 'no tfvars'}, {saved_plan['created']})")
+    st.markdown(f"**{summary['add']}** to add, **{summary['change']}** to change, "
+                f"**{summary['destroy']}** to destroy")
+    action_options = sorted({c["action"] for c in saved_plan["changes"]})
+    filter_col1, filter_col2 = st.columns(2)
+    action_filter = filter_col1.multiselect("Actions", action_options, default=action_options)
+    address_filter = filter_col2.text_input("Filter by address")
+    rows = [c for c in saved_plan["changes"]
+            if c["action"] in action_filter and address_filter.lower() in c["address"].lower()]
+    if rows:
+        st.dataframe(rows, use_container_width=True)
+    else:
+        st.caption("No resource changes match.")
+
 if st.button("Terraform Apply"):
-    st.text_area("Output", run_terraform_command("apply"), height=350)
+    with traced_action("ui.terraform_apply"):
+        if not saved_plan or not os.path.exists(saved_plan["path"]):
+            st.warning("Run Terraform Plan first — Apply uses the saved plan.")
+        elif use_job_queue or not workspace.is_repo:
+            # The plan's own directory, even if the session switched workspace since
+            job_id = submit_terraform_job("apply", saved_plan.get("tf_dir", tf_dir), force_init=force_init,
+                                          plan_file=saved_plan["path"])
+            st.session_state.pop("saved_plan", None)
+            st.info(f"🧵 Queued apply job {job_id} — see Jobs below.")
+        else:
+            apply_run = stream_terraform_to_ui(
+                TerraformRun("apply", force_init=force_init, plan_file=saved_plan["path"],
+                             tf_dir=saved_plan.get("tf_dir", tf_dir)))
+            if apply_run.returncode == 0:
+                # A saved plan can only be applied once
+                os.remove(saved_plan["path"])
+                st.session_state.pop("saved_plan", None)
 if st.button("Terraform Destroy"):
-    st.text_area("Output", run_terraform_command("destroy"), height=350)
+    tfvars_path = selected_tfvars if selected_tfvars != "None" else None
+    if use_job_queue or not workspace.is_repo:
+        job_id = submit_terraform_job("destroy", tf_dir, tfvars=tfvars_path, force_init=force_init)
+        st.info(f"🧵 Queued destroy job {job_id} — see Jobs below.")
+    else:
+        stream_terraform_to_ui(TerraformRun("destroy", tfvars=tfvars_path, force_init=force_init, tf_dir=tf_dir))
+st.caption("Use Streamlit's Stop button to cancel a running command; terraform gets SIGINT and exits cleanly.")
+if not workspace.is_repo:
+    # Workspaces share the repo's remote state, so state changes queue behind each other
+    st.caption("Apply and Destroy from a workspace always run as background jobs, one at a time across workspaces.")
+
+with st.expander("🌍 Plan all environments"):
+    plan_workers = st.number_input("Parallel plans", min_value=1, max_value=16, value=PLAN_MAX_WORKERS)
+    if st.button("Plan all .tfvars"):
+        with directory_lock(tf_dir), st.spinner(f"Planning {len(tfvars_files)} environments..."):
+            plan_results = plan_all_environments(tf_dir, max_workers=int(plan_workers), force_init=force_init)
+        if not plan_results:
+            st.warning("No .tfvars files found.")
+        else:
+            st.dataframe([{k: v for k, v in r.items() if k != "output"} for r in plan_results],
+                         use_container_width=True)
+            for env_col, result in zip(st.columns(len(plan_results)), plan_results):
+                with env_col:
+                    st.markdown(f"**{result['environment']}**")
+                    if result["error"]:
+                        st.error(result["error"])
+                    else:
+                        st.metric("➕ add", result["add"])
+                        st.metric("✏️ change", result["change"])
+                        st.metric("➖ destroy", result["destroy"])
+            for result in plan_results:
+                with st.expander(f"{result['environment']} plan output"):
+                    st.code(result["output"])
 
 # YAML
 st.header("🔍 YAML: Search or Generate")
@@ -472,12 +514,12 @@ st.header("🔍 YAML: Search or Generate")
 yaml_prompt = st.text_area("Prompt for YAML pipeline", height=150)
 
 if st.button("Generate YAML"):
-    with st.spinner("Calling LLM..."):
-        out = get_groq_response(yaml_prompt)
-        st.session_state['raw_groq_yaml'] = out
-        blocks = extract_blocks(out)
-        st.session_state['yaml_blocks'] = blocks
-        st.success(f"✅ YAML/tfvars files generated: {', '.join(blocks.keys())}")
+    out, blocks = generate_blocks_to_ui(yaml_prompt, use_cache=not bypass_llm_cache, planner=planner_mode,
+                                        max_workers=int(planner_workers))
+    st.session_state['raw_groq_yaml'] = out
+    st.session_state['yaml_blocks'] = blocks
+    st.success(f"✅ YAML/tfvars files generated: {', '.join(blocks.keys())}")
+    show_issues(prevalidate.validate_files(blocks))
 
 if 'raw_groq_yaml' in st.session_state:
     st.subheader("Raw Groq YAML Response (copy if needed)")
@@ -504,20 +546,24 @@ if st.session_state.yaml_blocks:
 
         if st.button(f"💾 Save '{filename}'", key=f"save_{filename}"):
             if filename.endswith(".tfvars") or filename.endswith(".tf"):
-                save_path = os.path.join(TERRAFORM_DIR, filename)
+                save_path = os.path.join(tf_dir, filename)
             else:
-                save_path = os.path.join(PIPELINES_DIR, filename)
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            with open(save_path, "w") as f:
-                f.write(st.session_state[filename])
-            st.success(f"✅ Saved: {save_path}")
+                save_path = os.path.join(pipelines_dir, filename)
+            show_issues(prevalidate.validate_files({filename: st.session_state[filename]}))
+            # Identical content isn't rewritten, so git doesn't have to rehash it
+            if write_bytes(save_path, st.session_state[filename].encode()):
+                invalidate_ui_state()
+                st.success(f"✅ Saved: {save_path}")
+            else:
+                st.info(f"No changes to {save_path}")
 
 # --- Git Commit ---
 st.header("📌 Git Commit & Push")
+if not workspace.is_repo:
+    st.caption("Commits are made from the repo directory; promote this workspace's changes first (sidebar).")
 
 # Get all files (terraform + pipelines)
-all_files = [os.path.relpath(f, BASE_DIR) for f in glob.glob(f"{TERRAFORM_DIR}/**/*.tf", recursive=True)] + \
-            [os.path.relpath(f, BASE_DIR) for f in glob.glob(f"{PIPELINES_DIR}/**/*.yml", recursive=True)]
+all_files = cached_commit_files(BASE_DIR, _git_state_key(BASE_DIR))
 
 # Add an "ALL" option
 files_to_choose = ["ALL"] + all_files
@@ -539,29 +585,52 @@ pr_body = st.text_area("Pull Request Body", "Automated PR for infra changes")
 
 st.header("🚀 Deploy Workflows to GitHub")
 
+prune_workflows = st.checkbox("Remove workflows that are no longer in pipelines/github", value=False)
 if st.button("Deploy Workflows"):
     if not username or not token:
         st.error("Please provide Git username & token first.")
     else:
-        result = deploy_workflows_to_github(branch, username, token)
+        deploy_report = {}
+        result = deploy_workflows_to_github(branch, username, token, prune=prune_workflows, report=deploy_report,
+                                            src_dir=pipelines_dir, dest_dir=workspace.workflows_dir)
         st.success(result)
+        if deploy_report:
+            show_issues(deploy_report["issues"], "Skipped invalid workflows")
+            for kind in ("added", "modified", "removed", "invalid"):
+                if deploy_report["changes"][kind]:
+                    st.caption(f"{kind}: {', '.join(deploy_report['changes'][kind])}")
+            for name, diff in deploy_report["diffs"].items():
+                with st.expander(f"Diff: {name}"):
+                    st.code(diff, language="diff")
+            if any(deploy_report["changes"][kind] for kind in ("added", "modified", "removed")):
+                invalidate_ui_state()
         
 st.header("🚀 Git Commit & Push")     
 if st.button("Commit, Push"):
-    try:
-        result = git_commit_push(files, commit_msg, branch, username, token)
-        st.success(result)
-    except Exception as e:
-        st.error(str(e))
-        
+    with traced_action("ui.commit_push"):
+        if use_job_queue:
+            job_id = submit_commit_push_job(files, commit_msg, branch, username, token)
+            st.info(f"🧵 Queued commit & push job {job_id} — see Jobs below.")
+        else:
+            try:
+                push_timings = {}
+                result = git_commit_push(files, commit_msg, branch, username, token, timings=push_timings,
+                                         notify=notify_ui)
+                invalidate_ui_state()
+                st.success(result)
+                st.caption(f"⏱ {format_timings(push_timings)}")
+            except Exception as e:
+                st.error(str(e))
+
 st.header("🚀 Raise PR") 
 if st.button("Create PR"):
-    try:
-        if owner and repo_name:
-            pr_url = create_pull_request(owner, repo_name, branch, base_branch, pr_title, pr_body,token)
-            st.success(f"✅ Pull Request Created: [View PR]({pr_url})")
-    except Exception as e:
-        st.error(str(e))
+    with traced_action("ui.create_pr"):
+        try:
+            if owner and repo_name:
+                pr_url = create_pull_request(owner, repo_name, branch, base_branch, pr_title, pr_body,token)
+                st.success(f"✅ Pull Request Created: [View PR]({pr_url})")
+        except Exception as e:
+            st.error(str(e))
 
 
         
@@ -575,52 +644,168 @@ cicd_token = token  # reuse same Git PAT
 
 if st.button("🔍 List Workflows"):
     try:
-        workflows = list_workflows(cicd_owner, cicd_repo, cicd_token)
-        st.session_state["workflows"] = workflows
+        # Revalidates the local Actions index (a 304 when nothing changed)
+        workflows = list_workflows(cicd_owner, cicd_repo, cicd_token, max_age=0)
+        actions_index.get_index().sync_runs(cicd_owner, cicd_repo, cicd_token, max_age=0)
         st.success(f"Found: {', '.join([w[0] for w in workflows])}")
     except Exception as e:
         st.error(e)
 
-if "workflows" in st.session_state:
+# Workflows and runs come from the index, so every session sees them without refetching
+indexed_workflows = [(wf["name"], wf["id"]) for wf in actions_index.get_index().workflows(cicd_owner, cicd_repo)]
+if indexed_workflows:
     selected_wf = st.selectbox(
         "Select workflow to trigger",
-        st.session_state["workflows"]
+        indexed_workflows
     )
     wf_name, wf_id = selected_wf
 
+    branch_runs = actions_index.get_index().runs(cicd_owner, cicd_repo, workflow=wf_id, branch=cicd_branch, limit=10)
+    if branch_runs:
+        latest = branch_runs[0]
+        st.markdown(f"Latest run on `{cicd_branch}`: **{latest['status']}** ({latest.get('conclusion') or '—'}), "
+                    f"created {latest['created_at']} — [open]({latest.get('html_url')})")
+        with st.expander(f"Recent runs on {cicd_branch}"):
+            st.dataframe([{k: run.get(k) for k in ("id", "event", "status", "conclusion", "created_at")}
+                          for run in branch_runs], use_container_width=True, hide_index=True)
+    else:
+        st.caption(f"No indexed runs of {wf_name} on {cicd_branch}.")
+
     if st.button("🚀 Trigger Workflow"):
         try:
+            dispatched_at = time.time()
             trigger_workflow(cicd_owner, cicd_repo, wf_id, cicd_branch, cicd_token)
+            watcher = run_watcher.watch_run(cicd_owner, cicd_repo, wf_id, cicd_branch, cicd_token, dispatched_at)
+            st.session_state.setdefault("run_watchers", []).append(watcher.id)
             st.success(f"Triggered workflow: {wf_name} on branch {cicd_branch}")
-
-            with st.spinner("⏳ Waiting for CI/CD run to complete..."):
-                run_completed = False
-                while not run_completed:
-                    runs = get_workflow_runs(cicd_owner, cicd_repo, wf_id, cicd_token)
-                    latest_run = runs[0] if runs else None
-                    if latest_run:
-                        status = latest_run["status"]
-                        conclusion = latest_run.get("conclusion")
-                        st.info(f"Status: {status} | Conclusion: {conclusion}")
-                        if status == "completed":
-                            run_completed = True
-                            if conclusion == "success":
-                                st.success("✅ CI/CD Passed!")
-                                # Optional: Merge PR if you want
-                                if st.checkbox("Auto-merge PR if CI passes"):
-                                    pr_num = st.text_input("PR Number to merge")
-                                    if st.button("🔀 Merge PR Now"):
-                                        merge_pull_request(cicd_owner, cicd_repo, pr_num, cicd_token)
-                                        st.success("PR merged! ✅")
-                            else:
-                                st.error("❌ CI/CD Failed.")
-                            break
-                        else:
-                            time.sleep(5)
-                    else:
-                        st.warning("No runs found yet. Waiting...")
-                        time.sleep(5)
         except Exception as e:
             st.error(e)
 
-
+# Watched runs refresh on their own without blocking the rest of the page
+def render_watched_runs():
+    watcher_ids = st.session_state.get("run_watchers", [])
+    if not watcher_ids:
+        return
+    st.subheader("⏳ Watched CI/CD runs")
+    for watcher_id in list(watcher_ids):
+        watcher = run_watcher.get_watcher(watcher_id)
+        if watcher is None:
+            watcher_ids.remove(watcher_id)
+            continue
+        run = watcher.snapshot()
+        label = f"{run['repo']} @ {run['ref']} — {run['status']}"
+        if run["conclusion"]:
+            label += f" ({run['conclusion']})"
+        with st.expander(label, expanded=not run["done"]):
+            if run["html_url"]:
+                st.markdown(f"[Open run #{run['run_id']}]({run['html_url']})")
+            for stamp, message in watcher.updates:
+                st.text(f"{stamp}  {message}")
+            st.caption(f"{run['polls']} polls, {run['not_modified']} not modified")
+
+            if run["error"]:
+                st.error(run["error"])
+            elif run["status"] == "completed":
+                if run["conclusion"] == "success":
+                    st.success("✅ CI/CD Passed!")
+                    pr_num = st.text_input("PR Number to merge", key=f"merge_pr_{watcher_id}")
+                    if pr_num and st.button("🔀 Merge PR Now", key=f"merge_{watcher_id}"):
+                        try:
+                            merge_pull_request(watcher.owner, watcher.repo_name, pr_num, watcher.token)
+                            st.success("PR merged! ✅")
+                        except Exception as e:
+                            st.error(e)
+                else:
+                    st.error("❌ CI/CD Failed.")
+
+            if run["done"]:
+                if st.button("Dismiss", key=f"dismiss_{watcher_id}"):
+                    run_watcher.forget_watcher(watcher_id)
+                    watcher_ids.remove(watcher_id)
+            elif st.button("Stop watching", key=f"stop_{watcher_id}"):
+                run_watcher.stop_watcher(watcher_id)
+
+# --- Jobs panel ---
+def render_jobs():
+    job_rows = jobs.get_queue().list(limit=20)
+    if not job_rows:
+        return
+    st.header("🧵 Jobs")
+    st.dataframe([{
+        "id": j["id"],
+        "job": j["label"],
+        "status": j["status"],
+        "queued": time.strftime("%H:%M:%S", time.localtime(j["created"])),
+        "seconds": round((j["finished"] or time.time()) - j["started"], 1) if j["started"] else None,
+        "error": j["error"],
+    } for j in job_rows], use_container_width=True)
+
+    job_id = st.selectbox("Show job", [j["id"] for j in job_rows],
+                          format_func=lambda i: next(f"{j['id']} — {j['label']} ({j['status']})"
+                                                     for j in job_rows if j["id"] == i))
+    job = jobs.get_queue().get(job_id)
+    if job is None:
+        return
+    st.code(job["log"][-20000:] or "(no output yet)")
+    if job["status"] in ("queued", "running"):
+        if st.button("Cancel job", key=f"cancel_job_{job_id}"):
+            jobs.get_queue().cancel(job_id)
+    result = job["result"] or {}
+    if result.get("timings"):
+        st.caption(f"⏱ {format_timings(result['timings'])}")
+    if result.get("saved_plan") and os.path.exists(result["saved_plan"]["path"]):
+        if st.button("📋 Use this plan", key=f"use_plan_{job_id}"):
+            st.session_state["saved_plan"] = result["saved_plan"]
+            rerun_app()
+
+if hasattr(st, "fragment"):
+    render_jobs = st.fragment(run_every=3)(render_jobs)
+render_jobs()
+
+# --- Trace waterfall ---
+def render_waterfall(rows):
+    try:
+        import altair as alt
+    except ImportError:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        return
+    # Numbered so repeated span names (one file.write per file) get their own bar
+    rows = [dict(row, label=f"{n}. {row['span']}") for n, row in enumerate(rows, 1)]
+    chart = alt.Chart(alt.Data(values=rows)).mark_bar().encode(
+        x=alt.X("start_ms:Q", title="ms"),
+        x2="end_ms:Q",
+        y=alt.Y("label:N", sort=None, title=None),
+        color=alt.Color("status:N", scale=alt.Scale(domain=["OK", "ERROR", "UNSET"],
+                                                    range=["#4c78a8", "#e45756", "#bab0ac"])),
+        tooltip=["span:N", "duration_ms:Q", "status:N"],
+    ).properties(height=max(120, 22 * len(rows)))
+    st.altair_chart(chart, use_container_width=True)
+
+with st.expander("⏱ Trace waterfall (this session)", expanded=False):
+    session_traces = tracing.group_traces(tracing.recent_spans(session=st.session_state["trace_session"]))
+    if not session_traces:
+        st.caption(f"No traced actions yet. Spans are also written to {tracing.TRACE_FILE}.")
+    else:
+        def trace_label(trace_id):
+            first = session_traces[trace_id][0]
+            started = time.strftime("%H:%M:%S", time.localtime(first["startTimeUnixNano"] / 1e9))
+            return f"{started} {first['name']} ({len(session_traces[trace_id])} spans)"
+        trace_id = st.selectbox("Action", list(reversed(session_traces)), format_func=trace_label)
+        trace_rows = tracing.waterfall(session_traces[trace_id])
+        render_waterfall(trace_rows)
+        st.dataframe([{k: r[k] for k in ("span", "start_ms", "duration_ms", "status")} for r in trace_rows],
+                     use_container_width=True, hide_index=True)
+
+# Rerun cost (fragments refresh on their own and aren't counted on their reruns)
+rerun_ms = (time.perf_counter() - rerun_started) * 1000
+rerun_history = st.session_state.setdefault("rerun_ms", [])
+rerun_history.append(rerun_ms)
+del rerun_history[:-20]
+st.sidebar.caption(f"⏱ Rerun {rerun_ms:.0f} ms (avg of last {len(rerun_history)}: "
+                   f"{sum(rerun_history) / len(rerun_history):.0f} ms)")
+
+if hasattr(st, "fragment"):
+    render_watched_runs = st.fragment(run_every=3)(render_watched_runs)
+else:
+    st.button("🔄 Refresh run status")
+render_watched_runs()
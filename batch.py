@@ -0,0 +1,142 @@
+# batch.py
+#
+# Runs many prompts from a JSONL file in parallel: generate -> pre-validate ->
+# write -> terraform fmt/validate, each item in its own directory, with one
+# result line per item appended to an output JSONL as soon as it finishes.
+#
+#   python cli.py batch prompts.jsonl --output results.jsonl --workers 8 --rpm 30
+
+import os
+import re
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cockpit
+
+BATCH_DIR = os.path.join(cockpit.BASE_DIR, ".batch")
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+# Requests per minute sent to the LLM API across all workers (0 = unlimited),
+# counting every request an item makes (planner files, pre-validation retries)
+# but not cache hits; http_client additionally backs off on 429s and exhausted
+# quota headers
+BATCH_RPM = float(os.getenv("BATCH_RPM", 0))
+OUTPUT_TAIL_LINES = 40
+
+class RateLimiter:
+    # Spaces calls at least 60/rpm seconds apart across threads
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def read_items(path):
+    # Accepts {"id"|"request_id", "prompt"|"body"} per line; blank lines are skipped
+    items = []
+    with open(path) as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompt = record.get("prompt") or record.get("body")
+            if not prompt:
+                raise Exception(f"❌ {path}:{n} has no prompt or body.")
+            item_id = str(record.get("id") or record.get("request_id") or f"item-{n}")
+            items.append({"id": item_id, "prompt": prompt, "line": n})
+    return items
+
+def _safe_name(item_id):
+    return re.sub(r'[^\w.-]+', "_", item_id)[:80]
+
+def item_dir(batch_dir, item):
+    # Line number first so duplicate ids never share a directory
+    return os.path.join(batch_dir, f"{item['line']:04d}_{_safe_name(item['id'])}")
+
+def _tail(run):
+    return "\n".join(list(run.lines)[-OUTPUT_TAIL_LINES:])
+
+def run_item(item, out_dir, limiter, use_cache=True, planner=False, validate=True, max_retries=1):
+    result = {"id": item["id"], "dir": out_dir, "status": "ok", "error": None, "timings": {}}
+    timings = result["timings"]
+    # Total wait on the limiter over the item's requests; planner files wait
+    # side by side, so it can exceed "generate", which it is part of
+    timings["queued"] = 0.0
+    queued_lock = threading.Lock()
+
+    def throttle():
+        # Called by generate_files before each LLM request it sends
+        start = time.perf_counter()
+        limiter.wait()
+        with queued_lock:
+            timings["queued"] = round(timings["queued"] + time.perf_counter() - start, 3)
+
+    try:
+        start = time.perf_counter()
+        generated = cockpit.generate_files(item["prompt"], base_dir=out_dir, use_cache=use_cache, planner=planner,
+                                           max_retries=max_retries, reject_invalid=True, before_request=throttle)
+        timings["generate"] = round(time.perf_counter() - start, 3)
+        blocks = generated["files"]
+        if not blocks:
+            raise Exception("No files found in the model output.")
+        result["files"] = sorted(blocks)
+        result["attempts"] = generated["attempts"]
+        result["issues"] = generated["issues"]
+        if generated["rejected"]:
+            # Pre-validation failed: nothing was written, terraform isn't worth spawning
+            result["status"] = "invalid"
+            result["error"] = "Pre-validation failed"
+            return result
+        result["changes"] = {kind: len(files) for kind, files in generated["changes"].items()}
+
+        if validate and any(f.endswith(".tf") for f in blocks):
+            for command in ("fmt", "validate"):
+                run = cockpit.TerraformRun(command, init=command == "validate", backend=False, tf_dir=out_dir)
+                run.run()
+                timings.update({k: round(v, 3) for k, v in run.timings.items()})
+                if run.returncode != 0:
+                    result["status"] = "invalid"
+                    result["error"] = f"terraform {command} exited with {run.returncode}"
+                    result["output"] = _tail(run)
+                    break
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+    return result
+
+def run_batch(input_path, output_path, workers=BATCH_WORKERS, rpm=BATCH_RPM, batch_dir=BATCH_DIR,
+              use_cache=True, planner=False, validate=True, max_retries=1, on_result=None):
+    # Returns a summary; every result is appended to output_path (and passed
+    # to on_result) in completion order, so a long batch can be tailed.
+    items = read_items(input_path)
+    limiter = RateLimiter(rpm)
+    counts = {}
+    start = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "a") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_item, item, item_dir(batch_dir, item), limiter, use_cache, planner, validate,
+                        max_retries): item
+            for item in items
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            result["line"] = futures[future]["line"]
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            if on_result:
+                on_result(result)
+    elapsed = time.perf_counter() - start
+    return {"items": len(items), "counts": counts, "seconds": round(elapsed, 2),
+            "items_per_min": round(60 * len(items) / elapsed, 1) if elapsed else 0.0}
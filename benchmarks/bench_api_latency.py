@@ -0,0 +1,159 @@
+# benchmarks/bench_api_latency.py
+#
+# End-to-end latency benchmark for the Groq and GitHub helpers in cockpit.py,
+# run against benchmarks/mock_server.py so it needs no network or tokens.
+# Reports p50/p95 latency, throughput and peak memory per scenario. The
+# built-in server shares the process (and tracemalloc), so use --server with a
+# separately started mock_server.py when absolute numbers matter.
+#
+#   python benchmarks/bench_api_latency.py --iterations 50 --concurrency 4
+#   python benchmarks/bench_api_latency.py --server http://127.0.0.1:8765 --json results.json
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import start_server
+
+OWNER, REPO = "mock-org", "mock-repo"
+TOKEN = "mock-token"
+PROMPT = "Create an S3 bucket with versioning enabled"
+
+def load_cockpit(base_url):
+    # cockpit.py reads its API bases at import time and the LLM cache writes
+    # to the working directory, so import it from a scratch directory
+    os.environ["GROQ_API_BASE"] = base_url
+    os.environ["GITHUB_API"] = base_url
+    os.environ.setdefault("GROQ_API_KEY", "mock-key")
+    os.chdir(tempfile.mkdtemp(prefix="cockpit-bench-"))
+    import cockpit
+    return cockpit
+
+def scenarios(cockpit):
+    def chat():
+        cockpit.get_groq_response(PROMPT, use_cache=False)
+
+    def chat_stream():
+        stats = {}
+        for _ in cockpit.stream_groq_response(PROMPT, stats=stats, use_cache=False):
+            pass
+        return {"ttft": stats.get("ttft"), "tokens_per_sec": stats.get("tokens_per_sec")}
+
+    def create_pr():
+        cockpit.create_pull_request(OWNER, REPO, "feature", "main", "Bench PR", "", TOKEN)
+
+    # max_age=0: every call revalidates the Actions index against the server
+    def list_workflows():
+        cockpit.list_workflows(OWNER, REPO, TOKEN, max_age=0)
+
+    def trigger():
+        cockpit.trigger_workflow(OWNER, REPO, 1001, "main", TOKEN)
+
+    def runs():
+        cockpit.get_workflow_runs(OWNER, REPO, 1001, TOKEN, max_age=0)
+
+    def latest_run():
+        # Answered from the local index once the warm-up call has synced it
+        cockpit.latest_workflow_run(OWNER, REPO, 1001, "main", TOKEN)
+
+    def merge():
+        cockpit.merge_pull_request(OWNER, REPO, 1, TOKEN)
+
+    return {
+        "groq.chat": chat,
+        "groq.chat.stream": chat_stream,
+        "github.create_pull_request": create_pr,
+        "github.list_workflows": list_workflows,
+        "github.trigger_workflow": trigger,
+        "github.get_workflow_runs": runs,
+        "github.latest_workflow_run (indexed)": latest_run,
+        "github.merge_pull_request": merge,
+    }
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def measure(name, fn, iterations, concurrency):
+    def timed(_):
+        start = time.perf_counter()
+        extra = fn()
+        return time.perf_counter() - start, extra or {}
+
+    fn()  # warm the connection pool
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, range(iterations)))
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = [elapsed for elapsed, _ in results]
+    row = {
+        "scenario": name,
+        "calls": iterations,
+        "p50_ms": round(1000 * percentile(latencies, 50), 1),
+        "p95_ms": round(1000 * percentile(latencies, 95), 1),
+        "max_ms": round(1000 * max(latencies), 1),
+        "calls_per_sec": round(iterations / wall, 1),
+        "peak_kb": round(peak / 1024, 1),
+    }
+    ttfts = [extra["ttft"] for _, extra in results if extra.get("ttft") is not None]
+    if ttfts:
+        row["ttft_p50_ms"] = round(1000 * percentile(ttfts, 50), 1)
+        row["tokens_per_sec"] = round(sum(extra["tokens_per_sec"] for _, extra in results) / len(results), 1)
+    return row
+
+def print_table(rows):
+    columns = ["scenario", "calls", "p50_ms", "p95_ms", "max_ms", "calls_per_sec", "peak_kb",
+               "ttft_p50_ms", "tokens_per_sec"]
+    widths = {c: max(len(c), *(len(str(r.get(c, ""))) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row.get(c, "")).ljust(widths[c]) for c in columns))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", help="use an already running mock (or real) API base instead of starting one")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--tokens-per-sec", type=float, default=2000)
+    parser.add_argument("--tokens", type=int, default=400, help="completion length in tokens")
+    parser.add_argument("--only", action="append", help="run only scenarios containing this text")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    # load_cockpit() changes directory, so resolve the output path first
+    output = os.path.abspath(args.json) if args.json else None
+
+    base_url = args.server
+    if not base_url:
+        _, base_url = start_server(latency_ms=args.latency_ms, tokens_per_sec=args.tokens_per_sec,
+                                   tokens=args.tokens)
+    cockpit = load_cockpit(base_url)
+    print(f"{base_url} | {args.iterations} calls x {args.concurrency} workers\n")
+
+    rows = []
+    for name, fn in scenarios(cockpit).items():
+        if args.only and not any(text in name for text in args.only):
+            continue
+        rows.append(measure(name, fn, args.iterations, args.concurrency))
+    print_table(rows)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"base_url": base_url, "args": vars(args), "results": rows,
+                       "client": cockpit.http_client.latency_summary()}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_extract_blocks.py
+#
+# Compares the streaming block parser with the original line-stripping
+# extract_blocks on large synthetic LLM responses.
+#
+#   python benchmarks/bench_extract_blocks.py --files 200 --lines 500
+
+import os
+import re
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block_parser import BlockParser, extract_blocks
+
+def legacy_extract_blocks(raw_content):
+    # extract_blocks as it was in app.py before block_parser replaced it
+    blocks = {}
+    current_file = None
+    buffer = []
+
+    file_pattern = re.compile(
+        r'^\**\s*([a-zA-Z0-9_\-/\.]+\.tf(vars)?|[a-zA-Z0-9_\-/\.]+\.ya?ml)\s*\**$',
+        re.IGNORECASE
+    )
+
+    for line in raw_content.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or line.startswith("```"):
+            continue
+
+        match = file_pattern.match(line)
+        if match:
+            filename = match.group(1)
+            if current_file and buffer:
+                blocks[current_file] = "\n".join(buffer).strip()
+                buffer = []
+            current_file = filename
+            continue
+
+        if current_file:
+            buffer.append(line)
+
+    if current_file and buffer:
+        blocks[current_file] = "\n".join(buffer).strip()
+
+    return blocks
+
+def synthetic_response(files, lines):
+    parts = ["Here is the generated infrastructure.\n"]
+    for i in range(files):
+        if i % 2:
+            parts.append(f"\n**pipelines/ci_{i}.yml**\nThis pipeline runs on push.\n```yaml\n")
+            body = [f"  step_{n}:\n    # step {n}\n    run: echo {n}" for n in range(lines // 3)]
+        else:
+            parts.append(f"\n**module_{i}/main.tf**\n```hcl\n")
+            body = [f'resource "null_resource" "r{n}" {{\n  # resource {n}\n}}' for n in range(lines // 3)]
+        parts.append("\n".join(body))
+        parts.append("\n```\n")
+    return "".join(parts)
+
+def stream_parse(raw, chunk_size):
+    # What the UI does with SSE deltas: feed small chunks, consume events
+    parser = BlockParser()
+    events = 0
+    for start in range(0, len(raw), chunk_size):
+        events += len(parser.feed(raw[start:start + chunk_size]))
+    events += len(parser.close())
+    return events
+
+def measure(label, fn, raw, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(raw)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(raw)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mb = len(raw) / 1024 / 1024
+    print(f"{label:<28} {best * 1000:9.1f} ms  {mb / best:8.1f} MB/s  peak {peak / 1024 / 1024:7.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=500)
+    parser.add_argument("--chunk", type=int, default=16, help="stream chunk size in characters")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    raw = synthetic_response(args.files, args.lines)
+    print(f"{args.files} files, {raw.count(chr(10))} lines, {len(raw) / 1024 / 1024:.1f} MB\n")
+    measure("legacy extract_blocks", legacy_extract_blocks, raw, args.repeat)
+    measure("extract_blocks", extract_blocks, raw, args.repeat)
+    measure(f"BlockParser ({args.chunk} char chunks)", lambda r: stream_parse(r, args.chunk), raw, args.repeat)
+
+if __name__ == "__main__":
+    main()
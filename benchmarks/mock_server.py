@@ -0,0 +1,288 @@
+# benchmarks/mock_server.py
+#
+# Local stand-in for the Groq chat completions API and the GitHub REST
+# endpoints the cockpit calls, with configurable latency and token rate.
+#
+#   python benchmarks/mock_server.py --port 8765 --latency-ms 200 --tokens-per-sec 400
+#   GROQ_API_BASE=http://127.0.0.1:8765 GITHUB_API=http://127.0.0.1:8765 streamlit run app.py
+
+import re
+import json
+import time
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs, urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = """### main.tf
+```hcl
+resource "aws_s3_bucket" "mock" {
+  bucket = "cockpit-mock-bucket"
+}
+```
+"""
+
+class MockState:
+    # Everything the handlers share: timing knobs plus a tiny fake repo
+    def __init__(self, latency_ms=50, tokens_per_sec=500, tokens=None, response=DEFAULT_RESPONSE,
+                 run_steps=3, status_codes=None, seed_runs=0):
+        self.latency = latency_ms / 1000
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = tokens
+        self.response = response
+        # Polls before a dispatched run reports completed
+        self.run_steps = run_steps
+        # {"/path/regex": [status, status, ...]} served (and consumed) before the normal reply
+        self.status_codes = status_codes or {}
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.next_pr = 1
+        self.runs = {}
+        self.workflows = [{"id": 1001, "name": "Terraform CI", "path": ".github/workflows/terraform.yml"},
+                          {"id": 1002, "name": "Deploy", "path": ".github/workflows/deploy.yml"}]
+        # Completed history, one run a minute into the past, to exercise paging
+        for n in range(seed_runs):
+            run_id = 1000000 + n
+            self.runs[run_id] = {
+                "id": run_id, "workflow_id": 1001 + n % 2, "head_branch": ("main", "dev")[n // 2 % 2],
+                "event": "push", "status": "completed", "conclusion": "success", "polls": 0,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() - 60 * (seed_runs - n))),
+                "html_url": f"https://github.com/mock/actions/runs/{run_id}",
+            }
+
+    def completion_tokens(self):
+        # Whitespace-preserving pieces so the streamed text joins back exactly
+        pieces = re.findall(r'\s*\S+', self.response) or [self.response]
+        if self.tokens:
+            pieces = (pieces * (self.tokens // len(pieces) + 1))[:self.tokens]
+        return pieces
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, delayed ACKs add ~40ms
+    disable_nagle_algorithm = True
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            # Clients close streamed responses right after [DONE]; that's not an error
+            pass
+
+    # --- Plumbing ---
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _send(self, status, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_cached(self, body, headers=None):
+        # GitHub-style ETags so conditional polling can be exercised
+        etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+        else:
+            self._send(200, body, headers=dict(headers or {}, ETag=etag))
+
+    def _query(self):
+        return {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+
+    def _send_page(self, key, items):
+        # per_page/page paging with a GitHub-style Link header
+        query = self._query()
+        per_page, page = int(query.get("per_page", 30)), int(query.get("page", 1))
+        headers = {}
+        if page * per_page < len(items):
+            base = f"http://{self.headers.get('Host')}{urlsplit(self.path).path}"
+            headers["Link"] = f'<{base}?{urlencode(dict(query, page=page + 1))}>; rel="next"'
+        self._send_cached({"total_count": len(items), key: items[(page - 1) * per_page:page * per_page]}, headers)
+
+    def _filter_runs(self, workflow_id=None):
+        # created=>=<timestamp> as used for incremental refreshes; ISO strings compare in order
+        query = self._query()
+        since = query.get("created", "")[2:] if query.get("created", "").startswith(">=") else ""
+        with self.state.lock:
+            runs = [self._public(run) for run in self.state.runs.values()
+                    if (workflow_id is None or str(run["workflow_id"]) == workflow_id)
+                    and (not query.get("branch") or run["head_branch"] == query["branch"])
+                    and run["created_at"] >= since]
+        runs.sort(key=lambda run: (run["created_at"], run["id"]), reverse=True)
+        return runs
+
+    def _forced_status(self, path):
+        with self.state.lock:
+            for pattern, codes in self.state.status_codes.items():
+                if codes and re.search(pattern, path):
+                    return codes.pop(0)
+        return None
+
+    def _dispatch(self, method):
+        with self.state.lock:
+            self.state.requests += 1
+        path = self.path.split("?", 1)[0]
+        body = self._body() if method in ("POST", "PUT") else {}
+        time.sleep(self.state.latency)
+
+        forced = self._forced_status(path)
+        if forced:
+            return self._send(forced, {"message": "forced by mock"}, headers={"Retry-After": "0"})
+
+        for route_method, pattern, handler in ROUTES:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match:
+                return handler(self, body, *match.groups())
+        self._send(404, {"message": "Not Found"})
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    # --- Groq ---
+    def chat_completions(self, body):
+        pieces = self.state.completion_tokens()
+        model = body.get("model", "mock")
+        usage = {"prompt_tokens": len(json.dumps(body.get("messages", []))) // 4,
+                 "completion_tokens": len(pieces)}
+        if not body.get("stream"):
+            time.sleep(len(pieces) / self.state.tokens_per_sec)
+            return self._send(200, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        delay = 1 / self.state.tokens_per_sec
+        for piece in pieces:
+            self._chunk({"choices": [{"index": 0, "delta": {"content": piece}}]})
+            time.sleep(delay)
+        self._chunk({"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}})
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    def _chunk(self, event):
+        self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    # --- GitHub ---
+    def create_pull_request(self, body, owner, repo):
+        with self.state.lock:
+            number = self.state.next_pr
+            self.state.next_pr += 1
+        self._send(201, {"number": number, "html_url": f"https://github.com/{owner}/{repo}/pull/{number}",
+                         "head": {"ref": body.get("head")}, "base": {"ref": body.get("base")}})
+
+    def merge_pull_request(self, body, owner, repo, number):
+        self._send(200, {"merged": True, "message": f"Pull Request #{number} merged"})
+
+    def list_workflows(self, body, owner, repo):
+        self._send_page("workflows", self.state.workflows)
+
+    def trigger_workflow(self, body, owner, repo, workflow_id):
+        with self.state.lock:
+            run_id = 5000 + len(self.state.runs)
+            self.state.runs[run_id] = {
+                "id": run_id, "workflow_id": int(workflow_id), "head_branch": body.get("ref"),
+                "event": "workflow_dispatch", "status": "queued", "conclusion": None, "polls": 0,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "html_url": f"https://github.com/{owner}/{repo}/actions/runs/{run_id}",
+            }
+        self._send(204)
+
+    def workflow_runs(self, body, owner, repo, workflow_id):
+        self._send_page("workflow_runs", self._filter_runs(workflow_id))
+
+    def repo_runs(self, body, owner, repo):
+        self._send_page("workflow_runs", self._filter_runs())
+
+    def workflow_run(self, body, owner, repo, run_id):
+        with self.state.lock:
+            run = self.state.runs.get(int(run_id))
+            if run:
+                # Each poll moves the run along: queued -> in_progress -> completed
+                run["polls"] += 1
+                if run["polls"] >= self.state.run_steps:
+                    run["status"], run["conclusion"] = "completed", "success"
+                elif run["polls"] > 1:
+                    run["status"] = "in_progress"
+                run = self._public(run)
+        if not run:
+            return self._send(404, {"message": "Not Found"})
+        self._send_cached(run)
+
+    def _public(self, run):
+        return {k: v for k, v in run.items() if k != "polls"}
+
+REPO = r"/repos/([^/]+)/([^/]+)"
+ROUTES = [
+    ("POST", r"/openai/v1/chat/completions", MockHandler.chat_completions),
+    ("POST", rf"{REPO}/pulls", MockHandler.create_pull_request),
+    ("PUT", rf"{REPO}/pulls/(\d+)/merge", MockHandler.merge_pull_request),
+    ("GET", rf"{REPO}/actions/workflows", MockHandler.list_workflows),
+    ("POST", rf"{REPO}/actions/workflows/([^/]+)/dispatches", MockHandler.trigger_workflow),
+    ("GET", rf"{REPO}/actions/workflows/([^/]+)/runs", MockHandler.workflow_runs),
+    ("GET", rf"{REPO}/actions/runs", MockHandler.repo_runs),
+    ("GET", rf"{REPO}/actions/runs/(\d+)", MockHandler.workflow_run),
+]
+
+def start_server(host="127.0.0.1", port=0, **options):
+    # Returns (server, base_url); port 0 picks a free port. Serves from a daemon thread.
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50, help="added to every request")
+    parser.add_argument("--tokens-per-sec", type=float, default=500, help="completion generation rate")
+    parser.add_argument("--tokens", type=int, help="repeat the canned response up to this many tokens")
+    parser.add_argument("--response-file", help="file whose contents are returned as the completion")
+    parser.add_argument("--seed-runs", type=int, default=0, help="pre-populate this many completed workflow runs")
+    args = parser.parse_args()
+
+    response = DEFAULT_RESPONSE
+    if args.response_file:
+        with open(args.response_file) as f:
+            response = f.read()
+    server, url = start_server(args.host, args.port, latency_ms=args.latency_ms,
+                               tokens_per_sec=args.tokens_per_sec, tokens=args.tokens, response=response,
+                               seed_runs=args.seed_runs)
+    print(f"Mock Groq/GitHub API on {url} (Ctrl+C to stop)")
+    print(f"  GROQ_API_BASE={url} GITHUB_API={url} streamlit run app.py")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
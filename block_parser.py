@@ -0,0 +1,182 @@
+# block_parser.py
+
+import re
+
+import tracing
+
+FILE_NAME = r'[\w\-./]+\.(?:tfvars|tf|ya?ml)'
+# "main.tf", "**main.tf**", "`ci.yml`:", "### variables.tf", "# main.tf", "// main.tf"
+HEADER_PATTERN = re.compile(rf'^(?:#{{1,6}}|//)?[\s*_`]*({FILE_NAME})[\s*_`:]*$', re.IGNORECASE)
+FENCE_PATTERN = re.compile(r'^\s*(```+|~~~+)(.*)$')
+FILE_NAME_PATTERN = re.compile(FILE_NAME, re.IGNORECASE)
+# Cheap pre-checks so most lines never reach a regex
+HEADER_SUFFIXES = (".tf", ".tfvars", ".yml", ".yaml")
+HEADER_TRAILER = " \t*_`:"
+FENCE_PREFIXES = ("```", "~~~")
+# Unfenced lines right after a header are held back this long in case a fence
+# follows and they turn out to be prose ("Here is the file:")
+PROSE_LOOKAHEAD = 20
+
+class BlockParser:
+    # Single-pass tokenizer for LLM output. feed() takes text in arbitrary
+    # chunks and returns (filename, chunk) events: an empty chunk means the
+    # file's header was seen and its block (re)starts, otherwise chunk is one
+    # or more lines of file content with indentation and comments untouched.
+    # Memory is bounded by the current line plus PROSE_LOOKAHEAD lines.
+    def __init__(self, prose_lookahead=PROSE_LOOKAHEAD):
+        self.current_file = None
+        self.prose_lookahead = prose_lookahead
+        self._pending = ""
+        self._fence = None
+        self._fence_used = False
+        self._held = []
+        self._unfenced = False
+        self._started = False
+        self._blank_lines = 0
+        self._out = []
+
+    def feed(self, text):
+        self._pending += text
+        if "\n" not in text:
+            return []
+        *lines, self._pending = self._pending.split("\n")
+        events = []
+        for line in lines:
+            self._line(line.rstrip("\r"), events)
+        self._emit(events)
+        return events
+
+    def close(self):
+        events = []
+        if self._pending:
+            self._line(self._pending.rstrip("\r"), events)
+            self._pending = ""
+        self._flush_held(events)
+        self._emit(events)
+        return events
+
+    def _line(self, line, events):
+        if self._fence:
+            if line.strip().startswith(self._fence):
+                self._fence = None
+                # A fence that carried a file ends it; prose after it is ignored
+                if self._fence_used:
+                    self._emit(events)
+                    self.current_file = None
+                return
+            # Inside code a header can only name a fence no file has claimed
+            # yet ("```hcl" then "# main.tf"); once a file owns the block, a
+            # "# outputs.tf" line in it is a comment, not a new file
+            header = None if self.current_file or line[:1].isspace() else _match_header(line)
+            if header:
+                self._start_block(header.group(1), events)
+                self._fence_used = True
+            elif self.current_file:
+                self._content(line, events)
+                self._fence_used = True
+            return
+
+        fence = FENCE_PATTERN.match(line) if line.lstrip().startswith(FENCE_PREFIXES) else None
+        if fence:
+            self._fence = fence.group(1)
+            self._fence_used = False
+            # What we held since the header was an introduction, not content
+            self._held = []
+            name = FILE_NAME_PATTERN.search(fence.group(2))
+            if name:
+                self._start_block(name.group(0), events)
+                self._fence_used = True
+            return
+
+        header = _match_header(line)
+        if header:
+            self._flush_held(events)
+            self._start_block(header.group(1), events)
+            return
+
+        if not self.current_file:
+            return
+        if self._unfenced:
+            self._content(line, events)
+            return
+        self._held.append(line)
+        if len(self._held) > self.prose_lookahead:
+            self._flush_held(events)
+
+    def _start_block(self, filename, events):
+        self._emit(events)
+        self.current_file = filename
+        self._held = []
+        self._unfenced = False
+        self._started = False
+        self._blank_lines = 0
+        events.append((filename, ""))
+
+    def _flush_held(self, events):
+        if not self._held:
+            return
+        held, self._held = self._held, []
+        self._unfenced = True
+        for line in held:
+            self._content(line, events)
+
+    def _content(self, line, events):
+        # Blank lines are only emitted once more content follows, which trims
+        # leading and trailing blanks without buffering the block
+        if not line.strip():
+            if self._started:
+                self._blank_lines += 1
+            return
+        if self._blank_lines:
+            self._out.append("\n" * self._blank_lines)
+            self._blank_lines = 0
+        self._out.append(line)
+        self._out.append("\n")
+        self._started = True
+
+    def _emit(self, events):
+        # Consecutive lines of one file go out as a single chunk
+        if self._out:
+            events.append((self.current_file, "".join(self._out)))
+            self._out = []
+
+def _match_header(line):
+    if not line.rstrip(HEADER_TRAILER).lower().endswith(HEADER_SUFFIXES):
+        return None
+    return HEADER_PATTERN.match(line)
+
+def iter_blocks(chunks):
+    parser = BlockParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+class BlockCollector:
+    # Folds (filename, chunk) events back into whole files. A repeated header
+    # replaces the earlier block once the new one has content.
+    def __init__(self):
+        self.parts = {}
+        self._restarted = set()
+
+    def add(self, filename, chunk):
+        if not chunk:
+            self._restarted.add(filename)
+            return
+        if filename in self._restarted or filename not in self.parts:
+            self._restarted.discard(filename)
+            self.parts[filename] = []
+        self.parts[filename].append(chunk)
+
+    def text(self, filename):
+        return "".join(self.parts.get(filename, [])).rstrip()
+
+    @property
+    def blocks(self):
+        return {f: self.text(f) for f in self.parts}
+
+@tracing.traced("extract_blocks")
+def extract_blocks(raw_content):
+    collector = BlockCollector()
+    for filename, chunk in iter_blocks([raw_content]):
+        collector.add(filename, chunk)
+    return collector.blocks
@@ -0,0 +1,428 @@
+# cli.py
+#
+# Headless entry point for the cockpit: generation, terraform, git and GitHub
+# from the shell or cron, plus a small JSON HTTP API (`serve`). cockpit is
+# imported per command so `--help` and argument errors stay instant.
+#
+#   python cli.py generate "S3 bucket with versioning" --planner
+#   python cli.py terraform plan --tfvars dev.tfvars
+#   python cli.py serve --port 8080
+
+import os
+import sys
+import json
+import argparse
+from contextlib import nullcontext
+from dotenv import load_dotenv
+
+# Before the cockpit modules (and the argument defaults below), which read
+# their settings from the environment
+load_dotenv()
+
+import tracing
+
+def _cockpit():
+    import cockpit
+    return cockpit
+
+def _print_json(data):
+    print(json.dumps(data, indent=2, default=str))
+
+def _github_token():
+    token = os.getenv("GITHUB_TOKEN")
+    if not token:
+        raise SystemExit("❌ GITHUB_TOKEN is not set.")
+    return token
+
+def _read_prompt(args):
+    if args.prompt_file:
+        with open(args.prompt_file) as f:
+            return f.read()
+    if args.prompt == "-":
+        return sys.stdin.read()
+    return args.prompt
+
+# --- Commands ---
+def cmd_generate(args):
+    cockpit = _cockpit()
+    result = cockpit.generate_files(
+        _read_prompt(args), base_dir=os.path.abspath(args.dir), use_cache=not args.no_cache,
+        planner=args.planner, max_workers=args.workers, context=args.context, token_budget=args.budget,
+        prune_all=args.prune_all, dry_run=args.dry_run, max_retries=args.retries,
+        reject_invalid=not args.allow_invalid)
+    if args.json:
+        _print_json(result)
+        return 1 if result["rejected"] else 0
+    if result["issues"]:
+        print(_prevalidation_report(result), file=sys.stderr)
+    if result["rejected"]:
+        return 1
+    if args.dry_run:
+        for path, code in result["files"].items():
+            print(f"### {path}\n{code}\n")
+    else:
+        print(cockpit.format_changes(result["changes"]))
+    print(f"⏱ {result['seconds']}s ({result['attempts']} attempt(s))", file=sys.stderr)
+
+def _prevalidation_report(result):
+    import prevalidate
+    status = "❌ Rejected" if result["rejected"] else "Pre-validation"
+    return f"{status} after {result['attempts']} attempt(s):\n{prevalidate.format_issues(result['issues'])}"
+
+def cmd_validate(args):
+    import prevalidate
+    issues = prevalidate.validate_dir(os.path.abspath(args.dir))
+    if issues:
+        print(prevalidate.format_issues(issues))
+    if prevalidate.has_errors(issues):
+        return 1
+    if args.fast:
+        return 0
+    run = _cockpit().TerraformRun("validate", init=False, tf_dir=os.path.abspath(args.dir))
+    for line in run.stream():
+        print(line, flush=True)
+    return run.returncode
+
+def cmd_terraform(args):
+    cockpit = _cockpit()
+    tf_dir = os.path.abspath(args.dir)
+    plan_file = None
+    if args.command == "plan" and args.saved_plan:
+        name = os.path.splitext(os.path.basename(args.tfvars))[0] if args.tfvars else "default"
+        plan_file = cockpit.plan_file_path(name, tf_dir)
+    elif args.command == "apply" and args.saved_plan:
+        if args.saved_plan is True or not os.path.exists(args.saved_plan):
+            raise SystemExit("❌ apply --saved-plan needs the plan file `plan --saved-plan` printed.")
+        plan_file = os.path.abspath(args.saved_plan)
+    run = cockpit.TerraformRun(args.command, tfvars=args.tfvars, init=args.command not in ("fmt", "validate"),
+                               force_init=args.force_init, tf_dir=tf_dir, plan_file=plan_file)
+    try:
+        for line in run.stream():
+            print(line, flush=True)
+    except KeyboardInterrupt:
+        run.cancel()
+        raise
+    print(f"⏱ {cockpit.format_timings(run.timings)}", file=sys.stderr)
+    if args.command == "plan" and plan_file and run.returncode == 0:
+        print(f"📋 Saved plan: {plan_file}", file=sys.stderr)
+    if args.command == "apply" and plan_file and run.returncode == 0 and os.path.exists(plan_file):
+        # A saved plan can only be applied once
+        os.remove(plan_file)
+    return run.returncode
+
+def cmd_vars(args):
+    import tfvars_index
+    tf_dir = os.path.abspath(args.dir)
+    if args.env:
+        if args.env not in tfvars_index.environments(tf_dir):
+            raise SystemExit(f"❌ No {args.env}.tfvars in {tf_dir}.")
+        values = tfvars_index.effective_values(tf_dir, args.env)
+        if args.json:
+            return _print_json(values)
+        for name, entry in sorted(values.items()):
+            value = tfvars_index.render(entry["value"]) if entry["source"] else "⛔ unset"
+            print(f"{name:<30} {value:<40} {entry['source'] or ''}")
+        return
+    if args.diff:
+        diff = tfvars_index.diff_environments(tf_dir)
+        if args.json:
+            return _print_json(diff)
+        for name, per_env in sorted(diff.items()):
+            print(f"{name}: " + ", ".join(f"{env}={value}" for env, value in per_env.items()))
+        return
+    rows = tfvars_index.variable_report(tf_dir)
+    if args.json:
+        return _print_json(rows)
+    for row in rows:
+        values = "  ".join(f"{env}={row[env]}" for env in tfvars_index.environments(tf_dir))
+        print(f"{row['variable']:<30} {values}  {row['flags']}".rstrip())
+
+def cmd_plan_all(args):
+    cockpit = _cockpit()
+    results = cockpit.plan_all_environments(os.path.abspath(args.dir), max_workers=args.workers,
+                                            force_init=args.force_init, env_workspaces=args.env_workspaces)
+    if args.json:
+        return _print_json(results)
+    for r in results:
+        status = f"❌ {r['error']}" if r["error"] else f"+{r['add']} ~{r['change']} -{r['destroy']}"
+        print(f"{r['environment']:<20} {status} ({r['seconds']}s)")
+    return 1 if any(r["error"] for r in results) else 0
+
+def cmd_commit(args):
+    cockpit = _cockpit()
+    timings = {}
+    message = cockpit.git_commit_push(args.files, args.message, args.branch, args.username, _github_token(),
+                                      timings=timings, notify=lambda level, text: print(text, file=sys.stderr))
+    print(message)
+    print(f"⏱ {cockpit.format_timings(timings)}", file=sys.stderr)
+    return 1 if message.startswith("❌") else 0
+
+def cmd_pr(args):
+    print(_cockpit().create_pull_request(args.owner, args.repo, args.head, args.base, args.title, args.body,
+                                         _github_token()))
+
+def cmd_workflows(args):
+    cockpit = _cockpit()
+    token = _github_token()
+    if args.action == "list":
+        for name, workflow_id in cockpit.list_workflows(args.owner, args.repo, token, max_age=args.max_age):
+            print(f"{workflow_id}\t{name}")
+    elif args.action == "trigger":
+        cockpit.trigger_workflow(args.owner, args.repo, args.workflow, args.ref, token)
+        print(f"✅ Triggered {args.workflow} on {args.ref}")
+    elif args.action == "latest":
+        run = cockpit.latest_workflow_run(args.owner, args.repo, args.workflow, args.branch, token,
+                                          max_age=args.max_age)
+        if not run:
+            raise SystemExit(f"❌ No runs of {args.workflow} on {args.branch or 'any branch'}.")
+        print(f"{run['id']}\t{run['status']}\t{run.get('conclusion')}\t{run.get('html_url')}")
+    else:
+        runs = cockpit.get_workflow_runs(args.owner, args.repo, args.workflow, token, branch=args.branch,
+                                         limit=args.limit, max_age=args.max_age)
+        for run in runs:
+            print(f"{run['id']}\t{run['status']}\t{run.get('conclusion')}\t{run.get('html_url')}")
+
+def cmd_repair(args):
+    import repair
+    result = repair.repair(os.path.abspath(args.dir), candidates=args.candidates, max_rounds=args.rounds,
+                           timeout=args.timeout, dry_run=args.dry_run,
+                           on_event=lambda message: print(message, file=sys.stderr, flush=True))
+    if args.json:
+        _print_json(result)
+    elif result["ok"]:
+        for path, content in result["files"].items():
+            print(f"### {path}\n{content.strip()}\n")
+        if result["changes"]:
+            print(_cockpit().format_changes(result["changes"]), file=sys.stderr)
+    else:
+        print(result["report"])
+    print(f"⏱ {result['rounds']} round(s), {result['tried']} candidate(s), {result['seconds']}s", file=sys.stderr)
+    return 0 if result["ok"] else 1
+
+def cmd_deploy(args):
+    cockpit = _cockpit()
+    report = cockpit.sync_workflow_files(os.path.abspath(args.src), os.path.abspath(args.dest), prune=args.prune,
+                                         validate=not args.no_validate)
+    if args.json:
+        return _print_json(report)
+    if report["issues"]:
+        print(cockpit.prevalidate.format_issues(report["issues"]), file=sys.stderr)
+    for name, diff in report["diffs"].items():
+        print(diff, end="" if diff.endswith("\n") else "\n")
+    print(cockpit.format_changes(report["changes"]))
+    return 1 if report["changes"]["invalid"] else 0
+
+def cmd_batch(args):
+    import batch
+    summary = batch.run_batch(args.input, args.output, workers=args.workers, rpm=args.rpm,
+                              batch_dir=os.path.abspath(args.dir), use_cache=not args.no_cache,
+                              planner=args.planner, validate=not args.no_validate, max_retries=args.retries,
+                              on_result=lambda r: print(f"{r['status']:<8} {r['id']} {r['error'] or ''}".rstrip(),
+                                                        flush=True))
+    print(f"⏱ {summary['items']} items in {summary['seconds']}s ({summary['items_per_min']}/min) "
+          f"{summary['counts']}", file=sys.stderr)
+    return 0 if set(summary["counts"]) <= {"ok"} else 1
+
+def cmd_traces(args):
+    traces = tracing.group_traces(tracing.load_spans(args.file))
+    if not traces:
+        raise SystemExit(f"❌ No spans in {args.file}.")
+    for trace_id in list(traces)[-args.last:]:
+        spans = traces[trace_id]
+        if args.json:
+            _print_json(spans)
+            continue
+        print(f"trace {trace_id}")
+        for row in tracing.waterfall(spans):
+            flag = "" if row["status"] == "OK" else f"  {row['status']}"
+            print(f"  {row['start_ms']:>9.1f} ms  {row['duration_ms']:>9.1f} ms  {row['span']}{flag}")
+
+def cmd_workspaces(args):
+    import workspaces
+    if args.action == "list":
+        rows = [workspaces.summary(ws) for ws in workspaces.list_workspaces()]
+        if args.json:
+            return _print_json(rows)
+        for row in rows:
+            print(f"{row['workspace']:<24} {row['MB']:>9.2f} MB  last used {row['last_used']}  {row['clone']}")
+        return
+    if args.action == "evict":
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else workspaces.WORKSPACE_MAX_BYTES
+        removed = workspaces.evict(max_bytes=max_bytes, min_idle=args.min_idle)
+        print(f"🧹 Removed {len(removed)} workspace(s): {', '.join(removed)}" if removed else "Nothing to evict.")
+        return
+    if not args.name:
+        raise SystemExit(f"❌ A workspace name is required for {args.action}.")
+    try:
+        if args.action == "create":
+            # The terraform dir on stdout, for `--dir "$(python cli.py workspaces create x)"`
+            return print(workspaces.get_workspace(args.name).tf_dir)
+        if args.action == "remove":
+            workspaces.remove_workspace(args.name)
+            return print(f"🗑 Removed workspace {args.name}")
+        changes = workspaces.get_workspace(args.name, create=False).promote(dry_run=args.dry_run)
+    except Exception as e:
+        raise SystemExit(str(e))
+    if args.json:
+        return _print_json(changes)
+    for kind in ("added", "modified", "removed", "conflicts"):
+        for rel in changes[kind]:
+            print(f"{kind:<10} {rel}")
+    print(_cockpit().format_changes(changes), file=sys.stderr)
+    return 1 if changes["conflicts"] else 0
+
+def cmd_serve(args):
+    import api_server
+    if not api_server.API_TOKEN:
+        raise SystemExit("❌ COCKPIT_API_TOKEN is not set; the API can apply and destroy, so it needs a token.")
+    api_server.serve(args.host, args.port)
+
+# --- Parser ---
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cockpit", description="Headless GitOps cockpit")
+    parser.add_argument("--profile", action="store_true",
+                        help="run the command under cProfile and print the hottest functions to stderr")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("generate", help="generate Terraform/YAML files from a prompt")
+    p.add_argument("prompt", nargs="?", default="-", help="prompt text, or - for stdin")
+    p.add_argument("--prompt-file")
+    p.add_argument("--dir", default="terraform", help="directory to write into")
+    p.add_argument("--planner", action="store_true", help="plan files first and generate them in parallel")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--no-cache", action="store_true", help="bypass the LLM response cache")
+    p.add_argument("--context", action="store_true", help="send existing Terraform as context")
+    p.add_argument("--budget", type=int, help="context token budget")
+    p.add_argument("--prune-all", action="store_true", help="remove every .tf/.tfvars not generated")
+    p.add_argument("--dry-run", action="store_true", help="print the files instead of writing them")
+    p.add_argument("--retries", type=int, default=1, help="regenerate output that fails pre-validation")
+    p.add_argument("--allow-invalid", action="store_true", help="write files even if pre-validation fails")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_generate)
+
+    p = sub.add_parser("validate", help="in-process checks, then terraform validate if they pass")
+    p.add_argument("--dir", default="terraform")
+    p.add_argument("--fast", action="store_true", help="skip terraform validate")
+    p.set_defaults(func=cmd_validate)
+
+    p = sub.add_parser("terraform", help="run a terraform command")
+    p.add_argument("command", choices=["fmt", "validate", "plan", "apply", "destroy"])
+    p.add_argument("--dir", default="terraform")
+    p.add_argument("--tfvars")
+    p.add_argument("--force-init", action="store_true")
+    p.add_argument("--saved-plan", nargs="?", const=True, metavar="PLAN_FILE",
+                   help="plan: save the plan under .terraform/plans/ and print its path; apply: apply that file")
+    p.set_defaults(func=cmd_terraform)
+
+    p = sub.add_parser("vars", help="variables and their values across *.tfvars environments")
+    p.add_argument("--dir", default="terraform")
+    p.add_argument("--env", help="show the effective values for one environment")
+    p.add_argument("--diff", action="store_true", help="only variables whose values differ")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_vars)
+
+    p = sub.add_parser("plan-all", help="plan every *.tfvars environment in parallel")
+    p.add_argument("--dir", default="terraform")
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--force-init", action="store_true")
+    p.add_argument("--env-workspaces", action="store_true",
+                   help="plan each environment in its own terraform workspace (created if missing)")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_plan_all)
+
+    p = sub.add_parser("commit", help="commit and push (token from GITHUB_TOKEN)")
+    p.add_argument("--message", "-m", required=True)
+    p.add_argument("--branch", required=True)
+    p.add_argument("--username", default=os.getenv("GITHUB_USERNAME", "git"))
+    p.add_argument("--files", nargs="*", default=["ALL"])
+    p.set_defaults(func=cmd_commit)
+
+    p = sub.add_parser("pr", help="open a pull request")
+    p.add_argument("--owner", required=True)
+    p.add_argument("--repo", required=True)
+    p.add_argument("--head", required=True)
+    p.add_argument("--base", default="main")
+    p.add_argument("--title", required=True)
+    p.add_argument("--body", default="")
+    p.set_defaults(func=cmd_pr)
+
+    p = sub.add_parser("workflows", help="list, trigger or inspect GitHub Actions workflows")
+    p.add_argument("action", choices=["list", "trigger", "runs", "latest"])
+    p.add_argument("--owner", required=True)
+    p.add_argument("--repo", required=True)
+    p.add_argument("--workflow", help="workflow id or file name")
+    p.add_argument("--ref", default="main")
+    p.add_argument("--limit", type=int, default=10)
+    p.add_argument("--branch", help="only runs on this branch (runs/latest)")
+    p.add_argument("--max-age", type=float, default=float(os.getenv("ACTIONS_SYNC_MAX_AGE", 30)),
+                   help="reuse the local Actions index if it was synced this many seconds ago")
+    p.set_defaults(func=cmd_workflows)
+
+    p = sub.add_parser("repair", help="ask the model to fix Terraform until terraform validate passes")
+    p.add_argument("--dir", default="terraform")
+    p.add_argument("--candidates", type=int, default=int(os.getenv("REPAIR_CANDIDATES", 3)),
+                   help="candidate fixes requested and validated in parallel per round")
+    p.add_argument("--rounds", type=int, default=int(os.getenv("REPAIR_MAX_ROUNDS", 3)))
+    p.add_argument("--timeout", type=float, default=float(os.getenv("REPAIR_TIMEOUT", 300)), help="seconds")
+    p.add_argument("--dry-run", action="store_true", help="print the fix instead of writing it")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_repair)
+
+    p = sub.add_parser("deploy", help="copy changed pipelines/github workflows into .github/workflows")
+    p.add_argument("--src", default=os.path.join("pipelines", "github"))
+    p.add_argument("--dest", default=os.path.join(".github", "workflows"))
+    p.add_argument("--prune", action="store_true", help="remove workflows that are not in --src")
+    p.add_argument("--no-validate", action="store_true", help="copy files even if they fail YAML checks")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_deploy)
+
+    p = sub.add_parser("batch", help="generate and validate every prompt in a JSONL file")
+    p.add_argument("input", help='JSONL with {"id", "prompt"} (or request_id/body) per line')
+    p.add_argument("--output", default="batch_results.jsonl", help="results are appended here")
+    p.add_argument("--dir", default=".batch", help="each item gets its own directory under this")
+    p.add_argument("--workers", type=int, default=int(os.getenv("BATCH_WORKERS", 4)))
+    p.add_argument("--rpm", type=float, default=float(os.getenv("BATCH_RPM", 0)),
+                   help="max LLM requests per minute across workers (0 = no client-side limit)")
+    p.add_argument("--planner", action="store_true")
+    p.add_argument("--no-cache", action="store_true")
+    p.add_argument("--no-validate", action="store_true", help="skip terraform fmt/validate")
+    p.add_argument("--retries", type=int, default=1, help="regenerate output that fails pre-validation")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("traces", help="show the span waterfall of recent commands and UI actions")
+    p.add_argument("--file", default=tracing.TRACE_FILE)
+    p.add_argument("--last", type=int, default=1, help="number of traces to show")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_traces)
+
+    p = sub.add_parser("workspaces", help="per-user copies of terraform/ and pipelines/ under .workspaces")
+    p.add_argument("action", choices=["list", "create", "promote", "remove", "evict"])
+    p.add_argument("name", nargs="?")
+    p.add_argument("--dry-run", action="store_true", help="promote: only show what would change in the repo")
+    p.add_argument("--max-mb", type=float, help="evict: disk budget for all workspaces (default WORKSPACE_MAX_MB)")
+    p.add_argument("--min-idle", type=float, default=float(os.getenv("WORKSPACE_MIN_IDLE", 3600)),
+                   help="evict: never remove workspaces used within this many seconds")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_workspaces)
+
+    p = sub.add_parser("serve", help="serve the JSON HTTP API")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.set_defaults(func=cmd_serve)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.cmd == "workflows" and args.action != "list" and not args.workflow:
+        raise SystemExit("❌ --workflow is required for trigger/runs/latest.")
+    # One trace per command; spans also land in .traces/spans.jsonl
+    profiler = tracing.profile(f"cli-{args.cmd}") if args.profile else nullcontext()
+    with profiler as profiled, tracing.span(f"cli.{args.cmd}"):
+        code = args.func(args) or 0
+    if profiled:
+        print(profiled["top"], file=sys.stderr)
+        print(f"⏱ profile saved to {profiled['path']}", file=sys.stderr)
+    return code
+
+if __name__ == "__main__":
+    sys.exit(main())
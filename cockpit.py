@@ -0,0 +1,1183 @@
+# cockpit.py
+#
+# Headless core of the GitOps cockpit: generation, file reconciliation,
+# terraform, git and GitHub helpers. Used by app.py (Streamlit) and cli.py;
+# nothing here imports streamlit, and GitPython is imported on first use.
+
+import os
+import re
+import json
+import glob
+import difflib
+import hashlib
+import signal
+import subprocess
+import threading
+import shutil
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+
+# Before the modules below: they read their settings from the environment on
+# import. app.py and cli.py load it first too, as they import them earlier.
+load_dotenv()
+
+import llm_cache
+import http_client
+import actions_index
+import jobs
+import context_index
+import prevalidate
+import tracing
+from block_parser import FILE_NAME_PATTERN, extract_blocks
+
+# --- Config ---
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
+
+BASE_DIR = os.getcwd()
+TERRAFORM_DIR = os.path.join(BASE_DIR, "terraform")
+PIPELINES_DIR = os.path.join(BASE_DIR, "pipelines", "github")
+WORKFLOWS_DIR = os.path.join(BASE_DIR, ".github", "workflows")
+
+# --- Groq call ---
+# Both API bases can point at benchmarks/mock_server.py for offline runs
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com").rstrip("/")
+GROQ_CHAT_URL = f"{GROQ_API_BASE}/openai/v1/chat/completions"
+GITHUB_API = os.getenv("GITHUB_API", "https://api.github.com").rstrip("/")
+
+def _groq_payload(prompt):
+    return {
+        "model": GROQ_MODEL,
+        "messages": [{"role": "user", "content": prompt}]
+    }
+
+@tracing.traced("groq.chat")
+def get_groq_response(prompt, use_cache=True, before_request=None):
+    # before_request() is called just before a request goes out (not on a
+    # cache hit), e.g. to wait on a rate limiter
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = _groq_payload(prompt)
+    key = llm_cache.cache_key(payload)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            tracing.annotate(cached=True)
+            return cached
+
+    if before_request:
+        before_request()
+    response = http_client.post(GROQ_CHAT_URL, endpoint="groq.chat", headers=headers, json=payload)
+    if response.status_code == 200:
+        content = response.json()["choices"][0]["message"]["content"]
+        llm_cache.put(key, content, model=GROQ_MODEL)
+        return content
+    else:
+        raise Exception(f"Groq API Error: {response.text}")
+
+@tracing.traced("groq.chat.stream")
+def stream_groq_response(prompt, stats=None, use_cache=True):
+    # Yields content deltas as they arrive over SSE. If a dict is passed as
+    # `stats` it is filled with ttft / elapsed / tokens / tokens_per_sec.
+    headers = {
+        "Authorization": f"Bearer {GROQ_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = _groq_payload(prompt)
+    key = llm_cache.cache_key(payload)
+    stats = stats if stats is not None else {}
+    start = time.time()
+
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            stats.update(cached=True, ttft=time.time() - start, elapsed=time.time() - start,
+                         tokens=0, tokens_per_sec=0.0)
+            tracing.annotate(cached=True)
+            yield cached
+            return
+
+    payload["stream"] = True
+    response = http_client.post(GROQ_CHAT_URL, endpoint="groq.chat.stream", headers=headers, json=payload, stream=True)
+    if response.status_code != 200:
+        raise Exception(f"Groq API Error: {response.text}")
+
+    chunks = 0
+    usage = None
+    content = []
+    completed = False
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                completed = True
+                break
+            event = json.loads(data)
+            # Groq reports real token usage on the last chunk
+            usage = (event.get("x_groq") or {}).get("usage") or event.get("usage") or usage
+            choices = event.get("choices") or []
+            delta = choices[0].get("delta", {}).get("content") if choices else None
+            if not delta:
+                continue
+            if "ttft" not in stats:
+                stats["ttft"] = time.time() - start
+            chunks += 1
+            content.append(delta)
+            yield delta
+    finally:
+        response.close()
+        # Only cache complete answers, never a stream the caller abandoned
+        if completed:
+            llm_cache.put(key, "".join(content), model=GROQ_MODEL)
+        elapsed = time.time() - start
+        tokens = (usage or {}).get("completion_tokens") or chunks
+        generation_time = elapsed - stats.get("ttft", 0)
+        stats["elapsed"] = elapsed
+        stats["tokens"] = tokens
+        stats["tokens_per_sec"] = tokens / generation_time if generation_time > 0 else 0.0
+        tracing.annotate(ttft_ms=round(stats.get("ttft", 0) * 1000, 1), tokens=tokens, completed=completed)
+
+def format_stream_stats(stats):
+    if stats.get("cached"):
+        return f"⚡ Served from LLM cache ({stats['elapsed']:.3f}s)"
+    if "ttft" not in stats:
+        return f"⏱ No tokens received ({stats.get('elapsed', 0):.2f}s)"
+    return (f"⏱ First token {stats['ttft']:.2f}s | total {stats['elapsed']:.2f}s | "
+            f"{stats['tokens']} tokens @ {stats['tokens_per_sec']:.1f} tok/s")
+
+# --- Planned multi-file generation ---
+# One short request for a manifest, then one request per file in parallel, so
+# large stacks aren't serialised through (or truncated by) a single completion.
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", 4))
+
+MANIFEST_PROMPT = """List the files needed to fulfil the request below.
+Reply with only a JSON array with one object per file: {{"path": "<relative path>", "purpose": "<one line>"}}.
+Terraform paths (.tf, .tfvars) are relative to the terraform root; pipelines are .yml files.
+
+Request:
+{prompt}"""
+
+FILE_PROMPT = """You are generating one file of a larger set for the request below.
+All files in the set:
+{manifest}
+
+Write only `{path}` ({purpose}). Reference the other files' variables, outputs and modules consistently.
+Reply with the complete file in a single fenced code block and nothing else.
+
+Request:
+{prompt}"""
+
+def plan_file_manifest(prompt, use_cache=True, before_request=None):
+    raw = get_groq_response(MANIFEST_PROMPT.format(prompt=prompt), use_cache=use_cache, before_request=before_request)
+    match = re.search(r'\[.*\]', raw, re.DOTALL)
+    if not match:
+        raise Exception(f"❌ No file manifest in LLM response: {raw[:300]}")
+    manifest = []
+    for entry in json.loads(match.group(0)):
+        if isinstance(entry, str):
+            entry = {"path": entry, "purpose": ""}
+        path = entry.get("path", "").strip().removeprefix("./")
+        if FILE_NAME_PATTERN.fullmatch(path) and path not in [m["path"] for m in manifest]:
+            manifest.append({"path": path, "purpose": entry.get("purpose", "")})
+    if not manifest:
+        raise Exception(f"❌ File manifest lists no .tf/.tfvars/.yml files: {raw[:300]}")
+    return manifest
+
+def generate_file(prompt, entry, manifest, use_cache=True, before_request=None):
+    listing = "\n".join(f"- {m['path']}: {m['purpose']}" for m in manifest)
+    raw = get_groq_response(FILE_PROMPT.format(manifest=listing, path=entry["path"],
+                                               purpose=entry["purpose"], prompt=prompt),
+                            use_cache=use_cache, before_request=before_request)
+    # Prefix the expected header so a bare fenced reply still parses as this file
+    return extract_blocks(f"{entry['path']}\n{raw}").get(entry["path"]) or raw.strip()
+
+def generate_files_parallel(prompt, max_workers=GENERATION_CONCURRENCY, use_cache=True,
+                            manifest=None, on_file=None, before_request=None):
+    # Returns the same {path: content} dict extract_blocks gives for a single
+    # completion. on_file(path, content) is called from this thread as files land.
+    manifest = manifest or plan_file_manifest(prompt, use_cache, before_request)
+    blocks = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(tracing.wrap(generate_file), prompt, entry, manifest, use_cache,
+                               before_request): entry["path"]
+                   for entry in manifest}
+        for future in as_completed(futures):
+            path = futures[future]
+            blocks[path] = future.result()
+            if on_file:
+                on_file(path, blocks[path])
+    return {entry["path"]: blocks[entry["path"]] for entry in manifest}
+
+# --- File ops ---
+GENERATED_MANIFEST = os.path.join(".terraform", "generated_files.json")
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def same_content(path, data):
+    # Size first, so most changed files are never hashed
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+    except OSError:
+        return False
+    return file_digest(path) == hashlib.sha256(data).hexdigest()
+
+@tracing.traced("file.write")
+def write_file(path, content):
+    # Generated code is stored stripped; see write_bytes
+    tracing.annotate(path=path)
+    return write_bytes(path, content.strip().encode())
+
+def write_bytes(path, data):
+    # Atomic (temp file + rename) and skipped when the content is identical,
+    # so unchanged files keep their mtime. Returns True if the file changed.
+    if same_content(path, data):
+        return False
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+def unshare_files(paths):
+    # A workspace may hardlink files with the repo (see workspaces.py). Our
+    # writes replace files, which is safe; anything that rewrites in place
+    # (terraform fmt) gets a private copy of each shared file first.
+    for path in paths:
+        try:
+            if os.stat(path).st_nlink < 2:
+                continue
+        except OSError:
+            continue
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copy2(path, tmp_path)
+        os.replace(tmp_path, path)
+
+def terraform_files(base_dir=TERRAFORM_DIR):
+    # glob's ** skips dot dirs, so .terraform/ is never included
+    return sorted(os.path.relpath(f, base_dir)
+                  for f in glob.glob(os.path.join(base_dir, "**", "*.tf*"), recursive=True)
+                  if f.endswith((".tf", ".tfvars")))
+
+def _read_manifest(base_dir):
+    try:
+        with open(os.path.join(base_dir, GENERATED_MANIFEST)) as f:
+            return set(json.load(f))
+    except (OSError, ValueError):
+        return set()
+
+def _write_manifest(base_dir, files):
+    path = os.path.join(base_dir, GENERATED_MANIFEST)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(sorted(files), f)
+
+@tracing.traced("file.reconcile")
+def reconcile_files(blocks, base_dir=TERRAFORM_DIR, prune_all=False, prune=True):
+    # Writes only what changed and removes only files the previous generation
+    # produced but this one dropped (or, with prune_all, every .tf/.tfvars not
+    # in `blocks`, which is what clearing the folder used to do). Edit-style
+    # generations pass prune=False: files they don't mention are unchanged.
+    changes = {"added": [], "modified": [], "removed": [], "unchanged": []}
+    generated = {os.path.normpath(f) for f in blocks}
+    for rel, code in blocks.items():
+        rel = os.path.normpath(rel)
+        path = os.path.join(base_dir, rel)
+        existed = os.path.exists(path)
+        if not write_file(path, code):
+            changes["unchanged"].append(rel)
+        elif existed:
+            changes["modified"].append(rel)
+        else:
+            changes["added"].append(rel)
+
+    previous = _read_manifest(base_dir)
+    if not prune:
+        candidates = set()
+        generated |= previous
+    elif prune_all:
+        candidates = set(terraform_files(base_dir))
+    else:
+        candidates = previous
+    for rel in sorted(candidates - generated):
+        path = os.path.join(base_dir, rel)
+        if os.path.exists(path):
+            os.remove(path)
+            changes["removed"].append(rel)
+
+    _write_manifest(base_dir, generated)
+    return changes
+
+def format_changes(changes):
+    counts = ", ".join(f"{len(files)} {kind}" for kind, files in changes.items())
+    return f"📝 {counts}"
+
+def generate_blocks(prompt, use_cache=True, planner=False, max_workers=GENERATION_CONCURRENCY,
+                    before_request=None):
+    # Non-streaming counterpart of the UI's generate step: returns (raw, blocks)
+    if planner:
+        manifest = plan_file_manifest(prompt, use_cache=use_cache, before_request=before_request)
+        blocks = generate_files_parallel(prompt, max_workers=max_workers, use_cache=use_cache, manifest=manifest,
+                                         before_request=before_request)
+        return json.dumps(manifest, indent=2), blocks
+    raw = get_groq_response(prompt, use_cache=use_cache, before_request=before_request)
+    return raw, extract_blocks(raw)
+
+def surviving_files(base_dir, prune_all=False, prune=True):
+    # Existing files reconcile_files() would leave in place, so generated
+    # blocks can be pre-validated together with them before writing
+    if not prune:
+        return None
+    if prune_all:
+        return set()
+    return set(terraform_files(base_dir)) - _read_manifest(base_dir)
+
+@tracing.traced("prevalidate")
+def prevalidate_blocks(blocks, base_dir=TERRAFORM_DIR, prune_all=False, prune=True):
+    return prevalidate.validate_files(blocks, base_dir, keep=surviving_files(base_dir, prune_all, prune))
+
+@tracing.traced("generate_files")
+def generate_files(prompt, base_dir=TERRAFORM_DIR, use_cache=True, planner=False,
+                   max_workers=GENERATION_CONCURRENCY, context=False, token_budget=None,
+                   prune_all=False, dry_run=False, max_retries=0, reject_invalid=False, before_request=None):
+    # Prompt -> files on disk in one call. With context, existing blocks from
+    # base_dir are packed into the prompt and files the model omits are kept.
+    # Output failing pre-validation is regenerated up to max_retries times
+    # and, with reject_invalid, never written. before_request is called
+    # before every LLM request, retries and planner files included.
+    start = time.time()
+    context_stats = None
+    if context:
+        prompt, context_stats = context_index.build_prompt_with_context(
+            prompt, base_dir, token_budget=token_budget or context_index.CONTEXT_TOKEN_BUDGET)
+    for attempt in range(max_retries + 1):
+        raw, blocks = generate_blocks(prompt, use_cache=use_cache, planner=planner, max_workers=max_workers,
+                                      before_request=before_request)
+        issues = prevalidate_blocks(blocks, base_dir, prune_all=prune_all, prune=not context)
+        if not prevalidate.has_errors(issues):
+            break
+        prompt = prevalidate.retry_prompt(prompt, issues)
+    rejected = reject_invalid and prevalidate.has_errors(issues)
+    changes = None
+    if not dry_run and not rejected:
+        changes = reconcile_files(blocks, base_dir=base_dir, prune_all=prune_all, prune=not context)
+    return {
+        "files": blocks,
+        "changes": changes,
+        "issues": issues,
+        "attempts": attempt + 1,
+        "rejected": rejected,
+        "context": context_stats,
+        "seconds": round(time.time() - start, 2),
+    }
+
+# --- Terraform ops ---
+ANSI_PATTERN = re.compile(r'\x1b\[[0-9;]*m')
+# Only the tail of very large plans/applies is kept in memory
+TF_OUTPUT_MAX_LINES = int(os.getenv("TF_OUTPUT_MAX_LINES", 5000))
+
+def remove_ansi_colors(text):
+    return ANSI_PATTERN.sub('', text)
+
+# Provider plugins are downloaded once and shared by every workspace and run
+TF_PLUGIN_CACHE_DIR = os.getenv(
+    "TF_PLUGIN_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".terraform.d", "plugin-cache"))
+INIT_FINGERPRINT_FILE = ".init_fingerprint"
+PLAN_MAX_WORKERS = int(os.getenv("TF_PLAN_MAX_WORKERS", 4))
+# One lock for every init in the process, not one per config dir: all inits
+# install providers into the shared TF_PLUGIN_CACHE_DIR, which terraform does
+# not support concurrent use of. Inits across dirs, workspaces, batch items and
+# repair candidates therefore run one at a time (only the init phase; the
+# commands themselves still run in parallel). Other processes are not covered.
+_init_lock = threading.Lock()
+INIT_LINE_PATTERN = re.compile(
+    r'^\s*(terraform|required_version|required_providers|provider|module|source|version)\b')
+
+def terraform_env(data_dir=None):
+    os.makedirs(TF_PLUGIN_CACHE_DIR, exist_ok=True)
+    env = os.environ.copy()
+    env["TF_PLUGIN_CACHE_DIR"] = TF_PLUGIN_CACHE_DIR
+    if data_dir:
+        env["TF_DATA_DIR"] = data_dir
+    return env
+
+def init_fingerprint(tf_dir=TERRAFORM_DIR):
+    # Only the parts of the config that `terraform init` acts on: provider
+    # requirements, module sources/versions, the backend block and the lock file.
+    digest = hashlib.sha256()
+    tf_files = glob.glob(os.path.join(tf_dir, "**", "*.tf"), recursive=True)
+    for path in sorted(tf_files):
+        rel = os.path.relpath(path, tf_dir)
+        if rel.split(os.sep)[0] == ".terraform":
+            continue
+        digest.update(rel.encode())
+        backend_depth = 0
+        with open(path) as f:
+            for line in f:
+                if backend_depth > 0 or re.match(r'^\s*backend\b', line):
+                    # Every setting inside backend {} needs a re-init
+                    backend_depth += line.count("{") - line.count("}")
+                    digest.update(line.strip().encode())
+                elif INIT_LINE_PATTERN.match(line):
+                    digest.update(line.strip().encode())
+    lock_file = os.path.join(tf_dir, ".terraform.lock.hcl")
+    if os.path.exists(lock_file):
+        with open(lock_file, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _init_marker(tf_dir, data_dir=None):
+    return os.path.join(data_dir or os.path.join(tf_dir, ".terraform"), INIT_FINGERPRINT_FILE)
+
+def needs_terraform_init(tf_dir=TERRAFORM_DIR, force=False, data_dir=None):
+    marker = _init_marker(tf_dir, data_dir)
+    if force or not os.path.exists(marker):
+        return True
+    with open(marker) as f:
+        return f.read().strip() != init_fingerprint(tf_dir)
+
+def mark_terraform_init(tf_dir=TERRAFORM_DIR, data_dir=None):
+    # init may have created or updated the lock file, so fingerprint after it ran
+    marker = _init_marker(tf_dir, data_dir)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(marker, "w") as f:
+        f.write(init_fingerprint(tf_dir))
+
+def _stop_process(proc, grace=30):
+    if proc.poll() is not None:
+        return
+    # SIGINT lets terraform release the state lock and exit cleanly
+    if os.name == "posix":
+        proc.send_signal(signal.SIGINT)
+    else:
+        proc.terminate()
+    try:
+        proc.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+class TerraformRun:
+    # Streams terraform output line by line. Lines are ANSI-stripped as they
+    # arrive and kept in a ring buffer; per-phase wall time ends up in `timings`.
+    def __init__(self, command, tfvars=None, init=True, force_init=False, tf_dir=TERRAFORM_DIR,
+                 max_lines=TF_OUTPUT_MAX_LINES, cancel_event=None, workspace=None, data_dir=None,
+                 plan_file=None, backend=True):
+        self.command = command
+        self.tfvars = tfvars
+        self.plan_file = plan_file
+        self.init = init
+        # backend=False inits without remote state, which is all validate needs
+        self.backend = backend
+        self.force_init = force_init
+        self.tf_dir = tf_dir
+        self.workspace = workspace
+        self.data_dir = data_dir
+        self.lines = deque(maxlen=max_lines)
+        self.dropped = 0
+        self.timings = {}
+        self.returncode = None
+        self.cancel_event = cancel_event or threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def args(self):
+        args = ["terraform", self.command]
+        if self.command == "apply" and self.plan_file:
+            # A saved plan already carries its variables and needs no approval
+            return args + ["-input=false", self.plan_file]
+        if self.tfvars:
+            args += ["-var-file", self.tfvars]
+        if self.command == "plan" and self.plan_file:
+            os.makedirs(os.path.dirname(self.plan_file), exist_ok=True)
+            args.append(f"-out={self.plan_file}")
+        if self.command in ["apply", "destroy"]:
+            args.append("-auto-approve")
+        return args
+
+    def stream(self):
+        with tracing.span(f"terraform.{self.command}", tf_dir=self.tf_dir, tfvars=self.tfvars or ""):
+            yield from self._stream()
+
+    def _stream(self):
+        if self.command == "fmt" or self.init:
+            unshare_files(glob.glob(os.path.join(self.tf_dir, "*.tf")) +
+                          glob.glob(os.path.join(self.tf_dir, "*.tfvars")) +
+                          [os.path.join(self.tf_dir, ".terraform.lock.hcl")])
+        if self.init:
+            with _init_lock:
+                if needs_terraform_init(self.tf_dir, self.force_init, self.data_dir):
+                    init_args = ["terraform", "init", "-input=false"]
+                    if not self.backend:
+                        init_args.append("-backend=false")
+                    yield from self._phase("init", init_args)
+                    if self.returncode != 0:
+                        raise Exception(f"terraform init failed:\n{self.output()}")
+                    mark_terraform_init(self.tf_dir, self.data_dir)
+        if self.workspace and not self.cancelled:
+            yield from self._phase("workspace", ["terraform", "workspace", "select", "-or-create", self.workspace])
+            if self.returncode != 0:
+                raise Exception(f"terraform workspace select failed:\n{self.output()}")
+        if not self.cancelled:
+            yield from self._phase(self.command, self.args())
+
+    def run(self):
+        for _ in self.stream():
+            pass
+        return self.output()
+
+    def output(self):
+        text = "\n".join(self.lines)
+        if self.dropped:
+            text = f"... {self.dropped} earlier lines truncated ...\n{text}"
+        return text
+
+    def _phase(self, name, args):
+        with tracing.span(f"terraform.phase.{name}", args=" ".join(args)) as phase:
+            yield from self._run_phase(name, args)
+            phase.set(returncode=self.returncode)
+
+    def _run_phase(self, name, args):
+        start = time.time()
+        proc = subprocess.Popen(args, cwd=self.tf_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                text=True, bufsize=1, env=terraform_env(self.data_dir))
+        # Cancellation must work even while terraform is silent
+        done = threading.Event()
+        def watch_cancel():
+            while not done.wait(0.2):
+                if self.cancel_event.is_set():
+                    _stop_process(proc)
+                    return
+        threading.Thread(target=watch_cancel, daemon=True).start()
+        try:
+            for line in proc.stdout:
+                line = remove_ansi_colors(line.rstrip("\n"))
+                if len(self.lines) == self.lines.maxlen:
+                    self.dropped += 1
+                self.lines.append(line)
+                yield line
+            proc.wait()
+        finally:
+            # Also reached when the consumer stops iterating (e.g. Streamlit stop/rerun)
+            done.set()
+            _stop_process(proc)
+            proc.stdout.close()
+            self.returncode = proc.returncode
+            self.timings[name] = time.time() - start
+
+@tracing.traced("run_terraform_command")
+def run_terraform_command(command,tfvars=None, force_init=False, tf_dir=TERRAFORM_DIR):
+    return TerraformRun(command, tfvars=tfvars, force_init=force_init, tf_dir=tf_dir).run()
+
+# --- Saved plans ---
+# Plans nobody applied are dropped after this long; they're stale against the state by then
+PLAN_MAX_AGE = 24 * 3600
+
+def plans_dir(tf_dir=TERRAFORM_DIR, data_dir=None):
+    return os.path.join(data_dir or os.path.join(tf_dir, ".terraform"), "plans")
+
+def plan_file_path(name, tf_dir=TERRAFORM_DIR, data_dir=None):
+    # A new file per plan, so a later plan for the same tfvars (another
+    # session, a job, the API) never replaces one an operator is reviewing
+    directory = plans_dir(tf_dir, data_dir)
+    prune_plans(directory)
+    return os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.tfplan")
+
+def prune_plans(directory, max_age=PLAN_MAX_AGE):
+    for path in glob.glob(os.path.join(directory, "*.tfplan")):
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            pass
+
+def show_plan_json(plan_file, tf_dir=TERRAFORM_DIR, data_dir=None):
+    result = subprocess.run(["terraform", "show", "-json", plan_file], cwd=tf_dir,
+                            capture_output=True, text=True, env=terraform_env(data_dir))
+    if result.returncode != 0:
+        raise Exception(f"terraform show failed: {remove_ansi_colors(result.stderr)}")
+    return json.loads(result.stdout)
+
+def parse_plan_changes(plan_json):
+    # Compact model of `resource_changes`: one row per resource that changes
+    changes = []
+    for rc in plan_json.get("resource_changes", []):
+        change = rc.get("change", {})
+        actions = change.get("actions", [])
+        if actions == ["no-op"]:
+            continue
+        if set(actions) == {"create", "delete"}:
+            action = "replace"
+        else:
+            action = actions[0] if actions else "unknown"
+        before = change.get("before") or {}
+        after = change.get("after") or {}
+        changed_attributes = sorted(k for k in set(before) | set(after) if before.get(k) != after.get(k))
+        if action in ("create", "delete"):
+            changed_attributes = []
+        changes.append({
+            "action": action,
+            "address": rc["address"],
+            "module": rc.get("module_address", "root"),
+            "type": rc["type"],
+            "name": rc["name"],
+            "changed_attributes": ", ".join(changed_attributes),
+        })
+    return changes
+
+def summarize_plan_changes(changes):
+    # Same arithmetic as terraform's "Plan: X to add, Y to change, Z to destroy"
+    summary = {"add": 0, "change": 0, "destroy": 0}
+    for change in changes:
+        if change["action"] in ("create", "replace"):
+            summary["add"] += 1
+        if change["action"] in ("delete", "replace"):
+            summary["destroy"] += 1
+        if change["action"] == "update":
+            summary["change"] += 1
+    return summary
+
+def load_saved_plan(plan_file, tf_dir=TERRAFORM_DIR, data_dir=None, tfvars=None):
+    changes = parse_plan_changes(show_plan_json(plan_file, tf_dir, data_dir))
+    return {
+        "path": plan_file,
+        "file": os.path.basename(plan_file),
+        "tf_dir": tf_dir,
+        "tfvars": tfvars,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "changes": changes,
+        "summary": summarize_plan_changes(changes),
+    }
+
+# --- Multi-environment plan ---
+@tracing.traced("plan_environment")
+def plan_environment(tfvars, tf_dir=TERRAFORM_DIR, force_init=False, cancel_event=None, env_workspaces=False):
+    # Each environment plans with its own TF_DATA_DIR so parallel runs don't
+    # share module/provider installs. They all plan against the default
+    # terraform workspace, the state the single Plan/Apply uses; env_workspaces
+    # opts into one terraform workspace per environment instead (created in
+    # the backend if missing, needs terraform >= 1.4).
+    env_name = os.path.splitext(os.path.basename(tfvars))[0]
+    data_dir = os.path.join(tf_dir, ".terraform", "envs", env_name)
+    plan_file = plan_file_path(env_name, tf_dir, data_dir)
+    run = TerraformRun("plan", tfvars=tfvars, tf_dir=tf_dir, force_init=force_init,
+                       cancel_event=cancel_event, workspace=env_name if env_workspaces else None,
+                       data_dir=data_dir, plan_file=plan_file)
+    error = None
+    summary = {}
+    try:
+        run.run()
+        if run.returncode != 0:
+            error = f"terraform plan exited with {run.returncode}"
+        else:
+            summary = load_saved_plan(plan_file, tf_dir, data_dir, tfvars)["summary"]
+    except Exception as e:
+        error = str(e)
+    finally:
+        # Only the summary is kept; these plans are never applied
+        if os.path.exists(plan_file):
+            os.remove(plan_file)
+    return {
+        "environment": env_name,
+        "tfvars": tfvars,
+        "add": summary.get("add"),
+        "change": summary.get("change"),
+        "destroy": summary.get("destroy"),
+        "seconds": round(sum(run.timings.values()), 1),
+        "error": error,
+        "output": run.output(),
+    }
+
+@tracing.traced("plan_all_environments")
+def plan_all_environments(tf_dir=TERRAFORM_DIR, max_workers=PLAN_MAX_WORKERS, force_init=False, env_workspaces=False):
+    tfvars_files = sorted(os.path.basename(f) for f in glob.glob(os.path.join(tf_dir, "*.tfvars")))
+    if not tfvars_files:
+        return []
+    plan = lambda f: plan_environment(f, tf_dir=tf_dir, force_init=force_init, env_workspaces=env_workspaces)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(tracing.wrap(plan), tfvars_files))
+
+def validate_terraform(tf_dir=TERRAFORM_DIR):
+    # terraform is only spawned once the in-process checks pass
+    issues = prevalidate.validate_dir(tf_dir)
+    if prevalidate.has_errors(issues):
+        return prevalidate.format_issues(issues)
+    return TerraformRun("validate", init=False, tf_dir=tf_dir).run()
+
+def format_terraform(tf_dir=TERRAFORM_DIR):
+    return TerraformRun("fmt", init=False, tf_dir=tf_dir).run()
+
+
+# --- Git ops ---
+def _git():
+    # GitPython is slow to import and only needed for git operations
+    import git
+    return git
+
+def is_git_repo():
+    git = _git()
+    try:
+        git.Repo(BASE_DIR).git_dir
+        return True
+    except git.exc.InvalidGitRepositoryError:
+        return False
+    
+def clean_git_remote_url(url):
+    # Replace fancy dashes or whitespace with simple hyphen and strip spaces
+    url = url.strip()
+    url = url.replace('—', '-')  # en-dash to hyphen
+    url = url.replace('–', '-')  # em-dash to hyphen
+    # You can add more replacements if needed
+    return url
+
+def git_init_and_remote(remote_url):
+    git = _git()
+    repo = git.Repo.init(BASE_DIR)
+    if remote_url:
+        # Clean URL (replace fancy dashes etc if needed)
+        remote_url = remote_url.strip()
+        try:
+            origin = None
+            try:
+                origin = repo.remote('origin')
+            except ValueError:
+                pass
+            if origin:
+                repo.delete_remote(origin)
+            repo.create_remote('origin', remote_url)
+        except Exception:
+            pass
+    return "✅ Git initialized!"
+
+def git_status():
+    git = _git()
+    repo = git.Repo(BASE_DIR)
+    return repo.git.status()
+
+def abort_ongoing_rebase(base_dir):
+    rebase_merge = os.path.join(base_dir, ".git", "rebase-merge")
+    rebase_apply = os.path.join(base_dir, ".git", "rebase-apply")
+
+    for path in [rebase_merge, rebase_apply]:
+        if os.path.exists(path):
+            shutil.rmtree(path)
+
+def run_cmd(cmd, cwd=None):
+    result = subprocess.run(cmd, cwd=cwd, shell=True, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Command failed: {cmd}\nstdout: {result.stdout}\nstderr: {result.stderr}")
+    return result.stdout.strip()
+
+GITIGNORE_TEMPLATE = """
+# ---- Virtual Environment ----
+.venv/
+.env
+__pycache__/
+
+# ---- Terraform ----
+terraform/.terraform/
+*.tfstate
+*.tfstate.backup
+crash.log
+
+# ---- Python ----
+__pycache__/
+*.pyc
+
+# ---- Secrets ----
+.env
+
+# ---- Cockpit caches ----
+.llm_cache/
+.jobs/
+.batch/
+.traces/
+.actions/
+.repair/
+.workspaces/
+
+# ---- Editor ----
+.vscode/
+.idea/
+
+# ---- OS files ----
+.DS_Store
+Thumbs.db
+""".strip()
+
+# Paths the cockpit writes; "ALL" stages changes under these only, so git
+# never has to scan the rest of a large working tree for untracked files.
+MANAGED_PATHS = [".gitignore", "terraform", "pipelines", os.path.join(".github", "workflows")]
+
+@contextmanager
+def timed_step(timings, step):
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"git.{step}"):
+            yield
+    finally:
+        timings[step] = timings.get(step, 0) + time.perf_counter() - start
+
+def format_timings(timings):
+    return " | ".join(f"{step} {secs:.2f}s" for step, secs in timings.items())
+
+def _ignore(level, message):
+    pass
+
+@tracing.traced("git.commit_push")
+def git_commit_push(files, msg, branch, username, token, timings=None, notify=None):
+    # notify(level, message) receives progress; level is info/success/warning/error
+    git = _git()
+    notify = notify or _ignore
+    timings = timings if timings is not None else {}
+    try:
+        with timed_step(timings, "open"):
+            # Init repo if not exists
+            if not os.path.exists(os.path.join(BASE_DIR, ".git")):
+                repo = git.Repo.init(BASE_DIR)
+                notify("info", "Initialized new Git repo.")
+            else:
+                repo = git.Repo(BASE_DIR)
+
+        # Handle ongoing rebase (auto continue with commit --no-edit)
+        rebase_merge_dir = os.path.join(BASE_DIR, ".git", "rebase-merge")
+        rebase_apply_dir = os.path.join(BASE_DIR, ".git", "rebase-apply")
+
+        if os.path.exists(rebase_merge_dir) or os.path.exists(rebase_apply_dir):
+            notify("warning", "⚠️ Rebase in progress detected, attempting to continue rebase...")
+
+            while os.path.exists(rebase_merge_dir) or os.path.exists(rebase_apply_dir):
+                try:
+                    # Stage all changes (resolved conflicts)
+                    repo.git.add(A=True)
+                    # Commit with no edit message (avoid editor)
+                    run_cmd("git commit --no-edit", cwd=BASE_DIR)
+                    # Continue rebase
+                    run_cmd("git rebase --continue", cwd=BASE_DIR)
+                    notify("info", "Git rebase --continue executed.")
+                except Exception as e:
+                    notify("error", f"Failed to continue rebase automatically: {e}")
+                    raise e
+
+            notify("success", "✅ Rebase finished successfully.")
+            return "Rebase completed, please retry your operation."
+
+        with timed_step(timings, "gitignore"):
+            # Rewriting an identical .gitignore would only make git rehash it
+            gitignore_path = os.path.join(BASE_DIR, ".gitignore")
+            current = None
+            if os.path.exists(gitignore_path):
+                with open(gitignore_path) as f:
+                    current = f.read()
+            if current != GITIGNORE_TEMPLATE:
+                with open(gitignore_path, "w") as f:
+                    f.write(GITIGNORE_TEMPLATE)
+
+        with timed_step(timings, "checkout"):
+            # Switch first so the commit lands on the branch we push
+            current_branch = None if repo.head.is_detached else repo.head.ref.name
+            if current_branch != branch:
+                if branch in repo.heads:
+                    repo.git.checkout(branch)
+                else:
+                    try:
+                        repo.git.checkout('-b', branch, f'origin/{branch}')
+                    except Exception:
+                        repo.git.checkout('-b', branch)
+
+        with timed_step(timings, "stage"):
+            # Add selected files, or every change under the managed paths
+            if not files or "ALL" in files:
+                paths = [p for p in MANAGED_PATHS if os.path.exists(os.path.join(BASE_DIR, p))]
+            else:
+                paths = [".gitignore"] + list(files)
+            repo.git.add("-A", "--", *paths)
+
+        with timed_step(timings, "commit"):
+            # ✅ Only commit if the index differs from HEAD (no working tree scan)
+            try:
+                repo.git.diff("--cached", "--quiet")
+                notify("info", "✅ Nothing new to commit — will push anyway.")
+            except git.exc.GitCommandError:
+                repo.index.commit(msg)
+                notify("info", "✅ New commit created.")
+
+        with timed_step(timings, "remote"):
+            # Ensure origin remote exists
+            try:
+                origin = repo.remote('origin')
+            except ValueError:
+                raise Exception("Remote 'origin' is not configured; initialise git with a remote URL first.")
+
+            # Add credentials to remote URL, only touching config when they changed
+            remote_url = origin.url.strip().replace('—', '-').replace('–', '-')
+            if remote_url.startswith("https://"):
+                protocol_removed = remote_url[8:]
+                if "@" in protocol_removed:
+                    protocol_removed = protocol_removed.split("@", 1)[-1]
+                auth_url = f"https://{username}:{token}@{protocol_removed}"
+                if auth_url != origin.url:
+                    origin.set_url(auth_url)
+
+        with timed_step(timings, "pull"):
+            # Pull with rebase to sync remote changes, if the branch exists remotely.
+            # Asks the remote itself: origin/* refs are only as fresh as the last fetch.
+            if repo.git.ls_remote("--heads", "origin", f"refs/heads/{branch}").strip():
+                try:
+                    repo.git.pull('origin', branch, '--rebase')
+                except Exception as e:
+                    notify("warning", f"Pull with rebase failed: {e}. Trying without rebase.")
+                    repo.git.pull('origin', branch)
+
+        # ✅ Always push!
+        with timed_step(timings, "push"):
+            push_result = origin.push(branch, set_upstream=True)
+
+        for info in push_result:
+            if info.flags & info.ERROR:
+                if "refusing to allow a Personal Access Token to create or update workflow" in info.summary:
+                    notify("error",
+                        "❌ Push rejected: Your GitHub token is missing the `workflow` scope.\n"
+                        "➡️ Please recreate it with `repo` and `workflow` scopes."
+                    )
+                    return "❌ Push rejected due to missing `workflow` scope."
+                else:
+                    notify("error", f"❌ Push failed: {info.summary}")
+                    return f"❌ Push failed: {info.summary}"
+
+        return f"✅ Commit, pull & push to {branch} done."
+
+
+    except Exception as e:
+        notify("error", f"An error occurred: {e}")
+        return f"❌ Error: {e}"
+
+
+@tracing.traced("github.create_pull_request")
+def create_pull_request(owner, repo_name, source_branch, target_branch, pr_title, pr_body,token):
+    github_token = token
+    if not github_token:
+        raise Exception("❌ GITHUB_TOKEN not found — please set it in your .env or environment.")
+
+    url = f"{GITHUB_API}/repos/{owner}/{repo_name}/pulls"
+    headers = {
+        "Authorization": f"Bearer {github_token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    payload = {
+        "title": pr_title,
+        "head": source_branch,
+        "base": target_branch,
+        "body": pr_body
+    }
+
+    response = http_client.post(url, endpoint="github.create_pull_request", headers=headers, json=payload)
+    if response.status_code == 201:
+        return response.json()["html_url"]
+    else:
+        raise Exception(f"❌ PR creation failed: {response.status_code} {response.text}")
+
+# --- GitHub Actions helpers ---
+
+@tracing.traced("github.list_workflows")
+def list_workflows(owner, repo_name, token, max_age=actions_index.SYNC_MAX_AGE):
+    # Served from the local Actions index; the API is only asked (with an ETag)
+    # once the last sync is older than max_age seconds
+    index = actions_index.get_index()
+    index.sync_workflows(owner, repo_name, token, max_age)
+    return [(wf["name"], wf["id"]) for wf in index.workflows(owner, repo_name)]
+
+@tracing.traced("github.trigger_workflow")
+def trigger_workflow(owner, repo_name, workflow_id, ref, token):
+    url = f"{GITHUB_API}/repos/{owner}/{repo_name}/actions/workflows/{workflow_id}/dispatches"
+    headers = {
+        "Authorization": f"token {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    payload = {
+        "ref": ref  # branch name
+    }
+    resp = http_client.post(url, endpoint="github.trigger_workflow", headers=headers, json=payload)
+    if resp.status_code == 204:
+        # The new run only exists upstream; make the next runs query go and look
+        actions_index.get_index().expire(owner, repo_name)
+        return True
+    else:
+        raise Exception(f"Trigger workflow failed: {resp.text}")
+
+@tracing.traced("github.get_workflow_runs")
+def get_workflow_runs(owner, repo_name, workflow_id, token, branch=None, limit=100,
+                      max_age=actions_index.SYNC_MAX_AGE):
+    index = actions_index.get_index()
+    index.sync(owner, repo_name, token, max_age)
+    return index.runs(owner, repo_name, workflow=workflow_id, branch=branch, limit=limit)
+
+@tracing.traced("github.latest_workflow_run")
+def latest_workflow_run(owner, repo_name, workflow_id, branch, token, max_age=actions_index.SYNC_MAX_AGE):
+    index = actions_index.get_index()
+    index.sync(owner, repo_name, token, max_age)
+    return index.latest_run(owner, repo_name, workflow_id, branch=branch)
+
+@tracing.traced("github.merge_pull_request")
+def merge_pull_request(owner, repo_name, pr_number, token):
+    url = f"{GITHUB_API}/repos/{owner}/{repo_name}/pulls/{pr_number}/merge"
+    headers = {
+        "Authorization": f"token {token}",
+        "Accept": "application/vnd.github.v3+json"
+    }
+    resp = http_client.put(url, endpoint="github.merge_pull_request", headers=headers)
+    if resp.status_code == 200:
+        return True
+    else:
+        raise Exception(f"Merge PR failed: {resp.text}")
+
+WORKFLOW_SUFFIXES = (".yml", ".yaml")
+
+def _workflow_files(path):
+    if not os.path.isdir(path):
+        return []
+    return sorted(f for f in os.listdir(path) if f.endswith(WORKFLOW_SUFFIXES))
+
+@tracing.traced("workflows.sync")
+def sync_workflow_files(src_dir=PIPELINES_DIR, dest_dir=WORKFLOWS_DIR, prune=False, validate=True):
+    # Copies only files whose content differs (unchanged ones keep their mtime,
+    # so git doesn't rehash them). Files that fail YAML/workflow checks are
+    # left out; prune removes workflows that no longer exist in src_dir.
+    # Returns {"changes", "issues", "diffs"} with a unified diff per modified file.
+    changes = {"added": [], "modified": [], "removed": [], "unchanged": [], "invalid": []}
+    issues = []
+    diffs = {}
+    sources = _workflow_files(src_dir)
+    for name in sources:
+        with open(os.path.join(src_dir, name), "rb") as f:
+            data = f.read()
+        dest = os.path.join(dest_dir, name)
+        if same_content(dest, data):
+            changes["unchanged"].append(name)
+            continue
+        text = data.decode(errors="replace")
+        if validate:
+            file_issues = prevalidate.validate_files({name: text})
+            issues += file_issues
+            if prevalidate.has_errors(file_issues):
+                changes["invalid"].append(name)
+                continue
+        if os.path.exists(dest):
+            with open(dest, errors="replace") as f:
+                old = f.read()
+            diffs[name] = "".join(difflib.unified_diff(old.splitlines(True), text.splitlines(True),
+                                                       f"a/.github/workflows/{name}", f"b/.github/workflows/{name}"))
+            changes["modified"].append(name)
+        else:
+            changes["added"].append(name)
+        write_bytes(dest, data)
+
+    if prune:
+        for name in sorted(set(_workflow_files(dest_dir)) - set(sources)):
+            os.remove(os.path.join(dest_dir, name))
+            changes["removed"].append(name)
+    return {"changes": changes, "issues": issues, "diffs": diffs}
+
+@tracing.traced("github.deploy_workflows_to_github")
+def deploy_workflows_to_github(branch, username, token, prune=False, report=None, src_dir=PIPELINES_DIR,
+                               dest_dir=WORKFLOWS_DIR):
+    # If a dict is passed as `report` it receives sync_workflow_files' result
+    if not _workflow_files(src_dir):
+        return "❌ No workflow files found to deploy."
+    result = sync_workflow_files(src_dir, dest_dir, prune=prune)
+    if report is not None:
+        report.update(result)
+    changes = result["changes"]
+    if changes["invalid"]:
+        return f"⚠️ Workflows deployed with {len(changes['invalid'])} skipped as invalid: {format_changes(changes)}"
+    if not (changes["added"] or changes["modified"] or changes["removed"]):
+        return f"✅ Workflows already up to date ({len(changes['unchanged'])} unchanged)"
+    return f"✅ Workflows deployed : {format_changes(changes)}"
+
+# --- Background jobs ---
+# Jobs that touch the same directory are serialised by the queue's lock keys
+def terraform_job(args, job):
+    command = args["command"]
+    tf_dir = args.get("tf_dir", TERRAFORM_DIR)
+    run = TerraformRun(command, tfvars=args.get("tfvars"), force_init=args.get("force_init", False),
+                       plan_file=args.get("plan_file"), cancel_event=job.cancel_event, tf_dir=tf_dir)
+    for line in run.stream():
+        job.log(line)
+    if run.returncode != 0:
+        raise Exception(f"terraform {command} exited with {run.returncode}")
+    result = {"timings": run.timings}
+    if command == "plan" and run.plan_file:
+        result["saved_plan"] = load_saved_plan(run.plan_file, tf_dir, tfvars=run.tfvars)
+    elif command == "apply" and run.plan_file and os.path.exists(run.plan_file):
+        # A saved plan can only be applied once
+        os.remove(run.plan_file)
+    return result
+
+def commit_push_job(args, job):
+    timings = {}
+    if "token" not in args:
+        raise Exception("Git token is no longer available (cockpit restarted); please push again.")
+    message = git_commit_push(args["files"], args["msg"], args["branch"], args["username"], args["token"],
+                              timings=timings, notify=lambda level, message: job.log(message))
+    job.log(message)
+    job.log(format_timings(timings))
+    if message.startswith("❌"):
+        raise Exception(message)
+    return {"message": message, "timings": timings}
+
+# Commands that write state. Workspaces clone the config, not the backend, so
+# they all share the repo's remote state: these also lock TERRAFORM_DIR and
+# run one at a time across every workspace.
+STATE_COMMANDS = ("apply", "destroy")
+
+def submit_terraform_job(command, tf_dir=TERRAFORM_DIR, **args):
+    # Locked on the directory; plans and validates in different workspaces
+    # can overlap, apply/destroy never do
+    label = f"terraform {command} {args.get('tfvars') or ''}".strip()
+    if tf_dir != TERRAFORM_DIR:
+        label += f" ({os.path.relpath(tf_dir, BASE_DIR)})"
+    lock_keys = [tf_dir]
+    if command in STATE_COMMANDS:
+        lock_keys.append(TERRAFORM_DIR)
+    return jobs.get_queue().submit("terraform", dict(args, command=command, tf_dir=tf_dir, trace=tracing.carrier()),
+                                   lock_keys=sorted(set(lock_keys)), label=label)
+
+def submit_commit_push_job(files, msg, branch, username, token):
+    # Checkout and pull --rebase rewrite terraform/, so a push also waits for
+    # (and holds off) terraform jobs in the repo directory
+    return jobs.get_queue().submit(
+        "commit_push", {"files": files, "msg": msg, "branch": branch, "username": username,
+                        "trace": tracing.carrier()},
+        lock_keys=[BASE_DIR, TERRAFORM_DIR], label=f"commit & push to {branch}", secrets={"token": token})
+
+def _traced_job(handler):
+    # Job spans continue the trace of whoever queued the job (args["trace"])
+    def run(args, job):
+        with tracing.resume(args.get("trace"), f"job.{job.kind}", job_id=job.id):
+            return handler(args, job)
+    return run
+
+def register_job_handlers(queue=None):
+    queue = queue or jobs.get_queue()
+    queue.register("terraform", _traced_job(terraform_job))
+    queue.register("commit_push", _traced_job(commit_push_job))
+    return queue
@@ -0,0 +1,200 @@
+# context_index.py
+
+import os
+import re
+import glob
+import json
+import math
+import threading
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 3000))
+INDEX_CACHE_FILE = os.path.join(".terraform", "context_index.json")
+# Share of the budget the file/address inventory may take
+INVENTORY_SHARE = 0.25
+
+BLOCK_START = re.compile(r'^([A-Za-z_][\w-]*)((?:\s+"[^"]*"|\s+[A-Za-z_][\w-]*)*)\s*\{')
+REFERENCE = re.compile(r'\b(var|module|local|data)\.([A-Za-z_][\w-]*)(?:\.([A-Za-z_][\w-]*))?')
+HEREDOC = re.compile(r'<<-?\s*"?([A-Za-z_]\w*)"?\s*$')
+WORD = re.compile(r'[a-z0-9]+')
+STOP_WORDS = {"the", "and", "for", "with", "add", "use", "create", "make", "that", "this", "from", "into",
+              "terraform", "resource", "file", "files", "please", "should", "new", "all"}
+
+_memory_index = {}
+_lock = threading.Lock()
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting and costs nothing
+    return math.ceil(len(text) / 4)
+
+def _strip_strings(line):
+    # Strings go first, so a "#" or "//" inside one ("s3://bucket") isn't taken for a comment
+    code = re.sub(r'"(?:[^"\\]|\\.)*"', '""', line)
+    return re.split(r'#|//', code, maxsplit=1)[0]
+
+def scan_blocks(text):
+    # Top-level HCL blocks with their source text. Brace counting ignores
+    # strings, comments and heredoc bodies, which is enough for LLM-written HCL.
+    blocks = []
+    current = None
+    depth = 0
+    heredoc = None
+    for number, line in enumerate(text.splitlines(), 1):
+        if current is not None:
+            current["lines"].append(line)
+        if heredoc:
+            if line.strip() == heredoc:
+                heredoc = None
+            continue
+        if depth == 0 and current is None:
+            match = BLOCK_START.match(line)
+            if not match:
+                continue
+            labels = re.findall(r'"([^"]*)"|([A-Za-z_][\w-]*)', match.group(2))
+            current = {"kind": match.group(1), "labels": [a or b for a, b in labels], "line": number,
+                       "lines": [line]}
+        code = _strip_strings(line)
+        depth += code.count("{") - code.count("}")
+        doc = HEREDOC.search(code)
+        if doc:
+            heredoc = doc.group(1)
+        if depth <= 0 and current is not None:
+            depth = 0
+            body = "\n".join(current.pop("lines"))
+            current["address"] = block_address(current["kind"], current["labels"])
+            current["text"] = body
+            current["refs"] = _references(body)
+            blocks.append(current)
+            current = None
+    return blocks
+
+def _references(body):
+    refs = set()
+    for kind, name, attr in REFERENCE.findall(body):
+        if kind in ("var", "module"):
+            refs.add(f"{kind}.{name}")
+        elif kind == "data" and attr:
+            refs.add(f"data.{name}.{attr}")
+    return sorted(refs)
+
+def block_address(kind, labels):
+    if kind == "resource" and len(labels) >= 2:
+        return f"{labels[0]}.{labels[1]}"
+    if kind == "data" and len(labels) >= 2:
+        return f"data.{labels[0]}.{labels[1]}"
+    if kind == "variable" and labels:
+        return f"var.{labels[0]}"
+    if kind in ("module", "output", "provider") and labels:
+        return f"{kind}.{labels[0]}"
+    return kind
+
+def _index_file(path, rel):
+    with open(path) as f:
+        text = f.read()
+    if rel.endswith(".tfvars"):
+        return [{"kind": "tfvars", "labels": [], "address": rel, "text": text.strip(), "refs": []}]
+    return scan_blocks(text)
+
+def build_index(tf_dir):
+    # Files are re-parsed only when their mtime or size changed; the index is
+    # kept in memory and in .terraform/ so it survives restarts too.
+    cache_path = os.path.join(tf_dir, INDEX_CACHE_FILE)
+    with _lock:
+        cached = _memory_index.get(tf_dir)
+        if cached is None:
+            try:
+                with open(cache_path) as f:
+                    cached = json.load(f)
+            except (OSError, ValueError):
+                cached = {}
+
+        index = {}
+        changed = False
+        for path in sorted(glob.glob(os.path.join(tf_dir, "**", "*.tf*"), recursive=True)):
+            if not path.endswith((".tf", ".tfvars")):
+                continue
+            rel = os.path.relpath(path, tf_dir)
+            stat = os.stat(path)
+            entry = cached.get(rel)
+            if entry and entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                index[rel] = entry
+                continue
+            index[rel] = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "blocks": _index_file(path, rel)}
+            changed = True
+        changed = changed or set(index) != set(cached)
+
+        _memory_index[tf_dir] = index
+        if changed:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w") as f:
+                json.dump(index, f)
+        return index
+
+def _words(text):
+    return {w for w in WORD.findall(text.lower().replace("_", " ")) if len(w) > 2 and w not in STOP_WORDS}
+
+def _score(block, prompt_words):
+    address_words = _words(block["address"])
+    return 3 * len(address_words & prompt_words) + len(_words(block["text"]) & prompt_words)
+
+def pack_context(prompt, tf_dir, token_budget=CONTEXT_TOKEN_BUDGET):
+    # Returns (context_text, stats): an inventory of every file and address,
+    # then the most relevant blocks (plus the variables/modules they reference)
+    # until the token budget is used up.
+    index = build_index(tf_dir)
+    entries = [(rel, block) for rel, info in index.items() for block in info["blocks"]]
+    if not entries:
+        return "", {"tokens": 0, "blocks": 0, "total_blocks": 0}
+
+    inventory_lines = [f"- {rel}: {', '.join(b['address'] for b in info['blocks'])}"
+                       for rel, info in index.items()]
+    inventory = []
+    used = 0
+    for line in inventory_lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget * INVENTORY_SHARE:
+            inventory.append(f"- ... {len(inventory_lines) - len(inventory)} more files")
+            break
+        inventory.append(line)
+        used += cost
+
+    prompt_words = _words(prompt)
+    by_address = {block["address"]: (rel, block) for rel, block in entries}
+    ranked = sorted(((s, rel, block) for rel, block in entries if (s := _score(block, prompt_words)) > 0),
+                    key=lambda item: -item[0])
+
+    chosen = []
+    seen = set()
+    def take(rel, block):
+        nonlocal used
+        key = (rel, block["address"], block["text"][:40])
+        if key in seen:
+            return
+        cost = estimate_tokens(block["text"]) + 1
+        if used + cost > token_budget:
+            return
+        seen.add(key)
+        chosen.append((rel, block))
+        used += cost
+
+    for _, rel, block in ranked:
+        take(rel, block)
+        for ref in block["refs"]:
+            if ref in by_address:
+                take(*by_address[ref])
+
+    sections = ["### Inventory", *inventory]
+    for rel in index:
+        snippets = [block["text"] for r, block in chosen if r == rel]
+        if snippets:
+            sections.append(f"### {rel}\n```hcl\n" + "\n\n".join(snippets) + "\n```")
+    context = "\n".join(sections)
+    return context, {"tokens": estimate_tokens(context), "blocks": len(chosen), "total_blocks": len(entries)}
+
+def build_prompt_with_context(prompt, tf_dir, token_budget=CONTEXT_TOKEN_BUDGET):
+    context, stats = pack_context(prompt, tf_dir, token_budget)
+    if not context:
+        return prompt, stats
+    return (f"{prompt}\n\n"
+            "Existing Terraform in the repository (excerpts). Keep what the request doesn't touch and "
+            "reply only with the complete contents of files you add or change, each under its file name.\n\n"
+            f"{context}"), stats
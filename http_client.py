@@ -0,0 +1,231 @@
+# http_client.py
+
+import os
+import re
+import time
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+import tracing
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 120))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 4))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(os.getenv("HTTP_BACKOFF_MAX", 30))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 10))
+
+# 429 / 503 mean the request was not processed, so they are safe to retry for
+# any method. Other 5xx are only retried for idempotent methods.
+ALWAYS_RETRY = {429, 503}
+IDEMPOTENT_RETRY = {500, 502, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS"}
+
+_sessions = {}
+_rate_limits = {}
+_metrics = {}
+_lock = threading.Lock()
+
+def get_session(url):
+    # One keep-alive session per scheme+host, shared by every caller
+    parts = urlsplit(url)
+    base = f"{parts.scheme}://{parts.netloc}"
+    with _lock:
+        session = _sessions.get(base)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount(base, adapter)
+            _sessions[base] = session
+        return session
+
+def request(method, url, endpoint=None, timeout=None, **kwargs):
+    method = method.upper()
+    host = urlsplit(url).netloc
+    endpoint = endpoint or f"{method} {host}{urlsplit(url).path}"
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    session = get_session(url)
+
+    with tracing.span(f"http {endpoint}", **{"http.method": method, "http.host": host}) as span:
+        attempt = 0
+        while True:
+            _wait_for_rate_limit(host)
+            start = time.perf_counter()
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                _record(endpoint, time.perf_counter() - start, error=True)
+                if attempt >= MAX_RETRIES or not _retryable_error(method, e):
+                    raise
+                attempt += 1
+                _record_retry(endpoint)
+                time.sleep(_backoff(attempt))
+                continue
+
+            _record(endpoint, time.perf_counter() - start, error=response.status_code >= 400)
+            _update_rate_limit(host, response)
+
+            delay = _retry_delay(method, response, attempt)
+            if delay is None:
+                span.set(**{"http.status_code": response.status_code, "http.retries": attempt})
+                return response
+            response.close()
+            attempt += 1
+            _record_retry(endpoint)
+            time.sleep(delay)
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+# --- Retry / rate limit handling ---
+def _backoff(attempt):
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** (attempt - 1)))
+
+def _retryable_error(method, error):
+    # A read timeout or a connection reset means the server may already be
+    # acting on the request, so a POST (PR, workflow dispatch, completion) is
+    # only resent when it never got through: connecting timed out or failed
+    if method in IDEMPOTENT_METHODS or isinstance(error, requests.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason says what failed
+    reason = error.args[0] if error.args else None
+    return isinstance(getattr(reason, "reason", reason), NewConnectionError)
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _rate_limit_reset(response):
+    # GitHub signals an exhausted quota with 403/429 and X-RateLimit-Remaining: 0
+    if response.headers.get("X-RateLimit-Remaining") != "0":
+        return None
+    try:
+        return max(0.0, float(response.headers["X-RateLimit-Reset"]) - time.time())
+    except (KeyError, ValueError):
+        return None
+
+def _retry_delay(method, response, attempt):
+    if attempt >= MAX_RETRIES:
+        return None
+    status = response.status_code
+    if status in (403, 429):
+        wait = _retry_after(response)
+        if wait is None:
+            wait = _rate_limit_reset(response)
+        if wait is None:
+            return _backoff(attempt + 1) if status == 429 else None
+        # Don't park the caller for an hour-long GitHub quota window
+        return wait if wait <= BACKOFF_MAX else None
+    if status in ALWAYS_RETRY or (status in IDEMPOTENT_RETRY and method in IDEMPOTENT_METHODS):
+        wait = _retry_after(response)
+        return min(wait, BACKOFF_MAX) if wait is not None else _backoff(attempt + 1)
+    return None
+
+def _duration(value):
+    # Groq resets look like "7.66s", "2m59.56s" or "120ms"
+    seconds = 0.0
+    for amount, unit in re.findall(r'([\d.]+)(ms|h|m|s)', value):
+        seconds += float(amount) * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[unit]
+    return seconds
+
+def _update_rate_limit(host, response):
+    remaining = response.headers.get("X-RateLimit-Remaining")
+    reset = response.headers.get("X-RateLimit-Reset")
+    try:
+        if remaining is not None and reset is not None:
+            # GitHub: epoch seconds
+            limit = (int(remaining), float(reset))
+        elif response.headers.get("x-ratelimit-remaining-requests") is not None:
+            # Groq (OpenAI style): a duration until the request quota refills
+            limit = (int(response.headers["x-ratelimit-remaining-requests"]),
+                     time.time() + _duration(response.headers.get("x-ratelimit-reset-requests", "")))
+        else:
+            return
+    except ValueError:
+        return
+    with _lock:
+        _rate_limits[host] = limit
+
+def _wait_for_rate_limit(host):
+    with _lock:
+        remaining, reset = _rate_limits.get(host, (None, None))
+    if remaining != 0:
+        return
+    wait = reset - time.time()
+    if 0 < wait <= BACKOFF_MAX:
+        time.sleep(wait)
+
+def rate_limit(host):
+    with _lock:
+        return _rate_limits.get(host)
+
+# --- Metrics ---
+def _endpoint_metrics(endpoint):
+    metrics = _metrics.get(endpoint)
+    if metrics is None:
+        metrics = {"count": 0, "errors": 0, "retries": 0, "total": 0.0, "max": 0.0,
+                   "samples": deque(maxlen=500)}
+        _metrics[endpoint] = metrics
+    return metrics
+
+def _record(endpoint, elapsed, error=False):
+    with _lock:
+        metrics = _endpoint_metrics(endpoint)
+        metrics["count"] += 1
+        metrics["errors"] += int(error)
+        metrics["total"] += elapsed
+        metrics["max"] = max(metrics["max"], elapsed)
+        metrics["samples"].append(elapsed)
+
+def _record_retry(endpoint):
+    with _lock:
+        _endpoint_metrics(endpoint)["retries"] += 1
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+def latency_summary():
+    with _lock:
+        snapshot = {k: dict(v, samples=list(v["samples"])) for k, v in _metrics.items()}
+    rows = []
+    for endpoint, m in sorted(snapshot.items()):
+        rows.append({
+            "endpoint": endpoint,
+            "calls": m["count"],
+            "errors": m["errors"],
+            "retries": m["retries"],
+            "avg_ms": round(1000 * m["total"] / m["count"], 1) if m["count"] else 0.0,
+            "p50_ms": round(1000 * _percentile(m["samples"], 50), 1),
+            "p95_ms": round(1000 * _percentile(m["samples"], 95), 1),
+            "max_ms": round(1000 * m["max"], 1),
+        })
+    return rows
+
+def reset_metrics():
+    with _lock:
+        _metrics.clear()
@@ -0,0 +1,317 @@
+# jobs.py
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(os.getcwd(), ".jobs", "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+LOG_FLUSH_INTERVAL = 1.0
+# Running jobs and held locks of processes that exited are reclaimed this often
+REAP_INTERVAL = 30.0
+# Identifies this process in the database; the token tells it apart from an
+# earlier process that had the same PID (e.g. PID 1 in a container)
+OWNER = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    label TEXT,
+    args TEXT,
+    lock_keys TEXT,
+    status TEXT NOT NULL,
+    created REAL,
+    started REAL,
+    finished REAL,
+    result TEXT,
+    error TEXT,
+    log TEXT DEFAULT '',
+    owner TEXT,
+    pinned TEXT
+);
+CREATE TABLE IF NOT EXISTS locks (
+    key TEXT PRIMARY KEY,
+    job_id TEXT,
+    owner TEXT NOT NULL
+)
+"""
+# Added after the first release; older databases get them on open
+COLUMNS = {"owner": "TEXT", "pinned": "TEXT"}
+
+def owner_alive(owner):
+    # owner is OWNER of some process, optionally followed by ":<queue id>"
+    if not owner:
+        return False
+    pid, token = owner.split(":")[:2]
+    if f"{pid}:{token}" == OWNER:
+        return True
+    if int(pid) == os.getpid():
+        return False
+    if os.name != "posix":
+        # No signal-0 probe without extra dependencies; assume it's alive
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class Job:
+    # Handed to a job handler: log() lines, check cancel_event
+    def __init__(self, queue, row):
+        self.queue = queue
+        self.id = row["id"]
+        self.kind = row["kind"]
+        self.args = json.loads(row["args"] or "{}")
+        self.lock_keys = json.loads(row["lock_keys"] or "[]")
+        self.cancel_event = threading.Event()
+        self.lines = []
+        self._flushed = 0
+        self._last_flush = time.time()
+
+    def log(self, line):
+        self.lines.append(line)
+        if time.time() - self._last_flush > LOG_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if self._flushed == len(self.lines):
+            return
+        chunk = "".join(f"{line}\n" for line in self.lines[self._flushed:])
+        self._flushed = len(self.lines)
+        self._last_flush = time.time()
+        self.queue._execute("UPDATE jobs SET log = log || ? WHERE id = ?", (chunk, self.id))
+
+class JobQueue:
+    # SQLite-backed queue with a bounded worker pool, shared by every process
+    # using the same database. A job declares lock keys (e.g. the directory it
+    # works in); jobs sharing a key run one at a time, in any process, while
+    # everything else runs in parallel. Held keys live in the locks table.
+    def __init__(self, db_path=JOBS_DB, workers=JOB_WORKERS):
+        self.db_path = db_path
+        self.workers = workers
+        self.handlers = {}
+        # Jobs that carry secrets are pinned to the queue holding them
+        self.queue_id = f"{OWNER}:{uuid.uuid4().hex[:6]}"
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._running = {}
+        self._threads = []
+        self._last_reap = 0.0
+        # Tokens and passwords stay in memory, never in the database
+        self._secrets = {}
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._execute("PRAGMA journal_mode=WAL")
+        with self._db_lock:
+            self._conn.executescript(SCHEMA)
+            existing = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in COLUMNS.items():
+                if column not in existing:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._conn.commit()
+        self._reap()
+
+    def _execute(self, sql, params=()):
+        with self._db_lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.fetchall()
+
+    def _update(self, sql, params=()):
+        with self._db_lock:
+            cursor = self._conn.execute(sql, params)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+        with self._cond:
+            self._cond.notify_all()
+
+    def start(self):
+        if self._threads:
+            return self
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def submit(self, kind, args=None, lock_keys=None, label=None, secrets=None):
+        job_id = uuid.uuid4().hex[:10]
+        if secrets:
+            self._secrets[job_id] = secrets
+        self._execute(
+            "INSERT INTO jobs (id, kind, label, args, lock_keys, status, created, pinned) "
+            "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, label or kind, json.dumps(args or {}), json.dumps(sorted(lock_keys or [])), time.time(),
+             self.queue_id if secrets else None))
+        with self._cond:
+            self._cond.notify_all()
+        return job_id
+
+    def cancel(self, job_id):
+        if self._update("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                        (time.time(), job_id)):
+            self._secrets.pop(job_id, None)
+        job = self._running.get(job_id)
+        if job:
+            job.cancel_event.set()
+
+    def get(self, job_id):
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        running = self._running.get(job_id)
+        if running:
+            # Unflushed lines of a running job live in memory
+            job["log"] += "".join(f"{line}\n" for line in running.lines[running._flushed:])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def list(self, limit=50):
+        rows = self._execute(
+            "SELECT id, kind, label, status, created, started, finished, error FROM jobs "
+            "ORDER BY created DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    # --- Locks ---
+    def _take_locks(self, keys, job_id=None):
+        # All keys or none, in one transaction: the primary key makes a second
+        # holder's insert fail. With job_id the job is claimed in the same
+        # transaction, conditional so a cancel (or another process) that got
+        # there first wins.
+        with self._db_lock:
+            try:
+                self._conn.executemany("INSERT INTO locks (key, job_id, owner) VALUES (?, ?, ?)",
+                                       [(key, job_id, OWNER) for key in keys])
+                if job_id:
+                    claimed = self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started = ?, owner = ? WHERE id = ? AND status = 'queued'",
+                        (time.time(), OWNER, job_id)).rowcount
+                    if not claimed:
+                        self._conn.rollback()
+                        return False
+                self._conn.commit()
+                return True
+            except sqlite3.IntegrityError:
+                self._conn.rollback()
+                return False
+
+    def acquire(self, lock_keys, blocking=True):
+        # Takes lock keys for foreground work (a UI action) so it and the
+        # queued jobs exclude each other; returns False if not blocking and busy
+        keys = sorted(set(lock_keys))
+        while not self._take_locks(keys):
+            if not blocking:
+                return False
+            with self._cond:
+                self._cond.wait(timeout=2)
+        return True
+
+    def release(self, lock_keys):
+        keys = sorted(set(lock_keys))
+        with self._db_lock:
+            self._conn.executemany("DELETE FROM locks WHERE key = ? AND owner = ? AND job_id IS NULL",
+                                   [(key, OWNER) for key in keys])
+            self._conn.commit()
+        with self._cond:
+            self._cond.notify_all()
+
+    def active_lock_keys(self):
+        # Keys held or awaited by queued/running jobs or held by foreground
+        # work, e.g. directories still in use
+        rows = self._execute("SELECT lock_keys FROM jobs WHERE status IN ('queued', 'running')")
+        keys = {key for row in rows for key in json.loads(row["lock_keys"] or "[]")}
+        return keys | {row["key"] for row in self._execute("SELECT key FROM locks")}
+
+    def _reap(self):
+        # Running jobs and locks whose process has exited are not running now
+        self._last_reap = time.time()
+        owners = {row["owner"] for row in self._execute(
+            "SELECT owner FROM jobs WHERE status = 'running' UNION SELECT owner FROM locks")}
+        for owner in owners:
+            if owner_alive(owner):
+                continue
+            with self._db_lock:
+                if owner is None:
+                    self._conn.execute("UPDATE jobs SET status = 'failed', error = 'Interrupted by restart', "
+                                       "finished = ? WHERE status = 'running' AND owner IS NULL", (time.time(),))
+                else:
+                    self._conn.execute("UPDATE jobs SET status = 'failed', error = 'Interrupted by restart', "
+                                       "finished = ? WHERE status = 'running' AND owner = ?", (time.time(), owner))
+                    self._conn.execute("DELETE FROM locks WHERE owner = ?", (owner,))
+                self._conn.commit()
+        # A pinned job's secrets died with the queue that submitted it
+        for row in self._execute("SELECT id, pinned FROM jobs WHERE status = 'queued' AND pinned IS NOT NULL"):
+            if not owner_alive(row["pinned"]):
+                self._update("UPDATE jobs SET status = 'failed', error = 'Submitting process exited', finished = ? "
+                             "WHERE id = ? AND status = 'queued'", (time.time(), row["id"]))
+
+    # --- Workers ---
+    def _claim(self):
+        # Oldest queued job with a handler (and its secrets) whose locks are all free
+        if time.time() - self._last_reap > REAP_INTERVAL:
+            self._reap()
+        rows = self._execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created")
+        for row in rows:
+            if row["kind"] not in self.handlers or row["pinned"] not in (None, self.queue_id):
+                continue
+            if self._take_locks(sorted(set(json.loads(row["lock_keys"] or "[]"))), row["id"]):
+                job = Job(self, row)
+                job.args.update(self._secrets.pop(job.id, {}))
+                self._running[job.id] = job
+                return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._claim()
+                while job is None:
+                    # Woken by submit/finish; the timeout picks up jobs queued by other processes
+                    self._cond.wait(timeout=2)
+                    job = self._claim()
+            self._run(job)
+
+    def _run(self, job):
+        status, result, error = "succeeded", None, None
+        try:
+            result = self.handlers[job.kind](job.args, job)
+            if job.cancel_event.is_set():
+                status = "cancelled"
+        except Exception as e:
+            status = "cancelled" if job.cancel_event.is_set() else "failed"
+            error = str(e)
+        finally:
+            job.flush()
+            with self._db_lock:
+                self._conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished = ? WHERE id = ?",
+                                   (status, json.dumps(result, default=str) if result is not None else None,
+                                    error, time.time(), job.id))
+                self._conn.execute("DELETE FROM locks WHERE job_id = ?", (job.id,))
+                self._conn.commit()
+            with self._cond:
+                self._running.pop(job.id, None)
+                self._cond.notify_all()
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue():
+    # One queue per process, shared by every Streamlit session
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue().start()
+        return _queue
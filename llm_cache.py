@@ -0,0 +1,126 @@
+# llm_cache.py
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(os.getcwd(), ".llm_cache"))
+CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))           # seconds
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+# put() walks the cache only every EVICT_EVERY writes, or sooner once its
+# running size estimate goes over CACHE_MAX_BYTES
+EVICT_EVERY = int(os.getenv("LLM_CACHE_EVICT_EVERY", 50))
+
+# An entry's mtime is its creation time (what the TTL counts from) and its
+# atime is when it was last read (what size eviction orders by)
+
+# Module level so the counters survive Streamlit reruns
+stats = {"hits": 0, "misses": 0, "evictions": 0}
+_lock = threading.Lock()
+_puts_since_evict = 0
+_approx_bytes = None
+
+def cache_key(payload):
+    # Model, messages and sampling params identify a completion; transport
+    # flags like `stream` do not change the answer.
+    keyed = {k: v for k, v in payload.items() if k != "stream"}
+    blob = json.dumps(keyed, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def _path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+def get(key):
+    path = _path(key)
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        with _lock:
+            stats["misses"] += 1
+        return None
+
+    if time.time() - entry.get("created", 0) > CACHE_TTL:
+        _remove(path)
+        with _lock:
+            stats["misses"] += 1
+        return None
+
+    # Bump atime only, so size eviction drops least recently used entries first
+    try:
+        os.utime(path, (time.time(), entry.get("created", 0)))
+    except OSError:
+        pass
+    with _lock:
+        stats["hits"] += 1
+    return entry["content"]
+
+def put(key, content, model=None):
+    global _puts_since_evict, _approx_bytes
+    path = _path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    created = time.time()
+    entry = {"created": created, "model": model, "content": content}
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+        size = f.tell()
+    os.utime(tmp_path, (created, created))
+    os.replace(tmp_path, path)
+    with _lock:
+        _puts_since_evict += 1
+        due = (_approx_bytes is None or _puts_since_evict >= EVICT_EVERY
+               or _approx_bytes + size > CACHE_MAX_BYTES)
+        if not due:
+            _approx_bytes += size
+    if due:
+        evict()
+
+def evict():
+    global _puts_since_evict, _approx_bytes
+    entries = []
+    now = time.time()
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_atime, st.st_mtime, st.st_size, path))
+
+    total = 0
+    removed = 0
+    for atime, mtime, size, path in sorted(entries, reverse=True):
+        # Most recently used first: keep until TTL or size budget is exceeded
+        if now - mtime > CACHE_TTL or total + size > CACHE_MAX_BYTES:
+            _remove(path)
+            removed += 1
+        else:
+            total += size
+    with _lock:
+        stats["evictions"] += removed
+        _puts_since_evict = 0
+        _approx_bytes = total
+    return removed
+
+def clear():
+    global _approx_bytes
+    removed = 0
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            _remove(os.path.join(root, name))
+            removed += 1
+    with _lock:
+        _approx_bytes = 0
+    return removed
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,333 @@
+# prevalidate.py
+#
+# Millisecond checks for generated .tf/.tfvars/.yml before anything is
+# written or terraform is spawned: HCL syntax (brackets, strings, heredocs,
+# comments), undeclared var/local/data references, duplicate addresses,
+# unknown module inputs and outputs, YAML syntax and workflow shape. It is a
+# pre-filter, not a replacement for `terraform validate`.
+
+import os
+import re
+import glob
+
+from context_index import scan_blocks
+
+ERROR = "error"
+WARNING = "warning"
+MAX_SYNTAX_ERRORS = 5
+
+PAIRS = {"}": "{", "]": "[", ")": "("}
+HEREDOC_START = re.compile(r'<<(-?)\s*([A-Za-z_]\w*)[ \t]*(?=\n|$)')
+TOP_LEVEL_BLOCK = re.compile(r'^[A-Za-z_][\w-]*((\s+"[^"]*")|(\s+[A-Za-z_][\w-]*))*\s*\{')
+TOP_LEVEL_ATTRIBUTE = re.compile(r'^[A-Za-z_][\w-]*\s*=')
+REFERENCE = re.compile(r'(?<![\w.])(var|local|module|data)\.([A-Za-z_][\w-]*)'
+                       r'(?:\.([A-Za-z_][\w-]*))?(?:\.([A-Za-z_][\w-]*))?')
+MODULE_META_ARGS = {"source", "version", "count", "for_each", "providers", "depends_on"}
+HCL_SUFFIXES = (".tf", ".tfvars")
+YAML_SUFFIXES = (".yml", ".yaml")
+
+def issue(path, line, message, severity=ERROR):
+    return {"file": path, "line": line, "severity": severity, "message": message}
+
+# --- HCL syntax ---
+def scan_hcl(text):
+    # One pass over the text. Returns (errors, code, top_level_lines): errors
+    # are (line, message); code is the text with comments blanked (strings and
+    # line structure kept) for reference scanning.
+    errors = []
+    code = []
+    top_level = {1}
+    stack = []
+    line = 1
+    i = 0
+    n = len(text)
+    while i < n and len(errors) < MAX_SYNTAX_ERRORS:
+        c = text[i]
+        top = stack[-1][0] if stack else None
+
+        if top == '"':
+            if c == "\\":
+                code.append(text[i:i + 2])
+                i += 2
+                continue
+            if c == "\n":
+                errors.append((stack[-1][1], "Unterminated string"))
+                stack.pop()
+                continue
+            if c == '"':
+                stack.pop()
+            elif text.startswith(("$${", "%%{"), i):
+                code.append(text[i:i + 3])
+                i += 3
+                continue
+            elif text.startswith(("${", "%{"), i):
+                stack.append(("${", line))
+                code.append(text[i:i + 2])
+                i += 2
+                continue
+            code.append(c)
+            i += 1
+            continue
+
+        if c == "#" or text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            if end == -1:
+                errors.append((line, "Unterminated /* comment"))
+                break
+            newlines = text.count("\n", i, end)
+            code.append("\n" * newlines)
+            line += newlines
+            i = end + 2
+            continue
+        if text.startswith("<<", i):
+            heredoc = HEREDOC_START.match(text, i)
+            if heredoc:
+                start_line = line
+                marker = heredoc.group(2)
+                body_start = heredoc.end() + 1
+                close = re.compile(rf'^[ \t]*{marker}[ \t]*$', re.MULTILINE).search(text, body_start)
+                if not close:
+                    errors.append((start_line, f"Heredoc <<{marker} is never closed"))
+                    break
+                chunk = text[i:close.end()]
+                code.append(chunk)
+                line += chunk.count("\n")
+                i = close.end()
+                continue
+
+        if c == '"':
+            stack.append(('"', line))
+        elif c in "{[(":
+            stack.append((c, line))
+        elif c in "}])":
+            if not stack:
+                errors.append((line, f"Unexpected '{c}'"))
+            elif top == "${" and c == "}":
+                stack.pop()
+            elif top != PAIRS[c]:
+                errors.append((line, f"'{c}' does not close '{top}' opened on line {stack[-1][1]}"))
+                stack.pop()
+            else:
+                stack.pop()
+        elif c == "\n":
+            line += 1
+            if not stack:
+                top_level.add(line)
+        code.append(c)
+        i += 1
+
+    for opener, opened_at in reversed(stack[-MAX_SYNTAX_ERRORS:]):
+        if opener == '"':
+            errors.append((opened_at, "Unterminated string"))
+        else:
+            errors.append((opened_at, f"'{opener}' opened here is never closed"))
+    return errors, "".join(code), top_level
+
+def check_structure(path, code, top_level):
+    # .tf files hold only blocks at the top level, .tfvars only attributes
+    issues = []
+    tfvars = path.endswith(".tfvars")
+    for number, text in enumerate(code.split("\n"), 1):
+        stripped = text.strip()
+        if number not in top_level or not stripped:
+            continue
+        if tfvars and not TOP_LEVEL_ATTRIBUTE.match(stripped):
+            issues.append(issue(path, number, f"Expected 'name = value' in tfvars, got: {stripped[:60]}"))
+        elif not tfvars and not TOP_LEVEL_BLOCK.match(stripped):
+            kind = "attribute" if TOP_LEVEL_ATTRIBUTE.match(stripped) else "text"
+            issues.append(issue(path, number, f"Unexpected top-level {kind}: {stripped[:60]}"))
+    return issues
+
+# --- HCL semantics ---
+def _attributes(text, level=1):
+    # Argument names set at one nesting level (1 = directly in a block body,
+    # 0 = top level of a tfvars file), with their raw values
+    attributes = {}
+    depth = 0
+    for line in text.split("\n"):
+        clean = re.sub(r'"(?:[^"\\]|\\.)*"', '""', line)
+        if depth == level:
+            match = re.match(r'\s*([A-Za-z_][\w-]*)\s*=\s*(.*)$', line)
+            if match:
+                attributes[match.group(1)] = match.group(2).strip()
+        depth += clean.count("{") + clean.count("[") + clean.count("(")
+        depth -= clean.count("}") + clean.count("]") + clean.count(")")
+    return attributes
+
+def _line_of(code, offset):
+    return code.count("\n", 0, offset) + 1
+
+def check_module_dir(module_dir, parsed, modules):
+    # parsed: {path: (code, blocks)} for one directory (a Terraform module);
+    # modules: {dir: {"variables": set, "outputs": set}} for every directory
+    issues = []
+    declared = {}
+    variables, locals_, data, module_blocks = set(), set(), set(), {}
+    for path, (code, blocks) in parsed.items():
+        for block in blocks:
+            kind, labels = block["kind"], block["labels"]
+            if kind in ("resource", "data", "module", "variable", "output") and labels:
+                address = block["address"]
+                if address in declared:
+                    other, other_line = declared[address]
+                    issues.append(issue(path, block["line"],
+                                        f"Duplicate {kind} {address} (also in {other}:{other_line})"))
+                else:
+                    declared[address] = (path, block["line"])
+            if kind == "variable" and labels:
+                variables.add(labels[0])
+            elif kind == "data" and len(labels) >= 2:
+                data.add(f"{labels[0]}.{labels[1]}")
+            elif kind == "module" and labels:
+                module_blocks[labels[0]] = (path, block)
+            elif kind == "locals":
+                locals_.update(_attributes(block["text"]))
+
+    for name, (path, block) in module_blocks.items():
+        # Only local modules can be checked without downloading anything
+        target = _module_target(module_dir, block)
+        if target is None:
+            continue
+        if target not in modules:
+            issues.append(issue(path, block["line"], f"Module {name}: no .tf files in {target}"))
+            continue
+        attributes = _attributes(block["text"])
+        for argument in sorted(set(attributes) - MODULE_META_ARGS - modules[target]["variables"]):
+            issues.append(issue(path, block["line"], f"Module {name} has no input variable '{argument}'"))
+
+    for path, (code, blocks) in parsed.items():
+        if path.endswith(".tfvars"):
+            continue
+        for match in REFERENCE.finditer(code):
+            kind, name, attr = match.group(1), match.group(2), match.group(3)
+            line = _line_of(code, match.start())
+            if kind == "var" and name not in variables:
+                issues.append(issue(path, line, f"Reference to undeclared variable var.{name}"))
+            elif kind == "local" and name not in locals_:
+                issues.append(issue(path, line, f"Reference to undeclared local.{name}"))
+            elif kind == "data" and attr and f"{name}.{attr}" not in data:
+                issues.append(issue(path, line, f"Reference to undeclared data.{name}.{attr}"))
+            elif kind == "module":
+                if name not in module_blocks:
+                    issues.append(issue(path, line, f"Reference to undeclared module.{name}"))
+                    continue
+                target = _module_target(module_dir, module_blocks[name][1])
+                if attr and target in modules and attr not in modules[target]["outputs"]:
+                    issues.append(issue(path, line, f"Module {name} has no output '{attr}'"))
+
+    for path, (code, blocks) in parsed.items():
+        if not path.endswith(".tfvars"):
+            continue
+        for name in _attributes(code, level=0):
+            if name not in variables:
+                line = _line_of(code, re.search(rf'^\s*{re.escape(name)}\s*=', code, re.MULTILINE).start())
+                issues.append(issue(path, line, f"Value for undeclared variable '{name}'", WARNING))
+    return issues
+
+def _module_target(module_dir, block):
+    source = re.match(r'"([^"]+)"', _attributes(block["text"]).get("source", ""))
+    if not source or not source.group(1).startswith(("./", "../")):
+        return None
+    return os.path.normpath(os.path.join(module_dir, source.group(1)))
+
+# --- YAML ---
+def check_yaml(path, text):
+    import yaml
+    try:
+        document = yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        return [issue(path, mark.line + 1 if mark else 1, f"YAML: {getattr(e, 'problem', None) or e}")]
+    if not isinstance(document, dict) or "jobs" not in document:
+        return []
+    # A GitHub Actions workflow; PyYAML reads the `on:` key as True
+    issues = []
+    if "on" not in document and True not in document:
+        issues.append(issue(path, 1, "Workflow has no 'on' trigger"))
+    jobs = document["jobs"]
+    if not isinstance(jobs, dict) or not jobs:
+        return issues + [issue(path, 1, "'jobs' must be a non-empty mapping")]
+    for name, job in jobs.items():
+        if not isinstance(job, dict):
+            issues.append(issue(path, 1, f"Job '{name}' must be a mapping"))
+            continue
+        if "uses" in job:
+            continue
+        if "runs-on" not in job:
+            issues.append(issue(path, 1, f"Job '{name}' has no runs-on"))
+        steps = job.get("steps")
+        if not isinstance(steps, list) or not steps:
+            issues.append(issue(path, 1, f"Job '{name}' has no steps"))
+            continue
+        for n, step in enumerate(steps, 1):
+            if not isinstance(step, dict) or not ("run" in step or "uses" in step):
+                issues.append(issue(path, 1, f"Job '{name}' step {n} needs 'run' or 'uses'"))
+    return issues
+
+# --- Entry points ---
+def _load_existing(base_dir, keep):
+    files = {}
+    for path in glob.glob(os.path.join(base_dir, "**", "*"), recursive=True):
+        rel = os.path.relpath(path, base_dir)
+        if ".terraform" in rel.split(os.sep) or not rel.endswith(HCL_SUFFIXES + YAML_SUFFIXES):
+            continue
+        if keep is not None and rel not in keep:
+            continue
+        with open(path) as f:
+            files[rel] = f.read()
+    return files
+
+def validate_files(files, base_dir=None, keep=None):
+    # files: {relative path: content}, e.g. freshly extracted blocks. Files
+    # already in base_dir are checked alongside them (only those in `keep`,
+    # if given) so references across files resolve. Returns a list of issues.
+    merged = _load_existing(base_dir, keep) if base_dir and os.path.isdir(base_dir) else {}
+    merged.update({os.path.normpath(path): content for path, content in files.items()})
+
+    issues = []
+    parsed_by_dir = {}
+    for path, text in sorted(merged.items()):
+        if path.endswith(YAML_SUFFIXES):
+            issues += check_yaml(path, text)
+            continue
+        if not path.endswith(HCL_SUFFIXES):
+            continue
+        errors, code, top_level = scan_hcl(text)
+        issues += [issue(path, line, message) for line, message in errors]
+        if errors:
+            # References in a file that doesn't parse would only add noise
+            continue
+        issues += check_structure(path, code, top_level)
+        blocks = [] if path.endswith(".tfvars") else scan_blocks(code)
+        parsed_by_dir.setdefault(os.path.dirname(path), {})[path] = (code, blocks)
+
+    modules = {}
+    for module_dir, parsed in parsed_by_dir.items():
+        blocks = [block for code, file_blocks in parsed.values() for block in file_blocks]
+        modules[module_dir] = {
+            "variables": {b["labels"][0] for b in blocks if b["kind"] == "variable" and b["labels"]},
+            "outputs": {b["labels"][0] for b in blocks if b["kind"] == "output" and b["labels"]},
+        }
+    for module_dir, parsed in parsed_by_dir.items():
+        issues += check_module_dir(module_dir, parsed, modules)
+    return sorted(issues, key=lambda i: (i["file"], i["line"]))
+
+def validate_dir(base_dir):
+    return validate_files({}, base_dir)
+
+def has_errors(issues):
+    return any(i["severity"] == ERROR for i in issues)
+
+def format_issues(issues):
+    icons = {ERROR: "❌", WARNING: "⚠️"}
+    return "\n".join(f"{icons[i['severity']]} {i['file']}:{i['line']} {i['message']}" for i in issues)
+
+def retry_prompt(prompt, issues):
+    # Feeds the problems back so the next completion can fix them
+    problems = "\n".join(f"- {i['file']}:{i['line']} {i['message']}" for i in issues if i["severity"] == ERROR)
+    return (f"{prompt}\n\nYour previous answer was rejected by a validator:\n{problems}\n"
+            "Reply again with the complete corrected files, each under its file name.")
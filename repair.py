@@ -0,0 +1,224 @@
+# repair.py
+#
+# Auto-repair for Terraform that fails validation: the errors and current
+# files go back to the model, N candidate fixes are requested in parallel,
+# each is validated in its own scratch copy of the config, and the first one
+# that passes is written back. Failing rounds feed the best candidate (fewest
+# errors) into the next round, up to a cap on rounds and on total time.
+#
+# Limits: candidates share one `terraform init` (the starting config is
+# initialised once and copied), but a candidate that changes providers or
+# modules re-inits under cockpit's process-wide init lock, so those inits run
+# one at a time. Losing candidates stop reading their completion as soon as a
+# winner is found or time runs out; a request still waiting for its first
+# token is only abandoned once that token arrives.
+#
+#   python cli.py repair --candidates 3 --rounds 3 --timeout 300
+
+import os
+import glob
+import time
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
+
+import cockpit
+import prevalidate
+import tracing
+
+REPAIR_CANDIDATES = int(os.getenv("REPAIR_CANDIDATES", 3))
+REPAIR_MAX_ROUNDS = int(os.getenv("REPAIR_MAX_ROUNDS", 3))
+REPAIR_TIMEOUT = float(os.getenv("REPAIR_TIMEOUT", 300))
+REPAIR_DIR = os.path.join(cockpit.BASE_DIR, ".repair")
+# Validation output beyond this is cut from the prompt
+MAX_ERROR_CHARS = 6000
+
+REPAIR_PROMPT = """The Terraform configuration below fails validation.
+
+Errors:
+{errors}
+
+Current files:
+{files}
+
+Fix every error. Reply with the complete corrected content of each file you
+change, each under its file name followed by a fenced code block. Don't
+rename files and don't change anything unrelated to the errors."""
+
+def read_config(tf_dir):
+    # {relative path: content} for the .tf/.tfvars files repair may touch
+    files = {}
+    for path in cockpit.terraform_files(tf_dir):
+        with open(os.path.join(tf_dir, path)) as f:
+            files[path] = f.read()
+    return files
+
+def repair_prompt(files, errors):
+    listing = "\n\n".join(f"{path}\n```hcl\n{content.strip()}\n```" for path, content in sorted(files.items()))
+    return REPAIR_PROMPT.format(errors=errors.strip()[-MAX_ERROR_CHARS:], files=listing)
+
+def scratch_copy(tf_dir, parent):
+    # .terraform is copied with its symlinks and init fingerprint, so a fix
+    # that leaves providers alone validates without another terraform init
+    scratch = tempfile.mkdtemp(prefix="candidate-", dir=parent)
+    shutil.copytree(tf_dir, scratch, symlinks=True, dirs_exist_ok=True,
+                    ignore=shutil.ignore_patterns("*.tfstate", "*.tfstate.backup", "*.tfplan", "plans"))
+    return scratch
+
+def check_dir(tf_dir, cancel_event=None):
+    # (ok, report, error count, stage): in-process checks first, terraform only
+    # if they pass; stage says which of the two the count comes from
+    issues = prevalidate.validate_dir(tf_dir)
+    if prevalidate.has_errors(issues):
+        return (False, prevalidate.format_issues(issues), sum(i["severity"] == prevalidate.ERROR for i in issues),
+                "prevalidate")
+    run = cockpit.TerraformRun("validate", init=True, backend=False, tf_dir=tf_dir, cancel_event=cancel_event)
+    try:
+        output = run.run()
+    except Exception as e:
+        return False, str(e), 1, "terraform"
+    if run.returncode == 0:
+        return True, output, 0, None
+    return False, output, max(1, output.count("Error:")), "terraform"
+
+def rank(stage, errors):
+    # Lower is closer to valid. Getting past the in-process checks counts for
+    # more than any error count: the two stages count errors differently.
+    return (stage == "prevalidate", errors)
+
+def _complete(prompt, cancel_event):
+    # Streams the completion so a cancelled candidate stops reading (and the
+    # connection closes) instead of running to the end; None when cancelled
+    chunks = []
+    stream = cockpit.stream_groq_response(prompt, use_cache=False)
+    try:
+        for delta in stream:
+            if cancel_event.is_set():
+                return None
+            chunks.append(delta)
+    finally:
+        stream.close()
+    return "".join(chunks)
+
+@tracing.traced("repair.candidate")
+def try_candidate(prompt, files, tf_dir, parent, cancel_event):
+    start = time.time()
+    # files: the whole candidate config (the previous round's plus this reply)
+    result = {"ok": False, "files": None, "report": "", "errors": None, "stage": None}
+    raw = _complete(prompt, cancel_event)
+    if raw is None:
+        return result
+    blocks = {path: code for path, code in cockpit.extract_blocks(raw).items() if path.endswith((".tf", ".tfvars"))}
+    if not blocks:
+        result["report"] = "No .tf/.tfvars files in the model output."
+        return result
+    if cancel_event.is_set():
+        return result
+    scratch = scratch_copy(tf_dir, parent)
+    try:
+        # Files the model left out stay as they are
+        candidate = dict(files, **blocks)
+        cockpit.reconcile_files(candidate, base_dir=scratch, prune=False)
+        ok, report, errors, stage = check_dir(scratch, cancel_event)
+        result.update(ok=ok, report=report, errors=errors, stage=stage, files=candidate)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        result["seconds"] = round(time.time() - start, 2)
+    tracing.annotate(ok=result["ok"], errors=result["errors"] or 0)
+    return result
+
+@tracing.traced("repair")
+def repair(tf_dir=cockpit.TERRAFORM_DIR, candidates=REPAIR_CANDIDATES, max_rounds=REPAIR_MAX_ROUNDS,
+           timeout=REPAIR_TIMEOUT, dry_run=False, on_event=None):
+    # Returns {"ok", "rounds", "tried", "files", "changes", "report", "history",
+    # "seconds"}; files holds only what the winning candidate changed.
+    # on_event(message) gets progress lines. Nothing is written unless a
+    # candidate passes (and not at all with dry_run).
+    notify = on_event or (lambda message: None)
+    start = time.time()
+    deadline = start + timeout
+    os.makedirs(REPAIR_DIR, exist_ok=True)
+    cleanup()
+    result = {"ok": False, "rounds": 0, "tried": 0, "changes": None, "history": [], "files": {}}
+
+    # Every candidate is copied from this, with the .terraform its first check
+    # initialised (when the starting config gets past prevalidation)
+    template = scratch_copy(tf_dir, REPAIR_DIR)
+    try:
+        return _repair(tf_dir, template, candidates, max_rounds, deadline, dry_run, notify, result, start)
+    finally:
+        shutil.rmtree(template, ignore_errors=True)
+
+def _repair(tf_dir, template, candidates, max_rounds, deadline, dry_run, notify, result, start):
+    ok, report, errors, stage = check_dir(template)
+    if ok:
+        notify("✅ Configuration already validates.")
+        return dict(result, ok=True, report=report, seconds=round(time.time() - start, 2))
+
+    original = read_config(tf_dir)
+    files = original
+    for round_number in range(1, max_rounds + 1):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            notify("⏱ Out of time.")
+            break
+        result["rounds"] = round_number
+        notify(f"Round {round_number}: {errors} error(s), requesting {candidates} candidate fix(es)...")
+        prompt = repair_prompt(files, report)
+        cancel_event = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=candidates)
+        futures = [pool.submit(tracing.wrap(try_candidate), prompt, files, template, REPAIR_DIR, cancel_event)
+                   for _ in range(candidates)]
+        outcomes = []
+        winner = None
+        try:
+            for future in as_completed(futures, timeout=remaining):
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = {"ok": False, "report": str(e), "errors": None, "stage": None, "files": None}
+                outcomes.append(outcome)
+                result["tried"] += 1
+                if outcome["ok"]:
+                    winner = outcome
+                    break
+        except TimeoutError:
+            notify("⏱ Out of time waiting for candidates.")
+        finally:
+            # Losing candidates stop streaming their completions and their terraform runs
+            cancel_event.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+        result["history"].append([{"ok": o["ok"], "errors": o["errors"], "stage": o["stage"],
+                                   "seconds": o.get("seconds")} for o in outcomes])
+
+        if winner:
+            notify(f"✅ Candidate validated in round {round_number}.")
+            fixed = {path: content for path, content in winner["files"].items()
+                     if content.strip() != original.get(path, "").strip()}
+            result.update(ok=True, report=winner["report"], files=fixed)
+            if not dry_run:
+                result["changes"] = cockpit.reconcile_files(fixed, base_dir=tf_dir, prune=False)
+            break
+
+        scored = [o for o in outcomes if o["files"] and o["errors"] is not None]
+        if scored:
+            # Iterate on the closest candidate rather than the original
+            best = min(scored, key=lambda o: rank(o["stage"], o["errors"]))
+            if rank(best["stage"], best["errors"]) <= rank(stage, errors):
+                files, report, errors, stage = best["files"], best["report"], best["errors"], best["stage"]
+        notify(f"Round {round_number} failed; best candidate has {errors} {stage} error(s).")
+
+    if not result["ok"]:
+        result["report"] = report
+    result["seconds"] = round(time.time() - start, 2)
+    return result
+
+def cleanup(max_age=3600):
+    # Scratch copies left behind by a crash
+    for path in glob.glob(os.path.join(REPAIR_DIR, "candidate-*")):
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
@@ -0,0 +1,182 @@
+# run_watcher.py
+
+import os
+import time
+import uuid
+import threading
+from datetime import datetime, timezone
+
+import http_client
+import actions_index
+
+GITHUB_API = os.getenv("GITHUB_API", "https://api.github.com").rstrip("/")
+MIN_INTERVAL = 2.0
+MAX_INTERVAL = 30.0
+BACKOFF_FACTOR = 1.5
+# How long to look for the run created by a dispatch before giving up
+DISCOVERY_TIMEOUT = 120
+# GitHub stamps created_at server side; allow for clock skew with our dispatch time
+CLOCK_SKEW = 10
+
+_watchers = {}
+_lock = threading.Lock()
+
+class RunWatcher:
+    def __init__(self, owner, repo_name, workflow_id, ref, token, dispatched_at):
+        self.id = uuid.uuid4().hex[:8]
+        self.owner = owner
+        self.repo_name = repo_name
+        self.workflow_id = workflow_id
+        self.ref = ref
+        self.token = token
+        self.dispatched_at = dispatched_at
+
+        self.run_id = None
+        self.html_url = None
+        self.status = "dispatched"
+        self.conclusion = None
+        self.error = None
+        self.updates = []
+        self.polls = 0
+        self.not_modified = 0
+
+        self._etag = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"run-watcher-{self.id}", daemon=True)
+
+    @property
+    def done(self):
+        return self.status == "completed" or self.error is not None or self._stop.is_set()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def snapshot(self):
+        return {
+            "id": self.id,
+            "repo": f"{self.owner}/{self.repo_name}",
+            "workflow_id": self.workflow_id,
+            "ref": self.ref,
+            "run_id": self.run_id,
+            "html_url": self.html_url,
+            "status": self.status,
+            "conclusion": self.conclusion,
+            "error": self.error,
+            "polls": self.polls,
+            "not_modified": self.not_modified,
+            "done": self.done,
+        }
+
+    # --- Worker thread ---
+    def _headers(self, etag=None):
+        headers = {
+            "Authorization": f"token {self.token}",
+            "Accept": "application/vnd.github.v3+json"
+        }
+        if etag:
+            headers["If-None-Match"] = etag
+        return headers
+
+    def _run(self):
+        try:
+            self._discover_run()
+            self._poll_run()
+        except Exception as e:
+            self.error = str(e)
+            self._log(f"❌ {e}")
+
+    def _discover_run(self):
+        # workflow_dispatch returns 204 without a run id, so find the first
+        # dispatch run on our ref created after we triggered it
+        since = datetime.fromtimestamp(self.dispatched_at - CLOCK_SKEW, timezone.utc)
+        url = f"{GITHUB_API}/repos/{self.owner}/{self.repo_name}/actions/workflows/{self.workflow_id}/runs"
+        params = {
+            "event": "workflow_dispatch",
+            "branch": self.ref,
+            "created": f">={since.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+            "per_page": 10,
+        }
+        etag = None
+        interval = MIN_INTERVAL
+        deadline = time.time() + DISCOVERY_TIMEOUT
+        while not self._stop.is_set():
+            resp = http_client.get(url, endpoint="github.watch_runs", headers=self._headers(etag), params=params)
+            self.polls += 1
+            if resp.status_code == 200:
+                etag = resp.headers.get("ETag")
+                runs = resp.json()["workflow_runs"]
+                if runs:
+                    run = min(runs, key=lambda r: r["created_at"])
+                    self.run_id = run["id"]
+                    self._apply(run)
+                    return
+            elif resp.status_code == 304:
+                self.not_modified += 1
+            else:
+                raise Exception(f"Get workflow runs failed: {resp.text}")
+
+            if time.time() > deadline:
+                raise Exception("No run found for the dispatched workflow.")
+            self._stop.wait(interval)
+            interval = min(MAX_INTERVAL, interval * BACKOFF_FACTOR)
+
+    def _poll_run(self):
+        url = f"{GITHUB_API}/repos/{self.owner}/{self.repo_name}/actions/runs/{self.run_id}"
+        interval = MIN_INTERVAL
+        while not self.done:
+            self._stop.wait(interval)
+            if self._stop.is_set():
+                break
+            resp = http_client.get(url, endpoint="github.watch_run", headers=self._headers(self._etag))
+            self.polls += 1
+            if resp.status_code == 304:
+                # Unchanged (and free against the rate limit): back off further
+                self.not_modified += 1
+                interval = min(MAX_INTERVAL, interval * BACKOFF_FACTOR)
+                continue
+            if resp.status_code != 200:
+                raise Exception(f"Get workflow run failed: {resp.text}")
+            self._etag = resp.headers.get("ETag")
+            if self._apply(resp.json()):
+                interval = MIN_INTERVAL
+            else:
+                interval = min(MAX_INTERVAL, interval * BACKOFF_FACTOR)
+
+    def _apply(self, run):
+        status, conclusion = run["status"], run.get("conclusion")
+        self.html_url = run.get("html_url") or self.html_url
+        changed = (status, conclusion) != (self.status, self.conclusion)
+        self.status, self.conclusion = status, conclusion
+        if changed:
+            # Keeps "latest run" queries current without waiting for the next sync
+            actions_index.get_index().record_run(self.owner, self.repo_name, run)
+            self._log(f"Status: {status} | Conclusion: {conclusion}")
+        return changed
+
+    def _log(self, message):
+        self.updates.append((time.strftime("%H:%M:%S"), message))
+
+def watch_run(owner, repo_name, workflow_id, ref, token, dispatched_at):
+    watcher = RunWatcher(owner, repo_name, workflow_id, ref, token, dispatched_at)
+    with _lock:
+        _watchers[watcher.id] = watcher
+    return watcher.start()
+
+def get_watcher(watcher_id):
+    with _lock:
+        return _watchers.get(watcher_id)
+
+def stop_watcher(watcher_id):
+    watcher = get_watcher(watcher_id)
+    if watcher:
+        watcher.stop()
+
+def forget_watcher(watcher_id):
+    with _lock:
+        watcher = _watchers.pop(watcher_id, None)
+    if watcher:
+        watcher.stop()
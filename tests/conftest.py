@@ -0,0 +1,10 @@
+# tests/conftest.py
+
+import os
+import tempfile
+
+# Modules read these on import; keep spans, cache and jobs out of the checkout
+_scratch = tempfile.mkdtemp(prefix="cockpit-tests-")
+os.environ.setdefault("TRACE_DIR", os.path.join(_scratch, "traces"))
+os.environ.setdefault("LLM_CACHE_DIR", os.path.join(_scratch, "llm_cache"))
+os.environ.setdefault("JOBS_DB", os.path.join(_scratch, "jobs", "jobs.db"))
@@ -0,0 +1,126 @@
+# tests/test_api_server.py
+
+import os
+import sys
+import json
+import threading
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_server
+import cli
+import jobs
+
+TOKEN = "s3cret"
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    # A live server on a free port; terraform jobs and generation are recorded, not run
+    tf_dir = tmp_path / "terraform"
+    tf_dir.mkdir()
+    (tf_dir / "dev.tfvars").write_text('env = "dev"\n')
+    queue = jobs.JobQueue(str(tmp_path / "jobs.db"), workers=1)
+    calls = []
+
+    def submit(command, tf_dir, **args):
+        calls.append(("terraform", command, args))
+        return "job1"
+
+    def generate(prompt, base_dir, **kwargs):
+        # The directory's lock key is held while files are written
+        calls.append(("generate", queue.acquire([base_dir], blocking=False)))
+        return {"files": {}}
+
+    monkeypatch.setattr(api_server, "API_TOKEN", TOKEN)
+    monkeypatch.setattr(api_server, "_tf_dir", lambda body: str(tf_dir))
+    monkeypatch.setattr(api_server.jobs, "get_queue", lambda: queue)
+    monkeypatch.setattr(api_server.cockpit, "submit_terraform_job", submit)
+    monkeypatch.setattr(api_server.cockpit, "generate_files", generate)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), api_server.ApiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def request(path, body=None, token=TOKEN):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(f"http://127.0.0.1:{server.server_port}{path}", data=data, headers=headers,
+                                     method="POST" if body is not None else "GET")
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    yield request, calls, tf_dir
+    server.shutdown()
+    server.server_close()
+
+def test_requests_without_the_token_are_rejected(api):
+    request, calls, _ = api
+    assert request("/health", token=None)[0] == 401
+    assert request("/terraform/destroy", {}, token="wrong")[0] == 401
+    assert request("/health")[0] == 200
+    assert calls == []
+
+def test_no_token_configured_rejects_everything(api, monkeypatch):
+    request, calls, _ = api
+    monkeypatch.setattr(api_server, "API_TOKEN", None)
+    assert request("/terraform/plan", {}, token="")[0] == 401
+    assert calls == []
+
+def test_serve_refuses_to_start_without_a_token(monkeypatch):
+    monkeypatch.setattr(api_server, "API_TOKEN", None)
+    with pytest.raises(SystemExit):
+        cli.cmd_serve(cli.build_parser().parse_args(["serve"]))
+
+def test_apply_needs_an_existing_saved_plan(api):
+    request, calls, tf_dir = api
+    status, body = request("/terraform/apply", {"tfvars": "dev.tfvars"})
+    assert status == 400 and "saved plan" in body["error"]
+    assert request("/terraform/apply", {"saved_plan": True})[0] == 400
+    assert request("/terraform/apply", {"saved_plan": "../../main.tfplan"})[0] == 400
+    assert request("/terraform/apply", {"saved_plan": "dev-1.tfplan"})[0] == 409
+    assert calls == []
+
+def test_apply_runs_the_named_saved_plan(api):
+    request, calls, tf_dir = api
+    plans = tf_dir / ".terraform" / "plans"
+    plans.mkdir(parents=True)
+    (plans / "dev-1.tfplan").write_text("plan")
+    assert request("/terraform/apply", {"saved_plan": "dev-1.tfplan"})[0] == 202
+    assert calls == [("terraform", "apply", {"tfvars": None, "force_init": False,
+                                             "plan_file": str(plans / "dev-1.tfplan")})]
+
+def test_each_saved_plan_gets_its_own_file(api):
+    request, calls, tf_dir = api
+    for _ in range(2):
+        assert request("/terraform/plan", {"tfvars": "dev.tfvars", "saved_plan": True})[0] == 202
+    first, second = (args["plan_file"] for _, _, args in calls)
+    assert first != second
+    assert os.path.dirname(first) == str(tf_dir / ".terraform" / "plans")
+    assert os.path.basename(first).startswith("dev-")
+
+@pytest.mark.parametrize("tfvars", ["../dev.tfvars", "/etc/passwd", "prod.tfvars", "main.tf", ["dev.tfvars"]])
+def test_tfvars_must_name_a_tfvars_file_in_the_directory(api, tfvars):
+    request, calls, _ = api
+    status, body = request("/terraform/plan", {"tfvars": tfvars})
+    assert status == 400 and "tfvars" in body["error"]
+    assert calls == []
+
+def test_plan_with_a_valid_tfvars_is_queued(api):
+    request, calls, _ = api
+    assert request("/terraform/plan", {"tfvars": "dev.tfvars"}) == (202, {"job_id": "job1"})
+    assert calls == [("terraform", "plan", {"tfvars": "dev.tfvars", "force_init": False})]
+
+def test_generate_holds_the_directory_lock(api):
+    request, calls, tf_dir = api
+    assert request("/generate", {"prompt": "bucket"})[0] == 200
+    assert calls == [("generate", False)]
+    # Released afterwards
+    assert api_server.jobs.get_queue().acquire([str(tf_dir)], blocking=False)
@@ -0,0 +1,20 @@
+# tests/test_block_parser.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block_parser import extract_blocks
+
+def test_header_comment_inside_claimed_fence_is_content():
+    raw = "**main.tf**\n```hcl\n# outputs.tf\noutput \"id\" {\n  value = 1\n}\n```\n"
+    assert extract_blocks(raw) == {"main.tf": '# outputs.tf\noutput "id" {\n  value = 1\n}'}
+
+def test_fence_info_string_claims_the_block():
+    raw = "```hcl main.tf\n# variables.tf\nvariable \"a\" {}\n```\n"
+    assert extract_blocks(raw) == {"main.tf": '# variables.tf\nvariable "a" {}'}
+
+def test_header_comment_names_an_unclaimed_fence():
+    raw = "Here you go:\n```hcl\n# main.tf\nvariable \"a\" {}\n```\n\n```hcl\n# outputs.tf\noutput \"a\" {}\n```\n"
+    assert extract_blocks(raw) == {"main.tf": 'variable "a" {}', "outputs.tf": 'output "a" {}'}
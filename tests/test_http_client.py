@@ -0,0 +1,29 @@
+# tests/test_http_client.py
+
+import os
+import sys
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client
+
+REFUSED = requests.ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "Connection refused")))
+# The body may already have reached the server
+RESET = requests.ConnectionError(ProtocolError("Connection aborted.", ConnectionResetError(104, "reset")))
+
+@pytest.mark.parametrize("error, retried", [
+    (REFUSED, True),
+    (requests.ConnectTimeout(), True),
+    (RESET, False),
+    (requests.ReadTimeout(), False),
+])
+def test_post_is_resent_only_if_it_never_connected(error, retried):
+    assert http_client._retryable_error("POST", error) is retried
+
+@pytest.mark.parametrize("error", [REFUSED, RESET, requests.ReadTimeout()])
+def test_idempotent_requests_are_always_resent(error):
+    assert http_client._retryable_error("GET", error)
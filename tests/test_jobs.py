@@ -0,0 +1,106 @@
+# tests/test_jobs.py
+
+import os
+import sys
+import time
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jobs
+
+def wait_for(predicate, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+def blocking_handler(started, release):
+    def handler(args, job):
+        started.append(job.id)
+        release.wait(10)
+        return {"id": job.id}
+    return handler
+
+def test_jobs_sharing_a_key_run_one_at_a_time_across_queues(tmp_path):
+    db = str(tmp_path / "jobs.db")
+    started, release = [], threading.Event()
+    first = jobs.JobQueue(db, workers=1)
+    second = jobs.JobQueue(db, workers=1)
+    for queue in (first, second):
+        queue.register("work", blocking_handler(started, release))
+    job_a = first.submit("work", lock_keys=["/dir"])
+    first.start()
+    assert wait_for(lambda: started == [job_a])
+
+    # Opening the second queue leaves the first one's running job alone
+    assert first.get(job_a)["status"] == "running"
+    job_b = second.submit("work", lock_keys=["/dir"])
+    job_c = second.submit("work", lock_keys=["/other"])
+    second.start()
+    assert wait_for(lambda: job_c in started)
+    time.sleep(0.3)
+    assert job_b not in started
+    assert not second.acquire(["/dir"], blocking=False)
+
+    release.set()
+    assert wait_for(lambda: second.get(job_b)["status"] == "succeeded")
+    assert first.get(job_a)["status"] == "succeeded"
+
+def test_foreground_lock_holds_off_queued_jobs(tmp_path):
+    queue = jobs.JobQueue(str(tmp_path / "jobs.db"), workers=1)
+    done = threading.Event()
+    queue.register("work", lambda args, job: done.set())
+    assert queue.acquire(["/dir"])
+    job_id = queue.submit("work", lock_keys=["/dir"])
+    queue.start()
+    assert not done.wait(0.5)
+    assert "/dir" in queue.active_lock_keys()
+    queue.release(["/dir"])
+    assert done.wait(5)
+    assert wait_for(lambda: queue.get(job_id)["status"] == "succeeded")
+
+def test_jobs_with_secrets_stay_with_the_submitting_queue(tmp_path):
+    db = str(tmp_path / "jobs.db")
+    ran = []
+    submitter = jobs.JobQueue(db, workers=1)
+    other = jobs.JobQueue(db, workers=1)
+    other.register("push", lambda args, job: ran.append(("other", args.get("token"))))
+    job_id = submitter.submit("push", {"branch": "main"}, secrets={"token": "t0k3n"})
+    other.start()
+    time.sleep(0.3)
+    assert ran == [] and other.get(job_id)["status"] == "queued"
+    submitter.register("push", lambda args, job: ran.append(("submitter", args.get("token"))))
+    submitter.start()
+    assert wait_for(lambda: ran == [("submitter", "t0k3n")])
+
+def test_restart_fails_only_jobs_of_exited_processes(tmp_path):
+    db = str(tmp_path / "jobs.db")
+    queue = jobs.JobQueue(db, workers=1)
+    # A process that claimed a job and a lock, then died without cleaning up
+    dead = subprocess.run(
+        [sys.executable, "-c",
+         "import sys; sys.path.insert(0, sys.argv[2]); import jobs\n"
+         "q = jobs.JobQueue(sys.argv[1], workers=1)\n"
+         "job_id = q.submit('work', lock_keys=['/dir'])\n"
+         "q.register('work', None); q._claim(); print(job_id)",
+         db, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))],
+        capture_output=True, text=True, check=True)
+    dead_job = dead.stdout.strip()
+    assert queue.get(dead_job)["status"] == "running"
+
+    started, release = [], threading.Event()
+    queue.register("work", blocking_handler(started, release))
+    live_job = queue.submit("work", lock_keys=["/live"])
+    queue.start()
+    assert wait_for(lambda: started == [live_job])
+
+    restarted = jobs.JobQueue(db, workers=1)
+    assert restarted.get(dead_job)["status"] == "failed"
+    assert restarted.get(dead_job)["error"] == "Interrupted by restart"
+    assert restarted.get(live_job)["status"] == "running"
+    assert restarted.acquire(["/dir"], blocking=False)
+    release.set()
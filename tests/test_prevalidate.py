@@ -0,0 +1,35 @@
+# tests/test_prevalidate.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import prevalidate
+from context_index import scan_blocks
+
+# "//" and "#" inside strings must not be read as comments
+HCL_WITH_URL = '''resource "aws_s3_bucket" "b" {
+  bucket = "x-${var.env}"
+  tags   = { Src = "s3://bucket/key" }
+}
+
+resource "aws_s3_bucket" "c" {
+  bucket = "a#b"
+}
+
+variable "env" {
+  type = string
+}
+'''
+
+def test_comment_markers_inside_strings_keep_blocks_apart():
+    addresses = [block["address"] for block in scan_blocks(HCL_WITH_URL)]
+    assert addresses == ["aws_s3_bucket.b", "aws_s3_bucket.c", "var.env"]
+
+def test_valid_hcl_with_url_in_string_has_no_issues():
+    assert prevalidate.validate_files({"main.tf": HCL_WITH_URL}) == []
+
+def test_trailing_comment_is_still_stripped():
+    hcl = 'resource "null_resource" "a" { # {\n}\n\nvariable "env" {}\n'
+    assert [block["address"] for block in scan_blocks(hcl)] == ["null_resource.a", "var.env"]
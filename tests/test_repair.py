@@ -0,0 +1,90 @@
+# tests/test_repair.py
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cockpit
+import repair
+
+BROKEN = 'variable "a" {\n'
+# Passes the in-process checks; FakeRun fails it with three terraform errors
+TF_ERRORS = 'variable "a" {\n  description = "tf-errors"\n}\n'
+FIXED = 'variable "a" {}\n'
+
+def reply(content):
+    return f"main.tf\n```hcl\n{content}```\n"
+
+class FakeRun:
+    # terraform validate: fails configs marked "tf-errors", passes the rest
+    def __init__(self, command, tf_dir=None, **kwargs):
+        self.tf_dir = tf_dir
+        self.returncode = None
+
+    def run(self):
+        with open(os.path.join(self.tf_dir, "main.tf")) as f:
+            failing = "tf-errors" in f.read()
+        self.returncode = 1 if failing else 0
+        return "Error: one\nError: two\nError: three\n" if failing else "Success!"
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    tf_dir = tmp_path / "terraform"
+    tf_dir.mkdir()
+    (tf_dir / "main.tf").write_text(BROKEN)
+    monkeypatch.setattr(repair, "REPAIR_DIR", str(tmp_path / ".repair"))
+    monkeypatch.setattr(cockpit, "TerraformRun", FakeRun)
+    prompts = []
+    lock = threading.Lock()
+
+    def stub(replies):
+        # One reply per call, in call order
+        def stream_groq_response(prompt, stats=None, use_cache=True):
+            with lock:
+                prompts.append(prompt)
+                content = replies[len(prompts) - 1]
+            yield reply(content)
+        monkeypatch.setattr(cockpit, "stream_groq_response", stream_groq_response)
+
+    return tf_dir, stub, prompts
+
+def test_the_candidate_that_validates_wins_and_is_written(setup):
+    tf_dir, stub, _ = setup
+    stub([BROKEN, FIXED, TF_ERRORS])
+    result = repair.repair(str(tf_dir), candidates=3, max_rounds=1)
+    assert result["ok"] and result["rounds"] == 1
+    assert result["files"] == {"main.tf": FIXED.strip()}
+    assert (tf_dir / "main.tf").read_text().strip() == FIXED.strip()
+
+def test_dry_run_leaves_the_files_alone(setup):
+    tf_dir, stub, _ = setup
+    stub([FIXED])
+    result = repair.repair(str(tf_dir), candidates=1, max_rounds=1, dry_run=True)
+    assert result["ok"] and result["changes"] is None
+    assert (tf_dir / "main.tf").read_text() == BROKEN
+
+def test_a_candidate_past_prevalidation_outranks_fewer_prevalidate_errors(setup):
+    tf_dir, stub, prompts = setup
+    # Round 1: one prevalidate error vs three terraform errors; round 2 fixes it
+    stub([BROKEN, TF_ERRORS, FIXED])
+    result = repair.repair(str(tf_dir), candidates=2, max_rounds=2)
+    assert result["ok"] and result["rounds"] == 2
+    assert [sorted(o["stage"] for o in round_) for round_ in result["history"][:1]] == [["prevalidate", "terraform"]]
+    # Round 2 iterated on the terraform-stage candidate
+    assert "tf-errors" in prompts[2]
+
+def test_nothing_is_written_when_no_candidate_validates(setup):
+    tf_dir, stub, _ = setup
+    stub([TF_ERRORS, BROKEN])
+    result = repair.repair(str(tf_dir), candidates=1, max_rounds=2)
+    assert not result["ok"] and result["rounds"] == 2
+    assert (tf_dir / "main.tf").read_text() == BROKEN
+    assert "Error: one" in result["report"]
+
+def test_rank_puts_terraform_failures_ahead_of_prevalidate_failures():
+    assert repair.rank("terraform", 10) < repair.rank("prevalidate", 1)
+    assert repair.rank("terraform", 1) < repair.rank("terraform", 2)
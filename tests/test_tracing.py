@@ -0,0 +1,64 @@
+# tests/test_tracing.py
+
+import os
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tracing
+
+def spans_of(trace_id):
+    return {s["name"]: s for s in tracing.recent_spans(trace_id=trace_id)}
+
+def test_wrapped_work_nests_under_the_submitting_span():
+    def child(n):
+        with tracing.span(f"child-{n}"):
+            with tracing.span(f"grandchild-{n}"):
+                pass
+
+    with tracing.span("parent") as parent:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            list(pool.map(tracing.wrap(child), range(2)))
+    spans = spans_of(parent.trace_id)
+    for n in range(2):
+        assert spans[f"child-{n}"]["parentSpanId"] == parent.span_id
+        assert spans[f"grandchild-{n}"]["parentSpanId"] == spans[f"child-{n}"]["spanId"]
+        assert spans[f"child-{n}"]["attributes"]["thread.name"] != "MainThread"
+
+def test_unwrapped_work_starts_its_own_trace():
+    def orphan():
+        with tracing.span("orphan") as current:
+            return current.trace_id
+
+    with tracing.span("parent") as parent:
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            trace_id = pool.submit(orphan).result()
+    assert trace_id != parent.trace_id
+    assert spans_of(trace_id)["orphan"]["parentSpanId"] == ""
+
+def test_resume_continues_a_trace_from_a_carrier():
+    with tracing.span("submit") as submit:
+        carrier = json.loads(json.dumps(tracing.carrier()))
+    with tracing.resume(carrier, "job.run"):
+        pass
+    assert spans_of(submit.trace_id)["job.run"]["parentSpanId"] == submit.span_id
+
+def test_span_file_rotates_and_load_spans_reads_both(tmp_path, monkeypatch):
+    path = str(tmp_path / "spans.jsonl")
+    tracing.flush()
+    monkeypatch.setattr(tracing, "_file", None)
+    monkeypatch.setattr(tracing, "TRACE_DIR", str(tmp_path))
+    monkeypatch.setattr(tracing, "TRACE_FILE", path)
+    monkeypatch.setattr(tracing, "TRACE_MAX_BYTES", 2000)
+    for n in range(30):
+        with tracing.span("rotating", n=n):
+            pass
+    tracing.flush()
+    assert os.path.exists(path + ".1")
+    assert os.path.getsize(path + ".1") < 2000 + 1000
+    loaded = [s["attributes"]["n"] for s in tracing.load_spans(path)]
+    # Oldest spans went with earlier rotations; what's left is in order and ends with the last
+    assert loaded == sorted(loaded) and loaded[-1] == 29 and len(loaded) < 30
+    tracing._file.close()
@@ -0,0 +1,75 @@
+# tests/test_workspaces.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cockpit
+import jobs
+import workspaces
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    # A repo with one terraform file, its own workspaces dir and job queue (no workers)
+    base = tmp_path / "repo"
+    (base / "terraform").mkdir(parents=True)
+    (base / "terraform" / "main.tf").write_text('variable "a" {}\n')
+    monkeypatch.setattr(cockpit, "BASE_DIR", str(base))
+    monkeypatch.setattr(cockpit, "TERRAFORM_DIR", str(base / "terraform"))
+    monkeypatch.setattr(cockpit, "PIPELINES_DIR", str(base / "pipelines" / "github"))
+    monkeypatch.setattr(cockpit, "WORKFLOWS_DIR", str(base / ".github" / "workflows"))
+    monkeypatch.setattr(workspaces, "WORKSPACES_DIR", str(base / ".workspaces"))
+    queue = jobs.JobQueue(str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(workspaces.jobs, "get_queue", lambda: queue)
+    return base, queue
+
+def edit(workspace, content):
+    cockpit.write_bytes(os.path.join(workspace.tf_dir, "main.tf"), content.encode())
+
+def test_promote_copies_workspace_changes_into_the_repo(repo):
+    base, _ = repo
+    ws = workspaces.get_workspace("alice")
+    edit(ws, 'variable "b" {}\n')
+    assert ws.promote()["modified"] == ["terraform/main.tf"]
+    assert (base / "terraform" / "main.tf").read_text() == 'variable "b" {}\n'
+
+@pytest.mark.parametrize("held", ["workspace", "repo"])
+def test_promote_is_refused_while_a_terraform_dir_is_locked(repo, held):
+    base, queue = repo
+    ws = workspaces.get_workspace("alice")
+    edit(ws, 'variable "b" {}\n')
+    key = ws.tf_dir if held == "workspace" else cockpit.TERRAFORM_DIR
+    assert queue.acquire([key])
+    with pytest.raises(Exception, match="in use"):
+        ws.promote()
+    assert (base / "terraform" / "main.tf").read_text() == 'variable "a" {}\n'
+    # A dry run only reads
+    assert ws.promote(dry_run=True)["modified"] == ["terraform/main.tf"]
+
+    queue.release([key])
+    assert ws.promote()["modified"] == ["terraform/main.tf"]
+    # Released again afterwards
+    assert queue.acquire([ws.tf_dir, cockpit.TERRAFORM_DIR], blocking=False)
+
+def test_evict_skips_workspaces_with_active_lock_keys(repo):
+    _, queue = repo
+    busy_job = workspaces.get_workspace("queued-job")
+    busy_ui = workspaces.get_workspace("foreground")
+    workspaces.get_workspace("idle")
+    queue.submit("terraform", lock_keys=[busy_job.tf_dir])
+    queue.acquire([busy_ui.tf_dir])
+
+    removed = workspaces.evict(max_bytes=0, min_idle=0)
+    assert removed == ["idle"]
+    assert sorted(ws.name for ws in workspaces.list_workspaces()) == ["foreground", "queued-job"]
+
+def test_evict_removes_a_workspace_once_its_job_is_done(repo):
+    _, queue = repo
+    ws = workspaces.get_workspace("alice")
+    job_id = queue.submit("terraform", lock_keys=[ws.tf_dir])
+    assert workspaces.evict(max_bytes=0, min_idle=0) == []
+    queue.cancel(job_id)
+    assert workspaces.evict(max_bytes=0, min_idle=0) == ["alice"]
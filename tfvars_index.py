@@ -0,0 +1,378 @@
+# tfvars_index.py
+#
+# Parses the root module's variable declarations and every *.tfvars once,
+# keyed on file mtimes, and answers per-environment questions without running
+# terraform: effective values (default < terraform.tfvars / *.auto.tfvars <
+# <env>.tfvars), what differs between environments, and which variables are
+# unset, unused or set without being declared.
+
+import os
+import re
+import glob
+import json
+import threading
+
+from context_index import scan_blocks
+from prevalidate import scan_hcl, REFERENCE
+
+IDENT = re.compile(r'[A-Za-z_][\w-]*')
+NUMBER = re.compile(r'-?\d+(\.\d+)?([eE][+-]?\d+)?')
+HEREDOC = re.compile(r'<<(-?)\s*([A-Za-z_]\w*)[ \t]*\n')
+SENSITIVE_MASK = "(sensitive)"
+
+_cache = {}
+_lock = threading.Lock()
+
+class Expression(str):
+    # A value that isn't a literal (function call, reference, arithmetic...);
+    # kept as its source text
+    pass
+
+# --- Value parser ---
+class _Parser:
+    # Just enough HCL to read tfvars and variable defaults as Python values
+    def __init__(self, text):
+        self.text = text
+        self.i = 0
+
+    def _skip(self, newlines=True):
+        chars = " \t\r\n," if newlines else " \t\r"
+        while self.i < len(self.text) and self.text[self.i] in chars:
+            self.i += 1
+
+    def _peek(self):
+        return self.text[self.i] if self.i < len(self.text) else ""
+
+    def _line(self):
+        return self.text.count("\n", 0, self.i) + 1
+
+    def body(self):
+        # {name: (value, line)} for the attributes at this level; nested blocks are skipped
+        attributes = {}
+        while True:
+            self._skip()
+            if self.i >= len(self.text) or self._peek() == "}":
+                return attributes
+            name = IDENT.match(self.text, self.i)
+            if not name:
+                self._skip_line()
+                continue
+            line = self._line()
+            self.i = name.end()
+            self._skip(newlines=False)
+            if self._peek() == "=" and not self.text.startswith("==", self.i):
+                self.i += 1
+                attributes[name.group(0)] = (self.value(), line)
+            elif self._peek() in ('{', '"') or IDENT.match(self.text, self.i):
+                self._skip_block()
+            else:
+                self._skip_line()
+
+    def value(self):
+        self._skip(newlines=False)
+        start = self.i
+        c = self._peek()
+        if c == '"':
+            value = self._string()
+        elif self.text.startswith("<<", self.i) and HEREDOC.match(self.text, self.i):
+            value = self._heredoc()
+        elif c == "[":
+            value = self._list()
+        elif c == "{":
+            value = self._map()
+        else:
+            value = self._scalar()
+        # Anything trailing on the line (operators, conditionals) makes it an expression
+        rest = re.match(r'[ \t]*([^\s,\]}#]?)', self.text[self.i:])
+        if rest.group(1):
+            self.i = start
+            return self._expression()
+        return value
+
+    def _string(self):
+        end = self.i + 1
+        out = []
+        while end < len(self.text) and self.text[end] not in '"\n':
+            if self.text[end] == "\\" and end + 1 < len(self.text):
+                out.append({"n": "\n", "t": "\t", '"': '"', "\\": "\\"}.get(self.text[end + 1], self.text[end + 1]))
+                end += 2
+                continue
+            out.append(self.text[end])
+            end += 1
+        raw = self.text[self.i:end + 1]
+        self.i = end + 1
+        value = "".join(out)
+        return Expression(raw) if "${" in value.replace("$${", "") else value
+
+    def _heredoc(self):
+        match = HEREDOC.match(self.text, self.i)
+        strip, marker = match.group(1), match.group(2)
+        close = re.compile(rf'^[ \t]*{marker}[ \t]*$', re.MULTILINE).search(self.text, match.end())
+        end = close.start() if close else len(self.text)
+        lines = self.text[match.end():end].split("\n")[:-1] if close else self.text[match.end():].split("\n")
+        if strip:
+            indent = min((len(l) - len(l.lstrip()) for l in lines if l.strip()), default=0)
+            lines = [l[indent:] for l in lines]
+        self.i = close.end() if close else len(self.text)
+        return "\n".join(lines) + "\n"
+
+    def _list(self):
+        self.i += 1
+        items = []
+        while True:
+            self._skip()
+            if self._peek() in ("]", ""):
+                self.i += 1
+                return items
+            items.append(self.value())
+
+    def _map(self):
+        self.i += 1
+        items = {}
+        while True:
+            self._skip()
+            if self._peek() in ("}", ""):
+                self.i += 1
+                return items
+            if self._peek() == '"':
+                key = self._string()
+            else:
+                key = IDENT.match(self.text, self.i)
+                if not key:
+                    self._skip_line()
+                    continue
+                self.i = key.end()
+                key = key.group(0)
+            self._skip(newlines=False)
+            if self._peek() in ("=", ":"):
+                self.i += 1
+            items[key] = self.value()
+
+    def _scalar(self):
+        number = NUMBER.match(self.text, self.i)
+        if number:
+            self.i = number.end()
+            text = number.group(0)
+            return float(text) if number.group(1) or number.group(2) else int(text)
+        word = IDENT.match(self.text, self.i)
+        if word and word.group(0) in ("true", "false", "null"):
+            self.i = word.end()
+            return {"true": True, "false": False, "null": None}[word.group(0)]
+        return self._expression()
+
+    def _expression(self):
+        # Up to the end of the line, or the enclosing list/map's separator
+        depth = 0
+        start = self.i
+        quoted = False
+        while self.i < len(self.text):
+            c = self.text[self.i]
+            if quoted:
+                if c == "\\":
+                    self.i += 1
+                elif c == '"':
+                    quoted = False
+            elif c == '"':
+                quoted = True
+            elif c in "([{":
+                depth += 1
+            elif c in ")]}":
+                if depth == 0:
+                    break
+                depth -= 1
+            elif c in ",\n" and depth == 0:
+                break
+            self.i += 1
+        return Expression(self.text[start:self.i].strip())
+
+    def _skip_line(self):
+        end = self.text.find("\n", self.i)
+        self.i = len(self.text) if end == -1 else end + 1
+
+    def _skip_block(self):
+        start = self.text.find("{", self.i)
+        if start == -1:
+            return self._skip_line()
+        depth = 0
+        for j in range(start, len(self.text)):
+            if self.text[j] == "{":
+                depth += 1
+            elif self.text[j] == "}":
+                depth -= 1
+                if depth == 0:
+                    self.i = j + 1
+                    return
+        self.i = len(self.text)
+
+def parse_attributes(text):
+    # {name: (value, line)} for a tfvars file or a block body; comments ignored
+    _, code, _ = scan_hcl(text)
+    return _Parser(code).body()
+
+def render(value):
+    # Canonical text for comparing and displaying values
+    if isinstance(value, Expression):
+        return str(value)
+    return json.dumps(value, sort_keys=True)
+
+# --- Index ---
+def _is_shared(name):
+    # Terraform loads these for every run, before the -var-file
+    return name == "terraform.tfvars" or name.endswith(".auto.tfvars")
+
+def _fingerprint(tf_dir):
+    files = sorted(glob.glob(os.path.join(tf_dir, "*.tf")) + glob.glob(os.path.join(tf_dir, "*.tfvars")))
+    stats = []
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stats.append((os.path.basename(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(stats)
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+def _parse_declarations(tf_dir, tf_files):
+    variables = {}
+    used = set()
+    for name in tf_files:
+        _, code, _ = scan_hcl(_read(os.path.join(tf_dir, name)))
+        for block in scan_blocks(code):
+            if block["kind"] != "variable":
+                used.update(m.group(2) for m in REFERENCE.finditer(block["text"]) if m.group(1) == "var")
+                continue
+            if not block["labels"]:
+                continue
+            body = block["text"][block["text"].index("{") + 1:block["text"].rindex("}")]
+            attributes = {key: value for key, (value, _) in _Parser(body).body().items()}
+            variables[block["labels"][0]] = {
+                "file": name,
+                "line": block["line"],
+                "type": str(attributes["type"]) if "type" in attributes else None,
+                "description": attributes.get("description"),
+                "has_default": "default" in attributes,
+                "default": attributes.get("default"),
+                "sensitive": attributes.get("sensitive") is True,
+            }
+    for name, variable in variables.items():
+        variable["used"] = name in used
+    return variables
+
+def build_index(tf_dir):
+    # Re-parsed only when a .tf/.tfvars in tf_dir was added, removed or changed
+    fingerprint = _fingerprint(tf_dir)
+    with _lock:
+        cached = _cache.get(tf_dir)
+        if cached and cached["fingerprint"] == fingerprint:
+            return cached
+
+    tf_files = [name for name, _, _ in fingerprint if name.endswith(".tf")]
+    tfvars_files = [name for name, _, _ in fingerprint if name.endswith(".tfvars")]
+    values = {}
+    for name in tfvars_files:
+        values[name] = {key: {"value": value, "line": line}
+                        for key, (value, line) in parse_attributes(_read(os.path.join(tf_dir, name))).items()}
+
+    index = {
+        "fingerprint": fingerprint,
+        "variables": _parse_declarations(tf_dir, tf_files),
+        "shared": [name for name in tfvars_files if _is_shared(name)],
+        "environments": {os.path.splitext(name)[0]: name for name in tfvars_files if not _is_shared(name)},
+        "values": values,
+    }
+    with _lock:
+        _cache[tf_dir] = index
+    return index
+
+# --- Queries ---
+def environments(tf_dir):
+    return sorted(build_index(tf_dir)["environments"])
+
+def effective_values(tf_dir, env=None):
+    # {variable: {"value", "source"}}; source is "default", a tfvars file, or
+    # None when a required variable has no value in this environment
+    index = build_index(tf_dir)
+    layers = list(index["shared"])
+    if env:
+        layers.append(index["environments"][env])
+    result = {}
+    for name, variable in index["variables"].items():
+        result[name] = {"value": variable["default"], "source": "default" if variable["has_default"] else None}
+    for layer in layers:
+        for name, entry in index["values"][layer].items():
+            if name in index["variables"]:
+                result[name] = {"value": entry["value"], "source": layer}
+    return result
+
+def unset_variables(tf_dir):
+    # {env: [required variables with no value there]}
+    return {env: sorted(name for name, v in effective_values(tf_dir, env).items() if v["source"] is None)
+            for env in environments(tf_dir)}
+
+def unused_variables(tf_dir):
+    return sorted(name for name, v in build_index(tf_dir)["variables"].items() if not v["used"])
+
+def undeclared_values(tf_dir):
+    # {tfvars file: [keys with no variable declaration]}
+    index = build_index(tf_dir)
+    result = {}
+    for name, values in index["values"].items():
+        missing = sorted(set(values) - set(index["variables"]))
+        if missing:
+            result[name] = missing
+    return result
+
+def diff_environments(tf_dir):
+    # {variable: {env: rendered value}} for variables whose effective value differs
+    envs = environments(tf_dir)
+    per_env = {env: effective_values(tf_dir, env) for env in envs}
+    result = {}
+    for name in build_index(tf_dir)["variables"]:
+        rendered = {env: render(per_env[env][name]["value"]) if per_env[env][name]["source"] else None
+                    for env in envs}
+        if len(set(rendered.values())) > 1:
+            result[name] = rendered
+    return result
+
+def variable_report(tf_dir):
+    # One row per declared or set variable, ready for a table
+    index = build_index(tf_dir)
+    envs = environments(tf_dir)
+    per_env = {env: effective_values(tf_dir, env) for env in envs}
+    differing = diff_environments(tf_dir)
+    undeclared = {key for keys in undeclared_values(tf_dir).values() for key in keys}
+    rows = []
+    for name in sorted(set(index["variables"]) | undeclared):
+        variable = index["variables"].get(name)
+        row = {"variable": name}
+        flags = []
+        if variable is None:
+            flags.append("undeclared")
+        else:
+            if not variable["used"]:
+                flags.append("unused")
+            if name in differing:
+                flags.append("differs")
+            row["default"] = render(variable["default"]) if variable["has_default"] else ""
+            if variable["sensitive"] and variable["has_default"]:
+                row["default"] = SENSITIVE_MASK
+        for env in envs:
+            entry = per_env[env].get(name)
+            if variable is None:
+                raw = index["values"][index["environments"][env]].get(name)
+                row[env] = render(raw["value"]) if raw else ""
+                if "differs" not in flags and len({row.get(e) for e in envs if e in row}) > 1:
+                    flags.append("differs")
+            elif entry["source"] is None:
+                row[env] = "⛔ unset"
+                flags.append(f"unset in {env}")
+            elif variable["sensitive"]:
+                row[env] = SENSITIVE_MASK
+            else:
+                row[env] = render(entry["value"])
+        row["flags"] = ", ".join(flags)
+        rows.append(row)
+    return rows
@@ -0,0 +1,294 @@
+# tracing.py
+#
+# Lightweight span tracing: `with span("name"):` or `@traced()` records wall
+# time, parent/child nesting and attributes, keeps recent spans in memory for
+# the UI waterfall and appends each finished span to .traces/spans.jsonl using
+# OpenTelemetry field names. Writes are buffered (flushed every second while
+# spans keep finishing, and at exit) and the file is rotated to spans.jsonl.1
+# once it reaches TRACE_MAX_BYTES, so at most two files' worth is kept.
+# profile() captures cProfile stats for one action. TRACING=0 turns spans
+# into no-ops.
+
+import os
+import io
+import json
+import time
+import uuid
+import atexit
+import pstats
+import cProfile
+import functools
+import threading
+import contextvars
+from inspect import isgeneratorfunction
+from collections import deque
+from contextlib import contextmanager
+
+TRACING = os.getenv("TRACING", "1") != "0"
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(os.getcwd(), ".traces"))
+TRACE_FILE = os.path.join(TRACE_DIR, "spans.jsonl")
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 20 * 1024 * 1024))
+TRACE_FLUSH_INTERVAL = 1.0
+RECENT_SPANS = int(os.getenv("TRACE_RECENT_SPANS", 5000))
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+_session = contextvars.ContextVar("tracing_session", default=None)
+_recent = deque(maxlen=RECENT_SPANS)
+_lock = threading.Lock()
+_file = None
+_size = 0
+_last_flush = 0.0
+
+class Span:
+    def __init__(self, name, parent, attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.session = _session.get()
+        self.attributes = attributes
+        self.thread = threading.current_thread().name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "OK"
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self):
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self):
+        attributes = dict(self.attributes, **{"thread.name": self.thread})
+        if self.session:
+            attributes["session.id"] = self.session
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": {k: v if isinstance(v, (str, int, float, bool)) else str(v)
+                           for k, v in attributes.items()},
+            "status": {"code": self.status, "message": self.error or ""},
+        }
+
+class _NoopSpan:
+    def set(self, **attributes):
+        pass
+
+_NOOP = _NoopSpan()
+
+def _open():
+    global _file, _size
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    _file = open(TRACE_FILE, "a")
+    _size = _file.tell()
+
+def _rotate():
+    global _file
+    _file.close()
+    _file = None
+    os.replace(TRACE_FILE, TRACE_FILE + ".1")
+    _open()
+
+def _export(record):
+    global _size, _last_flush
+    line = json.dumps(record) + "\n"
+    with _lock:
+        _recent.append(record)
+        try:
+            if _file is None:
+                _open()
+            elif _size >= TRACE_MAX_BYTES:
+                _rotate()
+            _file.write(line)
+            # json.dumps escapes non-ASCII, so characters are bytes
+            _size += len(line)
+            now = time.monotonic()
+            if now - _last_flush > TRACE_FLUSH_INTERVAL:
+                _file.flush()
+                _last_flush = now
+        except OSError:
+            # Tracing must never break the action it is timing
+            pass
+
+@atexit.register
+def flush():
+    with _lock:
+        try:
+            if _file is not None:
+                _file.flush()
+        except OSError:
+            pass
+
+@contextmanager
+def span(name, **attributes):
+    if not TRACING:
+        yield _NOOP
+        return
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.status = "ERROR"
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    except BaseException:
+        # Generator closed early, Streamlit rerun/stop, Ctrl+C
+        current.status = "UNSET"
+        current.error = "interrupted"
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A generator finished in a different context than it started in
+            pass
+        _export(current.to_dict())
+
+def traced(name=None):
+    # Decorator form of span(); generator functions are timed until exhausted
+    def decorate(fn):
+        label = name or fn.__name__
+        if isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def generator_wrapper(*args, **kwargs):
+                with span(label):
+                    yield from fn(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def annotate(**attributes):
+    # Adds attributes to the innermost open span, if any
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+def wrap(fn):
+    # Runs fn in a copy of the caller's context so spans opened in a worker
+    # thread nest under the span that submitted the work. Each call gets its
+    # own copy, so the wrapper is safe to hand to pool.map.
+    context = contextvars.copy_context()
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+def set_session(session_id):
+    _session.set(session_id)
+
+# --- Crossing the job queue ---
+class _RemoteParent:
+    def __init__(self, trace_id, span_id):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+def carrier():
+    # JSON-safe handle on the current span, stored with a queued job
+    current = _current.get()
+    return {"session": _session.get(), "trace_id": current.trace_id if current else None,
+            "span_id": current.span_id if current else None}
+
+@contextmanager
+def resume(carrier, name, **attributes):
+    # Opens `name` as a child of the span that produced `carrier`
+    carrier = carrier or {}
+    parent = _RemoteParent(carrier["trace_id"], carrier["span_id"]) if carrier.get("trace_id") else None
+    session_token = _session.set(carrier.get("session"))
+    parent_token = _current.set(parent)
+    try:
+        with span(name, **attributes) as current:
+            yield current
+    finally:
+        _current.reset(parent_token)
+        _session.reset(session_token)
+
+# --- Reading spans back ---
+def recent_spans(session=None, trace_id=None, limit=None):
+    with _lock:
+        spans = list(_recent)
+    if session:
+        spans = [s for s in spans if s["attributes"].get("session.id") == session]
+    if trace_id:
+        spans = [s for s in spans if s["traceId"] == trace_id]
+    return spans[-limit:] if limit else spans
+
+def load_spans(path=TRACE_FILE):
+    # Everything still on disk (the rotated file first), e.g. from earlier CLI runs
+    if path == TRACE_FILE:
+        flush()
+    spans = []
+    for name in (path + ".1", path):
+        if not os.path.exists(name):
+            continue
+        with open(name) as f:
+            for line in f:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a crash mid-write
+                    continue
+    return spans
+
+def group_traces(spans):
+    # {trace_id: [spans]} ordered by each trace's first span
+    traces = {}
+    for s in sorted(spans, key=lambda s: s["startTimeUnixNano"]):
+        traces.setdefault(s["traceId"], []).append(s)
+    return traces
+
+def waterfall(spans):
+    # Rows ordered by start with nesting depth and offsets (ms) from the first span
+    if not spans:
+        return []
+    by_id = {s["spanId"]: s for s in spans}
+    origin = min(s["startTimeUnixNano"] for s in spans)
+    rows = []
+    for s in sorted(spans, key=lambda s: s["startTimeUnixNano"]):
+        depth = 0
+        parent = by_id.get(s["parentSpanId"])
+        while parent is not None and depth < 20:
+            depth += 1
+            parent = by_id.get(parent["parentSpanId"])
+        rows.append({
+            "span": "· " * depth + s["name"],
+            "start_ms": round((s["startTimeUnixNano"] - origin) / 1e6, 1),
+            "end_ms": round((s["endTimeUnixNano"] - origin) / 1e6, 1),
+            "duration_ms": round((s["endTimeUnixNano"] - s["startTimeUnixNano"]) / 1e6, 1),
+            "status": s["status"]["code"],
+            "trace": s["traceId"][:8],
+            "depth": depth,
+        })
+    return rows
+
+# --- cProfile ---
+@contextmanager
+def profile(name, top=25):
+    # Yields a dict that gets "path" (a .prof file for snakeviz/pstats) and
+    # "top" (the hottest functions by cumulative time) once the block exits
+    result = {}
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        profile_dir = os.path.join(TRACE_DIR, "profiles")
+        os.makedirs(profile_dir, exist_ok=True)
+        result["path"] = os.path.join(profile_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        profiler.dump_stats(result["path"])
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        result["top"] = out.getvalue()
@@ -0,0 +1,369 @@
+# workspaces.py
+#
+# Isolated working copies of the repo's terraform/, pipelines/github and
+# .github/workflows trees, one per session or project, under
+# .workspaces/<name>. Cloning reflinks files where the filesystem supports it
+# (btrfs, XFS) and hardlinks them otherwise, so a new workspace costs next to
+# no disk. Every cockpit write is a temp file + rename, which gives the
+# workspace its own copy of just the files it changes (terraform fmt, which
+# rewrites in place, unshares first). Providers come from the shared
+# TF_PLUGIN_CACHE_DIR. Least recently used workspaces are evicted once the
+# total passes WORKSPACE_MAX_MB; promote() copies a workspace's changes back
+# into the repo for committing.
+#
+# Only the configuration is isolated: a workspace uses the same backend, and so
+# the same remote state, as the repo. Plans in different workspaces can run
+# side by side; apply/destroy are serialised across all of them (see
+# cockpit.STATE_COMMANDS) and always go through the job queue from the UI.
+#
+#   python cli.py workspaces create alice      # prints the workspace's terraform dir
+#   python cli.py workspaces promote alice
+
+import os
+import re
+import json
+import time
+import uuid
+import errno
+import shutil
+import fnmatch
+import threading
+
+import cockpit
+import jobs
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no reflinks, hardlinks only
+    fcntl = None
+
+WORKSPACES_DIR = os.path.join(cockpit.BASE_DIR, ".workspaces")
+# Eviction starts once all workspaces together use more than this
+WORKSPACE_MAX_BYTES = int(float(os.getenv("WORKSPACE_MAX_MB", 2048)) * 1024 * 1024)
+# Used within this many seconds: never evicted, whatever the disk usage
+WORKSPACE_MIN_IDLE = float(os.getenv("WORKSPACE_MIN_IDLE", 3600))
+# Unused for this many seconds: removed regardless of disk usage (0 = never)
+WORKSPACE_TTL = float(os.getenv("WORKSPACE_TTL", 7 * 24 * 3600))
+# auto (reflink, else hardlink), reflink (reflink, else copy) or copy
+WORKSPACE_CLONE = os.getenv("WORKSPACE_CLONE", "auto")
+# "repo" works in the repo itself unless a workspace is chosen; "session" gives
+# every UI session a private workspace by default
+WORKSPACE_DEFAULT = os.getenv("WORKSPACE_DEFAULT", "repo")
+
+META_FILE = ".workspace.json"
+TREES = [os.path.relpath(path, cockpit.BASE_DIR)
+         for path in (cockpit.TERRAFORM_DIR, cockpit.PIPELINES_DIR, cockpit.WORKFLOWS_DIR)]
+# State and plans belong to the directory terraform ran in; .terraform is
+# re-initialised per workspace from the shared plugin cache
+SKIP_DIRS = {".terraform", "plans"}
+SKIP_FILES = ["*.tfstate", "*.tfstate.backup", "*.tfplan", "*.tmp", "crash.log"]
+NAME_PATTERN = re.compile(r'^[\w.-]{1,64}$')
+# Linux ioctl that makes dst share src's extents until either is written
+FICLONE = 0x40049409
+
+_lock = threading.Lock()
+
+# --- Cloning ---
+def _skipped(name):
+    return any(fnmatch.fnmatch(name, pattern) for pattern in SKIP_FILES)
+
+def _reflink(src, dst):
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+
+def clone_file(src, dst, state):
+    # state carries what the filesystem turned out to support across calls;
+    # returns the method used
+    if state.get("reflink", fcntl is not None and state["mode"] != "copy"):
+        try:
+            _reflink(src, dst)
+            shutil.copystat(src, dst)
+            return "reflink"
+        except OSError as e:
+            if os.path.exists(dst):
+                os.remove(dst)
+            if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOSYS):
+                raise
+            state["reflink"] = False
+    if state["mode"] == "auto" and state.get("hardlink", True):
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            state["hardlink"] = False
+    shutil.copy2(src, dst)
+    return "copy"
+
+def clone_tree(src, dst, mode=WORKSPACE_CLONE):
+    # Copies src into dst without state, plans or .terraform; returns
+    # {"reflink": n, "hardlink": n, "copy": n}
+    state = {"mode": mode}
+    counts = {"reflink": 0, "hardlink": 0, "copy": 0}
+    for root, dirs, files in os.walk(src):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        target = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            if _skipped(name):
+                continue
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target, name))
+                continue
+            counts[clone_file(path, os.path.join(target, name), state)] += 1
+    return counts
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+def _tree_files(root):
+    # {path relative to root: absolute path} for the cloned trees
+    files = {}
+    for tree in TREES:
+        for current, dirs, names in os.walk(os.path.join(root, tree)):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for name in names:
+                if not _skipped(name):
+                    path = os.path.join(current, name)
+                    files[os.path.relpath(path, root)] = path
+    return files
+
+def disk_usage(path):
+    # Allocated bytes; a hardlinked file counts its share (1/links), so a
+    # workspace that still shares most files with the repo costs what it adds
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            blocks = getattr(stat, "st_blocks", None)
+            size = blocks * 512 if blocks is not None else stat.st_size
+            total += size // max(stat.st_nlink, 1)
+    return total
+
+# --- Workspaces ---
+class Workspace:
+    # name is None for the repo itself
+    def __init__(self, name, root):
+        self.name = name
+        self.root = root
+        self.tf_dir = os.path.join(root, os.path.relpath(cockpit.TERRAFORM_DIR, cockpit.BASE_DIR))
+        self.pipelines_dir = os.path.join(root, os.path.relpath(cockpit.PIPELINES_DIR, cockpit.BASE_DIR))
+        self.workflows_dir = os.path.join(root, os.path.relpath(cockpit.WORKFLOWS_DIR, cockpit.BASE_DIR))
+
+    @property
+    def is_repo(self):
+        return self.name is None
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.root, META_FILE)
+
+    @property
+    def last_used(self):
+        # The meta file's mtime, bumped by touch()
+        return os.path.getmtime(self.meta_path) if not self.is_repo else time.time()
+
+    def touch(self):
+        if not self.is_repo:
+            os.utime(self.meta_path)
+
+    def meta(self):
+        with open(self.meta_path) as f:
+            return json.load(f)
+
+    def _save_meta(self, meta):
+        cockpit.write_bytes(self.meta_path, json.dumps(meta, indent=2).encode())
+
+    def disk_usage(self):
+        return disk_usage(self.root)
+
+    def promote(self, dry_run=False):
+        # Copies what changed in the workspace since it was cloned (or last
+        # promoted) into the repo. A file the repo changed too is a conflict and
+        # is left alone in both places. Returns the changes like reconcile_files.
+        # Refused while a job or UI action holds the workspace's or the repo's
+        # terraform dir, so files never change under a running terraform.
+        if self.is_repo:
+            raise Exception("❌ The repo is not a workspace; there is nothing to promote.")
+        if dry_run:
+            return self._promote(dry_run)
+        lock_keys = [self.tf_dir, cockpit.TERRAFORM_DIR]
+        queue = jobs.get_queue()
+        if not queue.acquire(lock_keys, blocking=False):
+            raise Exception(f"❌ Workspace {self.name} or the repo is in use by a terraform job or push; "
+                            "promote once it finishes.")
+        try:
+            return self._promote(dry_run)
+        finally:
+            queue.release(lock_keys)
+
+    def _promote(self, dry_run):
+        meta = self.meta()
+        baseline = meta["files"]
+        changes = {"added": [], "modified": [], "removed": [], "unchanged": [], "conflicts": []}
+        files = _tree_files(self.root)
+        for rel in sorted(set(files) | set(baseline)):
+            path = files.get(rel)
+            base_path = os.path.join(cockpit.BASE_DIR, rel)
+            base_exists = os.path.exists(base_path)
+            known = baseline.get(rel)
+            workspace_changed = (known is None or _signature(path) != known["workspace"]) if path else True
+            base_changed = known is not None and _signature(base_path) != known["repo"]
+            if path is None:
+                # Deleted in the workspace
+                if not base_exists:
+                    continue
+                if base_changed:
+                    changes["conflicts"].append(rel)
+                    continue
+                if not dry_run:
+                    os.remove(base_path)
+                changes["removed"].append(rel)
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            if (base_exists and cockpit.same_content(base_path, data)) or not workspace_changed:
+                changes["unchanged"].append(rel)
+            elif base_changed or (known is None and base_exists):
+                changes["conflicts"].append(rel)
+            else:
+                if not dry_run:
+                    cockpit.write_bytes(base_path, data)
+                changes["modified" if base_exists else "added"].append(rel)
+        if not dry_run:
+            # Promoted files become the new baseline; conflicts keep the old one
+            conflicts = set(changes["conflicts"])
+            meta["files"] = {rel: {"repo": _signature(os.path.join(cockpit.BASE_DIR, rel)),
+                                   "workspace": _signature(path)}
+                             for rel, path in files.items() if rel not in conflicts}
+            meta["files"].update({rel: baseline[rel] for rel in conflicts if rel in baseline})
+            meta["promoted"] = time.time()
+            self._save_meta(meta)
+        return changes
+
+def repo_workspace():
+    return Workspace(None, cockpit.BASE_DIR)
+
+def valid_name(name):
+    return bool(NAME_PATTERN.match(name or "")) and not name.startswith(".")
+
+def _workspace(name):
+    return Workspace(name, os.path.join(WORKSPACES_DIR, name))
+
+def get_workspace(name=None, create=True):
+    # None or "" is the repo itself; anything else is cloned from the repo on
+    # first use. Every call marks the workspace as recently used.
+    if not name:
+        return repo_workspace()
+    if not valid_name(name):
+        raise Exception(f"❌ Invalid workspace name {name!r}: use letters, digits, '.', '-' or '_'.")
+    workspace = _workspace(name)
+    if not os.path.exists(workspace.meta_path):
+        if not create:
+            raise Exception(f"❌ No workspace named {name}.")
+        with _lock:
+            if not os.path.exists(workspace.meta_path):
+                _create(workspace)
+                evict(keep={name})
+    workspace.touch()
+    return workspace
+
+def _create(workspace):
+    # Built under a temporary name and renamed into place, so another process
+    # never sees a half-cloned workspace
+    os.makedirs(WORKSPACES_DIR, exist_ok=True)
+    staging = os.path.join(WORKSPACES_DIR, f".new-{workspace.name}-{uuid.uuid4().hex[:8]}")
+    try:
+        counts = {"reflink": 0, "hardlink": 0, "copy": 0}
+        for tree in TREES:
+            src = os.path.join(cockpit.BASE_DIR, tree)
+            if os.path.isdir(src):
+                for method, n in clone_tree(src, os.path.join(staging, tree)).items():
+                    counts[method] += n
+        staged = Workspace(workspace.name, staging)
+        os.makedirs(staged.tf_dir, exist_ok=True)
+        os.makedirs(staged.pipelines_dir, exist_ok=True)
+        # The previous generation's file list, so the first generation here prunes like it would in the repo
+        manifest = os.path.join(cockpit.TERRAFORM_DIR, cockpit.GENERATED_MANIFEST)
+        if os.path.exists(manifest):
+            os.makedirs(os.path.dirname(os.path.join(staged.tf_dir, cockpit.GENERATED_MANIFEST)), exist_ok=True)
+            shutil.copy2(manifest, os.path.join(staged.tf_dir, cockpit.GENERATED_MANIFEST))
+        staged._save_meta({
+            "name": workspace.name,
+            "created": time.time(),
+            "clone": counts,
+            "files": {rel: {"repo": _signature(os.path.join(cockpit.BASE_DIR, rel)), "workspace": _signature(path)}
+                      for rel, path in _tree_files(staging).items()},
+        })
+        try:
+            os.rename(staging, workspace.root)
+        except OSError:
+            # Another process created it first
+            if not os.path.exists(workspace.meta_path):
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def list_workspaces():
+    # Most recently used first
+    if not os.path.isdir(WORKSPACES_DIR):
+        return []
+    found = [_workspace(name) for name in os.listdir(WORKSPACES_DIR)
+             if valid_name(name) and os.path.exists(os.path.join(WORKSPACES_DIR, name, META_FILE))]
+    return sorted(found, key=lambda ws: ws.last_used, reverse=True)
+
+def remove_workspace(name):
+    workspace = _workspace(name)
+    if not valid_name(name) or not os.path.exists(workspace.meta_path):
+        raise Exception(f"❌ No workspace named {name}.")
+    # Renamed away first so nobody opens it while it is being deleted
+    trash = os.path.join(WORKSPACES_DIR, f".trash-{name}-{uuid.uuid4().hex[:8]}")
+    os.rename(workspace.root, trash)
+    shutil.rmtree(trash, ignore_errors=True)
+
+def evict(max_bytes=WORKSPACE_MAX_BYTES, min_idle=WORKSPACE_MIN_IDLE, ttl=WORKSPACE_TTL, keep=()):
+    # Removes workspaces idle longer than ttl, then least recently used ones
+    # until the rest fit in max_bytes. Workspaces in keep, used within
+    # min_idle seconds, or with a queued/running job are never removed.
+    # Returns the removed names.
+    now = time.time()
+    busy = jobs.get_queue().active_lock_keys()
+    found = list_workspaces()
+    usage = {ws.name: ws.disk_usage() for ws in found}
+    total = sum(usage.values())
+    removed = []
+    for ws in reversed(found):
+        idle = now - ws.last_used
+        expired = ttl and idle > ttl
+        if not expired and total <= max_bytes:
+            continue
+        if ws.name in keep or idle < min_idle or busy & {ws.root, ws.tf_dir}:
+            continue
+        try:
+            remove_workspace(ws.name)
+        except Exception:
+            # Removed concurrently
+            continue
+        total -= usage[ws.name]
+        removed.append(ws.name)
+    return removed
+
+def summary(workspace):
+    # One row per workspace for a table
+    meta = workspace.meta()
+    return {
+        "workspace": workspace.name,
+        "last_used": time.strftime("%Y-%m-%d %H:%M", time.localtime(workspace.last_used)),
+        "created": time.strftime("%Y-%m-%d %H:%M", time.localtime(meta["created"])),
+        "MB": round(workspace.disk_usage() / 1024 / 1024, 2),
+        "clone": ", ".join(f"{n} {method}" for method, n in meta["clone"].items() if n),
+        "path": workspace.root,
+    }